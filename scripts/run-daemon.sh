@@ -0,0 +1,13 @@
+#!/bin/bash
+cd /home/pi/aimharderbot
+
+#We run the docker container as a daemon that books the sessions of all the users. Changes of the configuration
+#file are applied without restarting it and the upcoming bookings are written to logs/status.json
+docker run -d --restart unless-stopped \
+				-v $(pwd)/logs:/usr/src/app/logs \
+				-v $(pwd)/cache:/usr/src/app/cache \
+				-v $(pwd)/config:/usr/src/app/config \
+    			--name aimharderbot-daemon aimharderbot:v1 \
+				--config-filename='aimharderbot_config.yaml' \
+				--session-cache \
+				--daemon
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from datetime import datetime
+from http import HTTPStatus
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from batch import BatchOperation, BatchResult, STATUS_CANCELLED, STATUS_REPLACED, STATUS_FAILED, group_by_day
+from constants import login_endpoint, book_endpoint, cancel_endpoint, classes_endpoint
+from client import classes_params, book_data, cancel_data, check_login_response, check_book_response, check_cancel_response
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_CONNECT_TIMEOUT = 5
+
+
+class AsyncAimHarderClient:
+    #Same operations and exceptions than AimHarderClient, but built on aiohttp so that many users can book
+    #from the same event loop. Every request is bounded by a timeout. Several clients can share the same
+    #connector (pool of connections) while each one keeps its own cookies.
+
+    def __init__(self, email: str, password: str, box_id: int, box_name: str, timeout: float = DEFAULT_TIMEOUT,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, connector=None):
+        if aiohttp is None:
+            raise ImportError("AsyncAimHarderClient requires aiohttp (pip install aiohttp)")
+        self.logger = logging.getLogger('aimharder-bot')
+
+        self.email = email
+        self.password = password
+        self.box_id = box_id
+        self.box_name = box_name
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.session = aiohttp.ClientSession(
+            timeout=self.timeout,
+            connector=connector,
+            connector_owner=connector is None,
+            cookie_jar=aiohttp.CookieJar(),
+        )
+
+    async def __aenter__(self):
+        try:
+            await self.login()
+        except BaseException:
+            await self.close()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.session.close()
+
+    async def login(self):
+        async with self.session.post(
+            login_endpoint(),
+            data={
+                "login": "Log in",
+                "mail": self.email,
+                "pw": self.password,
+            },
+            timeout=self.timeout,
+        ) as response:
+            response.raise_for_status()
+            check_login_response(await response.read())
+
+    async def get_classes(self, target_day: datetime):
+        async with self.session.get(
+            classes_endpoint(self.box_name),
+            params=classes_params(self.box_id, target_day),
+            timeout=self.timeout,
+        ) as response:
+            bookings = (await response.json(content_type=None)).get("bookings")
+        self.logger.info(f"Retrieved {len(bookings)} classes for day {target_day.strftime('%Y-%m-%d')}")
+        return bookings
+
+    async def book_class(self, target_day: datetime, target_class: dict) -> bool:
+        async with self.session.post(
+            book_endpoint(self.box_name),
+            data=book_data(target_day, target_class),
+            timeout=self.timeout,
+        ) as response:
+            payload = await response.json(content_type=None) if response.status == HTTPStatus.OK else None
+            return check_book_response(response.status, payload, target_day)
+
+    async def cancel_booked_class(self, target_class: dict) -> bool:
+        async with self.session.post(
+            cancel_endpoint(self.box_name),
+            data=cancel_data(target_class),
+            timeout=self.timeout,
+        ) as response:
+            payload = await response.json(content_type=None) if response.status == HTTPStatus.OK else None
+            return check_cancel_response(response.status, payload)
+
+    async def apply_operation(self, operation: BatchOperation) -> BatchResult:
+        #Same ordering than batch.apply_operation: nothing is cancelled until the replacement is booked
+        if operation.book is not None:
+            try:
+                await self.book_class(operation.class_day, operation.book)
+            except Exception as e:
+                return BatchResult(operation, STATUS_FAILED, error=str(e) or type(e).__name__)
+
+        result = BatchResult(operation, STATUS_REPLACED if operation.book is not None else STATUS_CANCELLED, booked=operation.book)
+        for class_item in operation.cancel:
+            try:
+                await self.cancel_booked_class(class_item)
+            except Exception as e:
+                result.status = STATUS_FAILED
+                result.error = str(e) or type(e).__name__
+                continue
+            result.cancelled.append(class_item)
+        return result
+
+    async def run_batch(self, operations: list[BatchOperation]) -> list[BatchResult]:
+        results = [None] * len(operations)
+
+        async def run_day(indexes: list[int]):
+            for index in indexes:
+                results[index] = await self.apply_operation(operations[index])
+
+        await asyncio.gather(*(run_day(indexes) for indexes in group_by_day(operations)))
+        return results
@@ -0,0 +1,123 @@
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from exceptions import InvalidBookingGoal
+from runner import STATUS_FAILED
+from schedule import Schedule
+
+logger = logging.getLogger('aimharder-bot')
+
+#Possible values of BatchResult.status
+STATUS_CANCELLED = "cancelled"
+STATUS_REPLACED = "replaced"
+
+DAY_FORMAT = "%Y-%m-%d"
+
+
+@dataclass(slots=True, frozen=True)
+class ScheduleChange:
+    #One entry of the exceptions section of the configuration
+    day: datetime
+    time: str | None = None
+    class_name: str | None = None
+
+    @property
+    def replaces(self) -> bool:
+        return self.time is not None
+
+
+def parse_change(entry) -> ScheduleChange:
+    #An exception is "YYYY-MM-DD" (nothing is booked that day and its bookings are cancelled) or
+    #"YYYY-MM-DD,HHMM,class name" (that class is booked instead of the goal of the day)
+    fields = [value.strip() for value in str(entry).split(',')]
+    if len(fields) not in (1, 3):
+        raise InvalidBookingGoal(f"{entry}: expected 'YYYY-MM-DD[,HHMM,class name]'")
+    try:
+        day = datetime.strptime(fields[0], DAY_FORMAT)
+    except ValueError:
+        raise InvalidBookingGoal(f"{entry}: date must be formatted like 'YYYY-MM-DD'")
+    if len(fields) == 1:
+        return ScheduleChange(day)
+
+    time_str, class_name = fields[1:]
+    if len(time_str) != 4 or not time_str.isdigit() or int(time_str[:2]) > 23 or int(time_str[2:]) > 59:
+        raise InvalidBookingGoal(f"{entry}: time must be formatted like 'HHMM'")
+    if not class_name:
+        raise InvalidBookingGoal(f"{entry}: missing class name")
+    return ScheduleChange(day, time_str, class_name)
+
+
+def parse_changes(entries: list | None) -> list[ScheduleChange]:
+    #The section is empty (None) when the user has no exceptions
+    return [parse_change(entry) for entry in entries or []]
+
+
+def change_for_day(changes: list[ScheduleChange], day: datetime) -> ScheduleChange | None:
+    #The last entry of a day wins
+    for change in reversed(changes):
+        if change.day.date() == day.date():
+            return change
+    return None
+
+
+@dataclass
+class BatchOperation:
+    class_day: datetime
+    #Classes booked (or in the waiting list) to cancel
+    cancel: list[dict] = field(default_factory=list)
+    #Class to book before cancelling them
+    book: dict | None = None
+
+
+@dataclass
+class BatchResult:
+    operation: BatchOperation
+    status: str
+    cancelled: list[dict] = field(default_factory=list)
+    booked: dict | None = None
+    error: str | None = None
+
+
+def plan_operation(change: ScheduleChange, classes: list[dict]) -> BatchOperation | None:
+    #Operation that applies the change to the listing of its day, or None when there is nothing to do.
+    #BoxClosed/NoBookingGoal are raised when the replacement class does not exist.
+    booked = [class_item for class_item in classes if class_item.get("bookState") in (0, 1)]
+    if not change.replaces:
+        return BatchOperation(change.day, booked) if booked else None
+    replacement = Schedule(classes).find(change.time, change.class_name).raw
+    if any(class_item.get("id") == replacement.get("id") for class_item in booked):
+        return None
+    return BatchOperation(change.day, booked, replacement)
+
+
+def apply_operation(client, operation: BatchOperation) -> BatchResult:
+    #The bookings of the day are only cancelled once the replacement is confirmed, so a failed replacement never
+    #leaves the user without a class
+    if operation.book is not None:
+        try:
+            client.book_class(operation.class_day, operation.book)
+        except Exception as e:
+            logger.error(f"Replacement of {operation.class_day.strftime(DAY_FORMAT)} not booked, keeping the current bookings: {e}")
+            return BatchResult(operation, STATUS_FAILED, error=str(e) or type(e).__name__)
+
+    result = BatchResult(operation, STATUS_REPLACED if operation.book is not None else STATUS_CANCELLED, booked=operation.book)
+    for class_item in operation.cancel:
+        try:
+            client.cancel_booked_class(class_item)
+        except Exception as e:
+            logger.error(f"Class {class_item.get('id')} of {operation.class_day.strftime(DAY_FORMAT)} not cancelled: {e}")
+            result.status = STATUS_FAILED
+            result.error = str(e) or type(e).__name__
+            continue
+        result.cancelled.append(class_item)
+    return result
+
+
+def group_by_day(operations: list[BatchOperation]) -> list[list[int]]:
+    #Indexes of the operations of every day. The operations of the same day run one after another, the days
+    #run concurrently.
+    groups = {}
+    for index, operation in enumerate(operations):
+        groups.setdefault(operation.class_day.date(), []).append(index)
+    return list(groups.values())
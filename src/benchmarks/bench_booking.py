@@ -0,0 +1,124 @@
+#Benchmark of the booking flow against the local AimHarder stand-in server.
+#Run it from the src folder: python -m benchmarks.bench_booking --users 50 --boxes 5 --workers 10 --latency 0.05
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks.fake_aimharder import FakeAimHarder
+from client import AimHarderClient
+from constants import set_base_url
+from runner import iter_users, run_users
+from timing import percentile, timings
+from transport import configure_pool
+
+HOURS_IN_ADVANCE = 48
+CLASS_NAME = "WOD"
+
+
+def build_scenario(server: FakeAimHarder, users: int, boxes: int, capacity: int) -> tuple[list[dict], datetime]:
+    #Every user wants the class whose booking window has just opened (now + hours in advance, rounded down)
+    class_datetime = (datetime.today() + timedelta(hours=HOURS_IN_ADVANCE)).replace(second=0, microsecond=0)
+    time_str = class_datetime.strftime("%H%M")
+    for box in range(boxes):
+        server.add_class(f"box{box}", class_datetime, time_str, CLASS_NAME, limit=capacity)
+        server.add_class(f"box{box}", class_datetime, time_str, f"{CLASS_NAME} OPEN", limit=capacity)
+
+    config = []
+    for user in range(users):
+        email = f"user{user}@mail.com"
+        server.add_user(email, "password")
+        config.append({
+            f"user{user}": {
+                "email": email,
+                "password": "password",
+                "box-name": f"box{user % boxes}",
+                "box-id": user % boxes,
+                "booking-goals": [f"{class_datetime.strftime('%A').lower()},{time_str},{CLASS_NAME},{HOURS_IN_ADVANCE}"],
+                "exceptions": None,
+            }
+        })
+    return config, class_datetime
+
+
+def report(name: str, durations: list[float], booked: int, total: int, wall: float, peak_memory: int, requests: int) -> dict:
+    return {
+        "scenario": name,
+        "users": total,
+        "booked": booked,
+        "wall_seconds": round(wall, 4),
+        "bookings_per_second": round(booked / wall, 2) if wall else None,
+        "time_to_book_p50_ms": round(percentile(durations, 0.5) * 1000, 2) if durations else None,
+        "time_to_book_p95_ms": round(percentile(durations, 0.95) * 1000, 2) if durations else None,
+        "time_to_book_max_ms": round(max(durations) * 1000, 2) if durations else None,
+        "peak_memory_kb": peak_memory // 1024,
+        "server_requests": requests,
+    }
+
+
+def bench_main(users: int, boxes: int, workers: int, latency: float, capacity: int) -> dict:
+    #Whole booking flow of main(): goal calculation, login, fetch, class selection and booking
+    import main
+
+    with FakeAimHarder(latency=latency, hours_in_advance=HOURS_IN_ADVANCE) as server:
+        set_base_url(server.url)
+        config, _ = build_scenario(server, users, boxes, capacity)
+        configure_pool(pool_maxsize=max(workers, 1))
+        timings.clear()
+        tracemalloc.start()
+        start = time.perf_counter()
+        results = run_users(iter_users(config), main.main, workers=workers)
+        wall = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        set_base_url(None)
+        booked = [result for result in results if result.booked]
+        return report("main", [result.elapsed for result in booked], len(booked), users, wall, peak, server.requests)
+
+
+def bench_client(users: int, boxes: int, workers: int, latency: float, capacity: int) -> dict:
+    #Only the client calls (login, get_classes and book_class) without the rest of main()
+    from concurrent.futures import ThreadPoolExecutor
+
+    with FakeAimHarder(latency=latency, hours_in_advance=HOURS_IN_ADVANCE) as server:
+        set_base_url(server.url)
+        config, class_datetime = build_scenario(server, users, boxes, capacity)
+        configure_pool(pool_maxsize=max(workers, 1))
+
+        def book(user_config):
+            start = time.perf_counter()
+            client = AimHarderClient(user_config["email"], user_config["password"], user_config["box-id"], user_config["box-name"])
+            classes = client.get_classes(class_datetime)
+            target_class = next(c for c in classes if c["className"] == CLASS_NAME)
+            try:
+                client.book_class(class_datetime, target_class)
+            except Exception:
+                return None
+            return time.perf_counter() - start
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            durations = list(executor.map(book, [user_config for _, user_config in iter_users(config)]))
+        wall = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        set_base_url(None)
+        durations = [duration for duration in durations if duration is not None]
+        return report("client", durations, len(durations), users, wall, peak, server.requests)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", default=20, type=int)
+    parser.add_argument("--boxes", default=2, type=int)
+    parser.add_argument("--workers", default=1, type=int)
+    #Seconds added by the fake server to every request
+    parser.add_argument("--latency", default=0.02, type=float)
+    #Places of every class. With less places than users per box there is contention
+    parser.add_argument("--capacity", default=100, type=int)
+    args = parser.parse_args()
+
+    for bench in (bench_client, bench_main):
+        print(json.dumps(bench(args.users, args.boxes, args.workers, args.latency, args.capacity)))
@@ -0,0 +1,92 @@
+#Benchmark of the time-to-book of main() against the local AimHarder stand-in server with the log file written
+#synchronously by the booking threads (as before), through the queue pipeline and through the queue in race mode.
+#--write-delay adds a pause to every write to the log file to emulate a slow disk (e.g. the SD card of a Pi).
+#Run it from the src folder: python -m benchmarks.bench_logging --users 20 --workers 5 --write-delay 0.001
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+import main
+from benchmarks.bench_booking import HOURS_IN_ADVANCE, build_scenario
+from benchmarks.fake_aimharder import FakeAimHarder
+from constants import set_base_url
+from log_pipeline import DEFAULT_LEVELS, LOG_FORMAT, LogPipeline
+from runner import iter_users, run_users
+from timing import percentile
+from transport import configure_pool
+
+
+class SlowFileHandler(RotatingFileHandler):
+    def __init__(self, filename: str, write_delay: float):
+        super().__init__(filename, maxBytes=5242880, backupCount=1)
+        self.write_delay = write_delay
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    def emit(self, record):
+        if self.write_delay:
+            time.sleep(self.write_delay)
+        super().emit(record)
+
+
+def bench(mode: str, users: int, workers: int, latency: float, write_delay: float, log_dir: str) -> dict:
+    handler = SlowFileHandler(os.path.join(log_dir, f"{mode}.log"), write_delay)
+    loggers = [logging.getLogger(name) for name in DEFAULT_LEVELS]
+    for logger in loggers:
+        logger.setLevel(logging.DEBUG)
+    if mode == "sync":
+        for logger in loggers:
+            logger.addHandler(handler)
+        main.log_pipeline = None
+    else:
+        main.log_pipeline = LogPipeline([handler], race_mode=mode == "race").start()
+
+    with FakeAimHarder(latency=latency, hours_in_advance=HOURS_IN_ADVANCE) as server:
+        set_base_url(server.url)
+        config, _ = build_scenario(server, users, 1, users)
+        configure_pool(pool_maxsize=max(workers, 1))
+        start = time.perf_counter()
+        results = run_users(iter_users(config), main.main, workers=workers)
+        wall = time.perf_counter() - start
+        set_base_url(None)
+
+    #The records still queued are written before measuring the next mode
+    flush_start = time.perf_counter()
+    if main.log_pipeline is not None:
+        main.log_pipeline.stop()
+        main.log_pipeline = None
+    else:
+        for logger in loggers:
+            logger.removeHandler(handler)
+    flush = time.perf_counter() - flush_start
+    handler.close()
+
+    durations = [result.elapsed for result in results if result.booked]
+    return {
+        "logging": mode,
+        "users": users,
+        "booked": len(durations),
+        "wall_seconds": round(wall, 4),
+        "time_to_book_p50_ms": round(percentile(durations, 0.5) * 1000, 2) if durations else None,
+        "time_to_book_p95_ms": round(percentile(durations, 0.95) * 1000, 2) if durations else None,
+        "log_flush_after_run_ms": round(flush * 1000, 2),
+        "log_lines": sum(1 for _ in open(os.path.join(log_dir, f"{mode}.log"))),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", default=20, type=int)
+    parser.add_argument("--workers", default=1, type=int)
+    #Seconds added by the fake server to every request
+    parser.add_argument("--latency", default=0.02, type=float)
+    #Seconds added to every write to the log file
+    parser.add_argument("--write-delay", default=0.0, type=float)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        for mode in ("sync", "queue", "race"):
+            print(json.dumps(bench(mode, args.users, args.workers, args.latency, args.write_delay, log_dir)))
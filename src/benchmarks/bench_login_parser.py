@@ -0,0 +1,60 @@
+#Micro-benchmark of the analysis of the login page: the streaming extractor used by the client against a whole
+#BeautifulSoup tree (pip install beautifulsoup4 to include it).
+#Run it from the src folder: python -m benchmarks.bench_login_parser --number 2000
+import argparse
+import json
+import timeit
+import tracemalloc
+
+from constants import ERROR_TAG_ID
+from login_parser import find_element_text
+
+#Roughly the size and shape of the real login page: head with styles and scripts, the form with the error
+#element and a long footer after it
+FILLER = "".join(f'<div class="row"><a href="/link{i}">Link {i}</a><p>Texto de relleno {i}</p></div>' for i in range(200))
+PAGE = (
+    "<!DOCTYPE html><html><head><meta charset='utf-8'><title>AimHarder</title>"
+    "<script>var config = {\"lang\": \"es\"};</script></head><body>"
+    + FILLER
+    + '<form method="post"><input type="text" name="mail"/><input type="password" name="pw"/>'
+    f'<span id="{ERROR_TAG_ID}" class="error">{{error}}</span></form>'
+    + FILLER
+    + "</body></html>"
+)
+
+
+def beautifulsoup_text(content: bytes) -> str | None:
+    from bs4 import BeautifulSoup
+
+    element = BeautifulSoup(content, "html.parser").find(id=ERROR_TAG_ID)
+    return element.text if element is not None else None
+
+
+def measure(function, content: bytes, number: int) -> dict:
+    seconds = min(timeit.repeat(lambda: function(content), number=number, repeat=3)) / number
+    tracemalloc.start()
+    function(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"us_per_call": round(seconds * 1e6, 1), "peak_memory_kb": round(peak / 1024, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", default=1000, type=int)
+    args = parser.parse_args()
+
+    implementations = {"find_element_text": find_element_text}
+    try:
+        import bs4  # noqa: F401
+        implementations["beautifulsoup"] = beautifulsoup_text
+    except ImportError:
+        pass
+
+    pages = {
+        "success": PAGE.replace("{error}", "").encode(),
+        "wrong_credentials": PAGE.replace("{error}", "Usuario o contraseña incorrecto").encode(),
+    }
+    for page_name, content in pages.items():
+        for name, function in implementations.items():
+            print(json.dumps({"page": page_name, "parser": name, "bytes": len(content), **measure(function, content, args.number)}))
@@ -0,0 +1,78 @@
+#Micro-benchmark of the decoding of the classes listing: the previous path (json of the response into the list of
+#classes, the bookState scan and then the index of the day) against Schedule.decode, which builds the index and the
+#booked flag while reading the decoded body once, with the stdlib json and with orjson when it is installed.
+#Run it from the src folder: python -m benchmarks.bench_schedule --classes 40 --number 2000
+import argparse
+import json
+import timeit
+import tracemalloc
+
+import schedule
+from schedule import Schedule, is_day_booked
+
+CLASS_NAMES = ("WOD", "OPEN BOX", "Halterofilia", "Gimnásticos", "Endurance", "Provenza")
+
+
+def listing(classes: int) -> bytes:
+    #Roughly the shape of the real answer: every class comes with its coach, places and box fields
+    bookings = [
+        {
+            "id": 100000 + i,
+            "time": f"{7 + i % 14:02d}:00 - {8 + i % 14:02d}:00",
+            "timeid": f"{7 + i % 14:02d}00_60",
+            "className": CLASS_NAMES[i % len(CLASS_NAMES)],
+            "classId": i % len(CLASS_NAMES),
+            "boxName": "Box de prueba",
+            "boxDir": "Calle Falsa 123",
+            "boxPic": "https://aimharder.com/static/box.png",
+            "coachName": f"Coach {i % 5}",
+            "coachPic": "https://aimharder.com/static/coach.png",
+            "enabled": 1,
+            "limit": 16,
+            "ocupation": i % 17,
+            "waitlist": 0,
+            "bookState": None,
+            "color": "#3a87ad",
+            "resv": 0,
+        }
+        for i in range(classes)
+    ]
+    return json.dumps({"bookings": bookings, "clasesContratadas": "", "hasWaitingList": 0}).encode()
+
+
+def previous_path(content: bytes):
+    classes = json.loads(content).get("bookings")
+    return Schedule(classes), is_day_booked(classes)
+
+
+def decode(content: bytes):
+    day = Schedule.decode(content)
+    return day, day.booked
+
+
+def measure(function, content: bytes, number: int) -> dict:
+    seconds = min(timeit.repeat(lambda: function(content), number=number, repeat=5)) / number
+    #The memory of the decoded listing, without the caches filled by the first call
+    tracemalloc.start()
+    function(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"us_per_call": round(seconds * 1e6, 1), "peak_memory_kb": round(peak / 1024, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--classes", default=40, type=int)
+    parser.add_argument("--number", default=2000, type=int)
+    args = parser.parse_args()
+
+    content = listing(args.classes)
+    installed_orjson = schedule.orjson
+    #The stdlib decoder is measured even when orjson is installed
+    schedule.orjson = None
+    implementations = {"previous": previous_path, "decode_json": decode}
+    for name, function in implementations.items():
+        print(json.dumps({"path": name, "classes": args.classes, "bytes": len(content), **measure(function, content, args.number)}))
+    if installed_orjson is not None:
+        schedule.orjson = installed_orjson
+        print(json.dumps({"path": "decode_orjson", "classes": args.classes, "bytes": len(content), **measure(decode, content, args.number)}))
@@ -0,0 +1,310 @@
+import hashlib
+import json
+import random
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from constants import ERROR_TAG_ID
+from exceptions import TooManyWrongAttempts, IncorrectCredentials
+
+#Wrong logins allowed before AimHarder blocks the account
+MAX_WRONG_ATTEMPTS = 3
+
+
+class FakeClass:
+    __slots__ = ("id", "day", "time", "name", "limit", "waitlist_limit", "booked", "waitlist")
+
+    def __init__(self, class_id: int, day: str, time_str: str, name: str, limit: int, waitlist_limit: int):
+        self.id = class_id
+        self.day = day
+        self.time = time_str
+        self.name = name
+        self.limit = limit
+        self.waitlist_limit = waitlist_limit
+        self.booked = []
+        self.waitlist = []
+
+    def to_dict(self, email: str | None) -> dict:
+        if email in self.booked:
+            book_state = 0
+        elif email in self.waitlist:
+            book_state = 1
+        else:
+            book_state = None
+        return {
+            "id": self.id,
+            "timeid": f"{self.time}_60",
+            "className": self.name,
+            "limit": self.limit,
+            "ocupation": len(self.booked),
+            "waitlength": len(self.waitlist),
+            "bookState": book_state,
+        }
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    #The default listen backlog (5) drops connections when many users connect at once and the client retries them
+    #a second later, which would be measured as latency of the server
+    request_queue_size = 128
+
+
+class FakeAimHarder:
+    #Local stand-in of the AimHarder endpoints used by the bot (/login, /{box}/api/bookings, /{box}/api/book and
+    #/{box}/api/cancelBooking) with the same bookState/errorMssgLang answers. Point the bot to it with
+    #constants.set_base_url(server.url).
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, hours_in_advance: int = 48, credits: int | None = None,
+                 now=datetime.today, etags: bool = False):
+        self.latency = latency
+        self.jitter = jitter
+        self.hours_in_advance = hours_in_advance
+        self.credits = credits
+        self.now = now
+        self.etags = etags
+        self.not_modified = 0
+        #Number of the next requests that hang and for how long (slow or unresponsive server)
+        self._stalled = 0
+        self._stall = 0.0
+        #Number of the next bookings and cancellations that are applied but answered late, and how late
+        self._late_answers = 0
+        self._late_answer = 0.0
+        #When set, every request is answered with 503 (box down)
+        self.unavailable = False
+        self.users = {}
+        self.wrong_attempts = {}
+        self.sessions = {}
+        self.boxes = {}
+        self.requests = 0
+        self._next_id = 1000
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def add_user(self, email: str, password: str):
+        self.users[email] = password
+
+    def add_class(self, box_name: str, day: datetime, time_str: str, name: str, limit: int = 20, waitlist_limit: int = 0) -> int:
+        with self._lock:
+            self._next_id += 1
+            fake_class = FakeClass(self._next_id, day.strftime("%Y%m%d"), time_str, name, limit, waitlist_limit)
+            self.boxes.setdefault(box_name, {}).setdefault(fake_class.day, []).append(fake_class)
+            return fake_class.id
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def start(self) -> "FakeAimHarder":
+        server = self
+
+        class Handler(FakeAimHarderHandler):
+            fake = server
+
+        self._httpd = FakeHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name="fake-aimharder", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def stall_next(self, requests: int, seconds: float):
+        with self._lock:
+            self._stalled = requests
+            self._stall = seconds
+
+    def answer_late_next(self, requests: int, seconds: float):
+        #e.g. a booking accepted by AimHarder whose answer comes after the client timed out
+        with self._lock:
+            self._late_answers = requests
+            self._late_answer = seconds
+
+    def wait_answer(self):
+        with self._lock:
+            if self._late_answers <= 0:
+                return
+            self._late_answers -= 1
+            delay = self._late_answer
+        time.sleep(delay)
+
+    def wait(self):
+        #Simulated network and server latency
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        with self._lock:
+            if self._stalled > 0:
+                self._stalled -= 1
+                delay += self._stall
+        if delay > 0:
+            time.sleep(delay)
+
+    def login(self, email: str, password: str) -> tuple[str | None, str]:
+        with self._lock:
+            if self.wrong_attempts.get(email, 0) >= MAX_WRONG_ATTEMPTS:
+                return None, f"Has introducido la contraseña {TooManyWrongAttempts.key_phrase}"
+            if self.users.get(email) != password:
+                self.wrong_attempts[email] = self.wrong_attempts.get(email, 0) + 1
+                return None, f"Usuario o contraseña {IncorrectCredentials.key_phrase}"
+            self.wrong_attempts.pop(email, None)
+            token = secrets.token_hex(16)
+            self.sessions[token] = email
+            return token, ""
+
+    def find_class(self, box_name: str, class_id: int) -> FakeClass | None:
+        for classes in self.boxes.get(box_name, {}).values():
+            for fake_class in classes:
+                if fake_class.id == class_id:
+                    return fake_class
+        return None
+
+    def book(self, email: str, box_name: str, class_id: int) -> dict:
+        with self._lock:
+            fake_class = self.find_class(box_name, class_id)
+            if fake_class is None:
+                return {"errorMssg": "Clase no encontrada", "errorMssgLang": "ERROR_CLASE"}
+
+            class_datetime = datetime.strptime(f"{fake_class.day}{fake_class.time}", "%Y%m%d%H%M")
+            if class_datetime - timedelta(hours=self.hours_in_advance) > self.now():
+                return {"bookState": -12, "errorMssg": "No puedes reservar con tanta antelación", "errorMssgLang": "ERROR_ANTELACION_CLIENTE_HORAS"}
+
+            same_time = [c for c in self.boxes[box_name][fake_class.day] if c.time == fake_class.time]
+            if any(email in c.booked or email in c.waitlist for c in same_time):
+                return {"bookState": -12, "errorMssg": "No puedes reservar la misma hora", "errorMssgLang": "NOPUEDESRESERVAMISMAHORA"}
+
+            if self.credits is not None:
+                used = sum(email in c.booked or email in c.waitlist for classes in self.boxes[box_name].values() for c in classes)
+                if used >= self.credits:
+                    return {"bookState": -2, "max": self.credits}
+
+            if len(fake_class.booked) < fake_class.limit:
+                fake_class.booked.append(email)
+                return {"bookState": 0, "id": fake_class.id}
+            if len(fake_class.waitlist) < fake_class.waitlist_limit:
+                fake_class.waitlist.append(email)
+                return {"bookState": 1, "id": fake_class.id}
+            return {"bookState": -1}
+
+    def cancel(self, email: str, box_name: str, class_id: int) -> dict:
+        with self._lock:
+            fake_class = self.find_class(box_name, class_id)
+            if fake_class is None or (email not in fake_class.booked and email not in fake_class.waitlist):
+                return {"errorMssg": "Reserva no encontrada", "errorMssgLang": "ERROR_RESERVA"}
+            if email in fake_class.booked:
+                fake_class.booked.remove(email)
+                #The first one of the waiting list gets the place
+                if fake_class.waitlist:
+                    fake_class.booked.append(fake_class.waitlist.pop(0))
+            else:
+                fake_class.waitlist.remove(email)
+            return {"cancelState": 1}
+
+
+class FakeAimHarderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake: FakeAimHarder = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, payload: dict):
+        self._send(HTTPStatus.OK, json.dumps(payload).encode(), "application/json")
+
+    def _login_page(self, error: str = "", headers: dict | None = None):
+        body = f'<html><body><form><span id="{ERROR_TAG_ID}">{error}</span></form></body></html>'
+        self._send(HTTPStatus.OK, body.encode(), "text/html; charset=utf-8", headers)
+
+    def _email(self) -> str | None:
+        for cookie in self.headers.get("Cookie", "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == "amhrdrauth":
+                return self.fake.sessions.get(value)
+        return None
+
+    def _form(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+
+    def _route(self):
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        return url, parts
+
+    def do_HEAD(self):
+        self.fake.count_request()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self.fake.count_request()
+        self.fake.wait()
+        if self.fake.unavailable:
+            return self._send(HTTPStatus.SERVICE_UNAVAILABLE, b"", "text/html")
+        url, parts = self._route()
+        if parts == ["login"]:
+            return self._login_page()
+        if len(parts) == 3 and parts[1:] == ["api", "bookings"]:
+            email = self._email()
+            if email is None:
+                #Not logged in: AimHarder redirects to the login page
+                return self._send(HTTPStatus.FOUND, b"", "text/html", {"Location": "/login"})
+            query = parse_qs(url.query)
+            day = query.get("day", [""])[0]
+            with self.fake._lock:
+                bookings = [c.to_dict(email) for c in self.fake.boxes.get(parts[0], {}).get(day, [])]
+            body = json.dumps({"bookings": bookings}).encode()
+            #Conditional requests, so the pollers can be tested with and without them
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if self.fake.etags and self.headers.get("If-None-Match") == etag:
+                with self.fake._lock:
+                    self.fake.not_modified += 1
+                return self._send(HTTPStatus.NOT_MODIFIED, b"", "application/json", {"ETag": etag})
+            return self._send(HTTPStatus.OK, body, "application/json", {"ETag": etag} if self.fake.etags else None)
+        self._send(HTTPStatus.NOT_FOUND, b"", "text/html")
+
+    def do_POST(self):
+        self.fake.count_request()
+        self.fake.wait()
+        if self.fake.unavailable:
+            return self._send(HTTPStatus.SERVICE_UNAVAILABLE, b"", "text/html")
+        url, parts = self._route()
+        form = self._form()
+        if parts == ["login"]:
+            token, error = self.fake.login(form.get("mail", ""), form.get("pw", ""))
+            headers = {"Set-Cookie": f"amhrdrauth={token}; Path=/"} if token else None
+            return self._login_page(error, headers)
+
+        if len(parts) == 3 and parts[1] == "api" and parts[2] in ("book", "cancelBooking"):
+            email = self._email()
+            if email is None:
+                return self._send(HTTPStatus.FOUND, b"", "text/html", {"Location": "/login"})
+            class_id = int(form.get("id", 0))
+            answer = self.fake.book(email, parts[0], class_id) if parts[2] == "book" else self.fake.cancel(email, parts[0], class_id)
+            self.fake.wait_answer()
+            return self._json(answer)
+        self._send(HTTPStatus.NOT_FOUND, b"", "text/html")
@@ -0,0 +1,126 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from batch import STATUS_CANCELLED
+from runner import STATUS_BOOKED, STATUS_ALREADY_BOOKED, STATUS_BOX_CLOSED, STATUS_NO_BOOKING_GOAL
+
+logger = logging.getLogger('aimharder-bot')
+
+#Outcomes that will not change by trying again the same day, so the next runs can skip it without any request.
+#A cancellation recorded afterwards makes the day bookable again.
+FINAL_STATUSES = (STATUS_BOOKED, STATUS_ALREADY_BOOKED, STATUS_BOX_CLOSED, STATUS_NO_BOOKING_GOAL)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    user TEXT NOT NULL,
+    day TEXT NOT NULL,
+    class_time TEXT,
+    class_name TEXT,
+    class_id INTEGER,
+    status TEXT NOT NULL,
+    error TEXT,
+    latency REAL
+);
+CREATE INDEX IF NOT EXISTS bookings_user_day ON bookings (user, day, id);
+"""
+
+
+class BookingStore:
+    #Local journal (SQLite) of the outcome of every booking attempt, cancellation and final failure per user,
+    #day and class. It lets the runs skip the days already decided without logging in nor fetching the classes,
+    #and it keeps the booking history.
+
+    def __init__(self, path: str):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, mode=0o700, exist_ok=True)
+        self._lock = threading.Lock()
+        #One connection shared by the booking threads, serialized by the lock. WAL lets other processes read it
+        #while a run is writing.
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def record(self, user: str, class_day: datetime, status: str, class_time: str | None = None, class_name: str | None = None,
+               class_id: int | None = None, error: str | None = None, latency: float | None = None):
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO bookings (ts, user, day, class_time, class_name, class_id, status, error, latency) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), user, class_day.strftime("%Y-%m-%d"), class_time, class_name, class_id, status, error, latency),
+            )
+
+    def record_cancel(self, user: str, class_day: datetime, class_id: int | None = None, class_time: str | None = None,
+                      class_name: str | None = None):
+        self.record(user, class_day, STATUS_CANCELLED, class_time, class_name, class_id)
+
+    def day_status(self, user: str, class_day: datetime) -> str | None:
+        #Final status of the day for the user, or None when it has to be tried (nothing recorded, only retryable
+        #failures or the booking was cancelled afterwards)
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT status FROM bookings WHERE user = ? AND day = ? AND status IN ({', '.join('?' * (len(FINAL_STATUSES) + 1))}) ORDER BY id DESC LIMIT 1",
+                (user, class_day.strftime("%Y-%m-%d"), *FINAL_STATUSES, STATUS_CANCELLED),
+            ).fetchone()
+        if row is None or row[0] == STATUS_CANCELLED:
+            return None
+        return row[0]
+
+    def history(self, user: str | None = None, since: datetime | None = None, limit: int = 100) -> list[dict]:
+        #Latest records first
+        query = "SELECT ts, user, day, class_time, class_name, class_id, status, error, latency FROM bookings"
+        conditions, params = self._filters(user, since)
+        with self._lock:
+            cursor = self._connection.execute(f"{query}{conditions} ORDER BY id DESC LIMIT ?", (*params, limit))
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def success_rate(self, user: str | None = None, since: datetime | None = None) -> dict[str, dict]:
+        #{user: {"attempts", "booked", "rate", "latency_avg"}} counting the days in which a booking was attempted
+        #(the days skipped as already booked and the cancellations are not attempts)
+        conditions, params = self._filters(user, since)
+        conditions += (" AND " if conditions else " WHERE ") + "status NOT IN (?, ?)"
+        params += [STATUS_ALREADY_BOOKED, STATUS_CANCELLED]
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT user, COUNT(*), SUM(status = ?), AVG(CASE WHEN status = ? THEN latency END) FROM bookings{conditions} GROUP BY user ORDER BY user",
+                (STATUS_BOOKED, STATUS_BOOKED, *params),
+            ).fetchall()
+        return {
+            row_user: {"attempts": attempts, "booked": booked, "rate": booked / attempts if attempts else 0.0, "latency_avg": latency_avg}
+            for row_user, attempts, booked, latency_avg in rows
+        }
+
+    @staticmethod
+    def _filters(user: str | None, since: datetime | None) -> tuple[str, list]:
+        conditions = []
+        params = []
+        if user is not None:
+            conditions.append("user = ?")
+            params.append(user)
+        if since is not None:
+            conditions.append("day >= ?")
+            params.append(since.strftime("%Y-%m-%d"))
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+
+def format_history(store: BookingStore, user: str | None = None, limit: int = 20) -> str:
+    lines = ["Success rate:"]
+    for row_user, stats in store.success_rate(user).items():
+        latency = f" | avg latency: {stats['latency_avg'] * 1000:.0f} ms" if stats["latency_avg"] is not None else ""
+        lines.append(f"  {row_user}: {stats['booked']}/{stats['attempts']} ({stats['rate'] * 100:.0f}%){latency}")
+    lines.append("Last records:")
+    for record in store.history(user, limit=limit):
+        error = f" ({record['error']})" if record["error"] else ""
+        lines.append(f"  {datetime.fromtimestamp(record['ts']).strftime('%Y-%m-%d %H:%M:%S')} {record['user']} {record['day']} {record['class_time'] or ''} {record['class_name'] or ''}: {record['status']}{error}")
+    return "\n".join(lines)
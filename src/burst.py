@@ -0,0 +1,58 @@
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from exceptions import BookingFailed, TooEarly, MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY
+
+logger = logging.getLogger('aimharder-bot')
+
+DEFAULT_BURST_WINDOW = 0
+DEFAULT_BURST_BASE_DELAY = 0.05
+DEFAULT_BURST_MAX_DELAY = 0.5
+
+
+@dataclass
+class BurstOutcome:
+    booked_class: dict
+    attempts: int
+    #Seconds since the first booking request until the successful one
+    time_to_success: float
+
+
+def book_with_burst(client, target_day: datetime, candidates: list[dict], window: float,
+                    base_delay: float = DEFAULT_BURST_BASE_DELAY, max_delay: float = DEFAULT_BURST_MAX_DELAY,
+                    clock=time.monotonic, sleep=time.sleep) -> BurstOutcome:
+    #Sends the booking request again while AimHarder answers that it is too early (our clock can be slightly ahead
+    #of the server one) during a bounded window, waiting an exponential backoff with jitter between attempts.
+    #When a class is full (bookState = -1) the next candidate class is tried. Any other error stops the burst.
+    start = clock()
+    deadline = start + window
+    attempts = 0
+    last_error = None
+
+    for target_class in candidates:
+        retry = 0
+        while True:
+            attempts += 1
+            try:
+                client.book_class(target_day, target_class)
+                return BurstOutcome(target_class, attempts, clock() - start)
+            except TooEarly as e:
+                last_error = e
+                delay = min(max_delay, base_delay * 2 ** retry) * random.uniform(0.5, 1.0)
+                retry += 1
+                if clock() + delay > deadline:
+                    logger.error(f"Burst window of {window}s exhausted after {attempts} attempts.")
+                    raise
+                sleep(delay)
+            except BookingFailed as e:
+                if e.args and e.args[0] == MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY:
+                    #The class is full, so we try the next alternative class of the goal
+                    logger.info(f"Class {target_class.get('id')} is full. Trying the next alternative class.")
+                    last_error = e
+                    break
+                raise
+
+    raise last_error
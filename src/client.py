@@ -1,26 +1,154 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from http import HTTPStatus
-from bs4 import BeautifulSoup
-from requests import Session
+import hashlib
 import logging
-from constants import LOGIN_ENDPOINT, book_endpoint,classes_endpoint, ERROR_TAG_ID
-from exceptions import BookingFailed, IncorrectCredentials, AlreadyBooked, TooManyWrongAttempts, TooEarly, MESSAGE_BOOKING_FAILED_UNKNOWN, MESSAGE_BOOKING_FAILED_NO_CREDIT, MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY
+from requests.exceptions import ReadTimeout
+from batch import BatchOperation, BatchResult, apply_operation, group_by_day
+from constants import login_endpoint, book_endpoint, cancel_endpoint, classes_endpoint, ERROR_TAG_ID
+from login_parser import find_element_text
+from resilience import endpoint_key, hedged
+from schedule import Schedule
+from transport import new_session
+from session_cache import SessionCache
+from timing import timings
+from exceptions import BookingFailed, BookingUnconfirmed, IncorrectCredentials, AlreadyBooked, TooManyWrongAttempts, TooEarly, MESSAGE_BOOKING_FAILED_UNKNOWN, MESSAGE_BOOKING_FAILED_NO_CREDIT, MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY
+
+
+logger = logging.getLogger('aimharder-bot')
+
+#The requests and the interpretation of the responses are shared by the sync and the async clients
+
+
+def classes_params(box_id: int, target_day: datetime) -> dict:
+    return {
+        "box": box_id,
+        "day": target_day.strftime("%Y%m%d"),
+        "familyId": "",
+    }
+
+
+def book_data(target_day: datetime, target_class: dict) -> dict:
+    return {
+        "id": target_class["id"],
+        "day": target_day.strftime("%Y%m%d"),
+        "insist": 0,
+        "familyId": "",
+    }
+
+
+def cancel_data(target_class: dict) -> dict:
+    return {
+        "id": target_class["id"],
+        "late": 0,
+        "familyId": "",
+    }
+
+
+def check_login_response(content):
+    error = find_element_text(content, ERROR_TAG_ID)
+    if error is not None:
+        if TooManyWrongAttempts.key_phrase in error:
+            raise TooManyWrongAttempts
+        elif IncorrectCredentials.key_phrase in error:
+            raise IncorrectCredentials
+
+
+def check_book_response(status_code: int, response: dict | None, target_day: datetime) -> bool:
+    if status_code == HTTPStatus.OK:
+        if "bookState" in response and response["bookState"] == -1:
+            logger.error("Booking unsuccessful. Max capacity of the waiting list overpassed.")
+            raise BookingFailed(MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY)
+
+        if "bookState" in response and response["bookState"] == -2:
+            logger.error("Booking unsuccessful. There is no available credits. Max number of booked sessions reached.")
+            raise BookingFailed(MESSAGE_BOOKING_FAILED_NO_CREDIT)
+
+        if "bookState" in response and response["bookState"] == -12:
+            if response["errorMssgLang"] == "ERROR_ANTELACION_CLIENTE_HORAS":
+                logger.error("Booking unsuccessful. Too early to book this class.")
+                raise TooEarly(target_day)
+            elif response["errorMssgLang"] == "NOPUEDESRESERVAMISMAHORA":
+                logger.error("Booking unsuccessful. You cannot book the same session twice.")
+                raise AlreadyBooked(target_day)
+
+        if "errorMssg" not in response and "errorMssgLang" not in response:
+            # booking successful
+            logger.info("Booking completed successfully.")
+            return True
+
+    logger.error("UNKNOWN ERROR!!!!!.")
+    raise BookingFailed(MESSAGE_BOOKING_FAILED_UNKNOWN)
+
+
+def check_cancel_response(status_code: int, response: dict | None) -> bool:
+    if status_code == HTTPStatus.OK:
+        if "errorMssg" not in response and "errorMssgLang" not in response:
+            # booking cancellation successful
+            logger.info("Booking cancelled successfully.")
+            return True
+    logger.error("UNKNOWN ERROR!!!!!.")
+    raise BookingFailed(MESSAGE_BOOKING_FAILED_UNKNOWN)
 
 
 class AimHarderClient:
 
-    def __init__(self, email: str, password: str, box_id: int, box_name: str):
+    def __init__(self, email: str, password: str, box_id: int, box_name: str, session_cache: SessionCache | None = None):
         self.logger = logging.getLogger('aimharder-bot')
-        
-        self.session = self._login(email, password)
+
         self.box_id = box_id
         self.box_name = box_name
-        
+        self._email = email
+        self._password = password
+        self._session_cache = session_cache
+        self._cached_session = False
+
+        #If there is a cached session we skip the login. It is revalidated with the first request to the box
+        if session_cache is not None:
+            session = new_session()
+            if session_cache.load(email, box_name, session):
+                self.logger.info(f"Reusing cached session for {email}.")
+                self.session = session
+                self._cached_session = True
+                return
+
+        with timings.span("login"):
+            self.session = self._login(email, password)
+        if session_cache is not None:
+            session_cache.save(email, box_name, self.session)
+
+    def revalidate(self):
+        #The session has been idle for a while (e.g. a client kept by the daemon between bookings), so the next
+        #fetch of classes checks that it is still logged in
+        self._cached_session = True
+
+    def _relogin(self):
+        self.logger.info(f"Session of {self._email} is not valid anymore. Logging in again.")
+        if self._session_cache is not None:
+            self._session_cache.invalidate(self._email, self.box_name)
+        self.session = self._login(self._email, self._password)
+        if self._session_cache is not None:
+            self._session_cache.save(self._email, self.box_name, self.session)
+        self._cached_session = False
+
+    @staticmethod
+    def _session_expired(response) -> bool:
+        #When the session is not valid anymore AimHarder answers 401/403 or redirects to the login page instead of
+        #answering with json. Any other error (e.g. the 5xx page of a box that is down) is raised: logging in again
+        #would not help, and it would drop a valid cached session.
+        if response.status_code in (HTTPStatus.UNAUTHORIZED, HTTPStatus.FORBIDDEN):
+            return True
+        if response.url.startswith(login_endpoint()):
+            return True
+        response.raise_for_status()
+        return response.status_code == HTTPStatus.OK and "json" not in response.headers.get("Content-Type", "")
+
     @staticmethod
     def _login(email: str, password: str):
-        session = Session()
+        #The session keeps the cookies of the user but reuses the connections shared by all the users
+        session = new_session()
         response = session.post(
-            LOGIN_ENDPOINT,
+            login_endpoint(),
             data={
                 "login": "Log in",
                 "mail": email,
@@ -28,77 +156,100 @@ class AimHarderClient:
             },
         )
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser").find(id=ERROR_TAG_ID)
-        if soup is not None:
-            if TooManyWrongAttempts.key_phrase in soup.text:
-                raise TooManyWrongAttempts
-            elif IncorrectCredentials.key_phrase in soup.text:
-                raise IncorrectCredentials
+        with timings.span("login.parse"):
+            check_login_response(response.content)
         return session
 
+    def _fetch_classes(self, target_day: datetime):
+        #Fetching the classes is idempotent, so a slow request can be hedged with a second one
+        url = classes_endpoint(self.box_name)
+        return hedged(lambda session: session.get(url, params=classes_params(self.box_id, target_day)), self.session, endpoint_key("GET", url))
+
+    def _get_classes_response(self, target_day: datetime):
+        response = self._fetch_classes(target_day)
+        if self._cached_session:
+            #First request done with a cached session, so we check that it is still logged in
+            if self._session_expired(response):
+                self._relogin()
+                response = self._fetch_classes(target_day)
+            self._cached_session = False
+        return response
+
     def get_classes(self, target_day: datetime):
-        response = self.session.get(
-            classes_endpoint(self.box_name),
-            params={
-                "box": self.box_id,
-                "day": target_day.strftime("%Y%m%d"),
-                "familyId": "",
-            },
-        )
-        bookings = response.json().get("bookings")
-        self.logger.info(f"Retrieved {len(bookings)} classes for day {target_day.strftime('%Y-%m-%d')}")
+        with timings.span("get_classes"):
+            response = self._get_classes_response(target_day)
+            with timings.span("get_classes.parse"):
+                bookings = response.json().get("bookings")
+        #Lazy formatting: the message is only built by the log writer thread, out of the booking path
+        self.logger.info("Retrieved %d classes for day %s", len(bookings), target_day.date())
         return bookings
 
+    def get_schedule(self, target_day: datetime) -> Schedule:
+        #Same request than get_classes, but the body is decoded straight into the indexed schedule of the day
+        with timings.span("get_classes"):
+            response = self._get_classes_response(target_day)
+            with timings.span("get_classes.parse"):
+                schedule = Schedule.decode(response.content)
+        self.logger.info("Retrieved %d classes for day %s", len(schedule), target_day.date())
+        return schedule
+
+    def get_classes_if_changed(self, target_day: datetime, validators: dict) -> list[dict] | None:
+        #Conditional fetch for the pollers. The validators of the previous response (ETag, Last-Modified and the
+        #digest of the body) are kept in the given dict, so an unchanged listing returns None without being parsed.
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        with timings.span("get_classes"):
+            response = self.session.get(classes_endpoint(self.box_name), params=classes_params(self.box_id, target_day), headers=headers)
+            if response.status_code == HTTPStatus.NOT_MODIFIED:
+                return None
+            if self._session_expired(response):
+                #Long polling outlives the session, so we log in again
+                self._relogin()
+                response = self._fetch_classes(target_day)
+            response.raise_for_status()
+        validators["etag"] = response.headers.get("ETag")
+        validators["last_modified"] = response.headers.get("Last-Modified")
+        digest = hashlib.blake2b(response.content, digest_size=16).digest()
+        if digest == validators.get("digest"):
+            return None
+        validators["digest"] = digest
+        return response.json().get("bookings")
+
     def book_class(self, target_day: datetime, target_class: str) -> bool:
-        response = self.session.post(
-            book_endpoint(self.box_name),
-            data={
-                "id": target_class["id"],
-                "day": target_day.strftime("%Y%m%d"),
-                "insist": 0,
-                "familyId": "",
-            },
-        )
-        if response.status_code == HTTPStatus.OK:
-            response = response.json()
-            if "bookState" in response and response["bookState"] == -1:
-                self.logger.error(f"Booking unsuccessful. Max capacity of the waiting list overpassed.")
-                raise BookingFailed(MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY)
-            
-            if "bookState" in response and response["bookState"] == -2:
-                self.logger.error(f"Booking unsuccessful. There is no available credits. Max number of booked sessions reached.")
-                raise BookingFailed(MESSAGE_BOOKING_FAILED_NO_CREDIT)
-            
-            if "bookState" in response and response["bookState"] == -12:               
-                if response["errorMssgLang"] == "ERROR_ANTELACION_CLIENTE_HORAS":
-                    self.logger.error(f"Booking unsuccessful. Too early to book this class.")
-                    raise TooEarly(target_day)
-                elif response["errorMssgLang"] == "NOPUEDESRESERVAMISMAHORA":
-                    self.logger.error(f"Booking unsuccessful. You cannot book the same session twice.")
-                    raise AlreadyBooked(target_day)
-                
-            if "errorMssg" not in response and "errorMssgLang" not in response:
-                # booking successful
-                self.logger.info(f"Booking completed successfully.")
-                return True
-            
-        self.logger.error(f"UNKNOWN ERROR!!!!!.")
-        raise BookingFailed(MESSAGE_BOOKING_FAILED_UNKNOWN)
-    
+        with timings.span("book_class"):
+            try:
+                response = self.session.post(
+                    book_endpoint(self.box_name),
+                    data=book_data(target_day, target_class),
+                )
+            except ReadTimeout as e:
+                #The request was sent, so the class may be booked anyway
+                raise BookingUnconfirmed(target_class) from e
+        return check_book_response(response.status_code, response.json() if response.status_code == HTTPStatus.OK else None, target_day)
+
     def cancel_booked_class(self, target_class: str) -> bool:
-        response = self.session.post(
-            classes_endpoint(self.box_name),
-            data={
-                "id": target_class["id"],
-                "late": 0,
-                "familyId": "",
-            },
-        )
-        if response.status_code == HTTPStatus.OK:
-            response = response.json()
-            if "errorMssg" not in response and "errorMssgLang" not in response:
-                # booking cancellation successful
-                self.logger.info(f"Booking cancelled successfully.")
-                return True
-        self.logger.error(f"UNKNOWN ERROR!!!!!.")
-        raise BookingFailed(MESSAGE_BOOKING_FAILED_UNKNOWN)
+        with timings.span("cancel_booked_class"):
+            response = self.session.post(
+                cancel_endpoint(self.box_name),
+                data=cancel_data(target_class),
+            )
+        return check_cancel_response(response.status_code, response.json() if response.status_code == HTTPStatus.OK else None)
+
+    def run_batch(self, operations: list[BatchOperation], max_workers: int = 4) -> list[BatchResult]:
+        #Cancels and rebooks many days at once. The days are processed concurrently and, within every operation,
+        #the classes are only cancelled after the replacement is booked. The results keep the order of the operations.
+        results = [None] * len(operations)
+
+        def run_day(indexes: list[int]):
+            for index in indexes:
+                results[index] = apply_operation(self, operations[index])
+
+        groups = group_by_day(operations)
+        if groups:
+            with ThreadPoolExecutor(max_workers=min(len(groups), max_workers), thread_name_prefix="batch") as executor:
+                for future in [executor.submit(run_day, indexes) for indexes in groups]:
+                    future.result()
+        return results
@@ -0,0 +1,65 @@
+import logging
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+from constants import login_endpoint
+
+logger = logging.getLogger('aimharder-bot')
+
+DEFAULT_CLOCK_SAMPLES = 5
+
+
+class ClockSync:
+    #Estimates the offset between our clock and the AimHarder one from the Date header of several cheap requests.
+    #The header has a resolution of one second, so every sample only tells that the offset is within
+    #[Date - t_received, Date + 1 - t_sent]. Spreading the samples along a second and intersecting those
+    #intervals narrows the estimation down to the round trip time.
+
+    def __init__(self, url: str | None = None, samples: int = DEFAULT_CLOCK_SAMPLES, fetch_date=None,
+                 clock=time.time, sleep=time.sleep):
+        self.url = url or login_endpoint()
+        self.samples = samples
+        self._fetch_date = fetch_date or self._head_date
+        self._clock = clock
+        self._sleep = sleep
+        self.offset = 0.0
+        self.uncertainty = None
+        self.rtt = None
+
+    def _head_date(self) -> str:
+        from transport import new_session
+
+        response = new_session().head(self.url, allow_redirects=False)
+        return response.headers["Date"]
+
+    def sync(self) -> float:
+        low, high = float("-inf"), float("inf")
+        midpoints = []
+        rtts = []
+        for index in range(self.samples):
+            if index:
+                #Samples spread along a second so they see the Date header change at different phases
+                self._sleep(1.0 / self.samples)
+            sent = self._clock()
+            server_second = parsedate_to_datetime(self._fetch_date()).timestamp()
+            received = self._clock()
+            rtts.append(received - sent)
+            sample_low, sample_high = server_second - received, server_second + 1 - sent
+            midpoints.append((sample_low + sample_high) / 2)
+            low, high = max(low, sample_low), min(high, sample_high)
+
+        self.rtt = sorted(rtts)[len(rtts) // 2]
+        if low <= high:
+            self.offset = (low + high) / 2
+            self.uncertainty = (high - low) / 2
+        else:
+            #The intervals do not intersect (e.g. several servers with different clocks), so we use the median
+            self.offset = sorted(midpoints)[len(midpoints) // 2]
+            self.uncertainty = 0.5 + self.rtt / 2
+        logger.info(f"Clock offset with AimHarder: {self.offset * 1000:+.0f} ms (+/- {self.uncertainty * 1000:.0f} ms, rtt {self.rtt * 1000:.0f} ms)")
+        return self.offset
+
+    def now(self) -> datetime:
+        #Current local time corrected with the estimated offset of the AimHarder clock
+        return datetime.fromtimestamp(self._clock() + self.offset)
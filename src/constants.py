@@ -2,16 +2,33 @@ LOGIN_ENDPOINT = "https://aimharder.com/login"
 
 ERROR_TAG_ID = "loginErrors"
 
+#When set, every endpoint points to this server instead of aimharder.com (e.g. the local stand-in used by the
+#benchmarks). The boxes are then served under a path instead of a sub-domain: {base_url}/{box_name}/api/...
+_base_url = None
+
+
+def set_base_url(base_url: str | None):
+    global _base_url
+    _base_url = base_url.rstrip('/') if base_url else None
+
+
+def login_endpoint():
+    return f"{_base_url}/login" if _base_url else LOGIN_ENDPOINT
+
+
+def box_url(box_name):
+    return f"{_base_url}/{box_name}" if _base_url else f"https://{box_name}.aimharder.com"
+
 
 def book_endpoint(box_name):
-    return f"https://{box_name}.aimharder.com/api/book"
+    return f"{box_url(box_name)}/api/book"
 
 
 def classes_endpoint(box_name):
-    return f"https://{box_name}.aimharder.com/api/bookings"
+    return f"{box_url(box_name)}/api/bookings"
 
 def cancel_endpoint(box_name):
     #id: 86199208
     #late: 0
     #familyId: 
-    return f"https://{box_name}.aimharder.com/api/cancelBooking"
+    return f"{box_url(box_name)}/api/cancelBooking"
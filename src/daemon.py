@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from plan import BookingPlan
+from runner import BookingResult, iter_users, STATUS_ERROR
+from scheduler import sleep_until, DEFAULT_PREWARM_SECONDS
+
+logger = logging.getLogger('aimharder-bot')
+
+#Seconds between checks of the modification of the configuration file
+DEFAULT_RELOAD_INTERVAL = 5
+#Number of upcoming booking window openings written to the status file
+STATUS_UPCOMING = 20
+
+
+def default_client_factory(email: str, password: str, box_id: int, box_name: str, session_cache=None):
+    from client import AimHarderClient
+    return AimHarderClient(email=email, password=password, box_id=box_id, box_name=box_name, session_cache=session_cache)
+
+
+class WarmClients:
+    #Logged in clients kept between the bookings of every user, so the daemon does not log in again every time.
+    #A client is replaced when the credentials or the box of its user change.
+
+    def __init__(self, factory: Callable = default_client_factory):
+        self._factory = factory
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, user: str, email: str, password: str, box_id: int, box_name: str, session_cache=None):
+        key = (email, password, box_id, box_name)
+        with self._lock:
+            entry = self._clients.get(user)
+        if entry is not None and entry[0] == key:
+            #The session may have expired since the last booking, so it is checked with the next request
+            entry[1].revalidate()
+            return entry[1]
+        client = self._factory(email, password, box_id, box_name, session_cache)
+        with self._lock:
+            self._clients[user] = (key, client)
+        return client
+
+    def discard(self, user: str):
+        with self._lock:
+            self._clients.pop(user, None)
+
+    def users(self) -> list[str]:
+        with self._lock:
+            return list(self._clients)
+
+
+class BookingDaemon:
+    #Long-running mode that replaces the cron runs. The configuration file is watched and, when it changes, the
+    #users and goals are reloaded without a restart: the bookings already launched are not affected and the plan of
+    #the next openings is rebuilt. Every booking is launched some seconds before its window opens (as in scheduler
+    #mode) and the upcoming openings and the last results are written to a status file.
+
+    def __init__(self, config_path: str, load_config: Callable[[], list], task: Callable,
+                 prewarm_seconds: float = DEFAULT_PREWARM_SECONDS, now: Callable[[], datetime] = datetime.today,
+                 status_path: str | None = None, reload_interval: float = DEFAULT_RELOAD_INTERVAL,
+                 warm_clients: WarmClients | None = None, stop: threading.Event | None = None):
+        self.config_path = config_path
+        self._load_config = load_config
+        self._task = task
+        self.prewarm_seconds = prewarm_seconds
+        self._now = now
+        self.status_path = status_path
+        self.reload_interval = reload_interval
+        self.warm_clients = warm_clients
+        self.stop = stop or threading.Event()
+        self.users = {}
+        self.plan = BookingPlan([])
+        self.loaded_at = None
+        self.results = {}
+        self._config_mtime = None
+        self._lock = threading.Lock()
+        self._status_lock = threading.Lock()
+
+    def reload(self) -> bool:
+        #Loads the configuration again if the file changed. It returns whether the users or goals changed.
+        try:
+            mtime = os.stat(self.config_path).st_mtime_ns
+        except OSError as e:
+            logger.error(f"Configuration file can not be read: {e}")
+            return False
+        if mtime == self._config_mtime:
+            return False
+        self._config_mtime = mtime
+
+        try:
+            users = dict(iter_users(self._load_config()))
+            plan = BookingPlan.from_users(list(users.items()))
+        except Exception as e:
+            #A wrong edit must not stop the daemon, so the previous configuration is kept
+            logger.error(f"Configuration not reloaded, keeping the previous one: {e}")
+            return False
+
+        added = users.keys() - self.users.keys()
+        removed = self.users.keys() - users.keys()
+        changed = {user for user in users.keys() & self.users.keys() if users[user] != self.users[user]}
+        if self.warm_clients is not None:
+            for user in removed | changed:
+                self.warm_clients.discard(user)
+        first_load = self.loaded_at is None
+        with self._lock:
+            self.users = users
+            self.plan = plan
+            self.loaded_at = self._now()
+        if first_load or added or removed or changed:
+            logger.info(f"Configuration loaded: {len(users)} users, {len(plan)} goals (added: {sorted(added)}, removed: {sorted(removed)}, changed: {sorted(changed)})")
+        self.write_status()
+        return bool(added or removed or changed)
+
+    def upcoming(self, limit: int = STATUS_UPCOMING) -> list[dict]:
+        with self._lock:
+            plan = self.plan
+        attempts = []
+        cursor = self._now()
+        for opening, goals in plan.openings(cursor, cursor + timedelta(days=7)):
+            for goal in goals:
+                attempts.append({
+                    "opens_at": opening.isoformat(),
+                    "fires_at": (opening - timedelta(seconds=self.prewarm_seconds)).isoformat(),
+                    "user": goal.user,
+                    "class": f"{goal.time} {goal.class_name}",
+                    "class_at": (opening + timedelta(hours=goal.hours_in_advance)).isoformat(),
+                })
+            if len(attempts) >= limit:
+                break
+        return attempts[:limit]
+
+    def status(self) -> dict:
+        with self._lock:
+            results = dict(self.results)
+            users = sorted(self.users)
+        return {
+            "updated_at": self._now().isoformat(),
+            "config": self.config_path,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "users": users,
+            "warm_clients": sorted(self.warm_clients.users()) if self.warm_clients is not None else [],
+            "upcoming": self.upcoming(),
+            "last_results": results,
+        }
+
+    def write_status(self):
+        if self.status_path is None:
+            return
+        tmp_path = f"{self.status_path}.tmp"
+        try:
+            with self._status_lock:
+                with open(tmp_path, 'w') as file:
+                    json.dump(self.status(), file, indent=2)
+                #The file is replaced atomically so it is never read half written
+                os.replace(tmp_path, self.status_path)
+        except OSError as e:
+            logger.error(f"Status file could not be written: {e}")
+
+    def _book(self, user_name: str, configuration: dict, opening: datetime):
+        start = time.perf_counter()
+        try:
+            result = self._task(user_name, configuration, opening)
+        except Exception as e:
+            logger.exception(f"{user_name} - Booking task failed")
+            result = BookingResult(user_name, status=STATUS_ERROR, error=str(e) or type(e).__name__)
+        with self._lock:
+            self.results[user_name] = {
+                "opening": opening.isoformat(),
+                "status": getattr(result, "status", None),
+                "error": getattr(result, "error", None),
+                "elapsed": round(time.perf_counter() - start, 3),
+            }
+        self.write_status()
+
+    def _wait(self, until: datetime) -> bool:
+        #Waits until the instant checking the configuration file meanwhile. It returns False when the plan changed
+        #(or the daemon was stopped) before reaching it.
+        while not self.stop.is_set():
+            remaining = (until - self._now()).total_seconds()
+            if remaining <= 1:
+                sleep_until(until, self._now)
+                return True
+            self.stop.wait(min(self.reload_interval, remaining - 1))
+            if self.reload():
+                return False
+        return False
+
+    def run(self):
+        self.reload()
+        cursor = self._now()
+        while not self.stop.is_set():
+            with self._lock:
+                next_opening = self.plan.next_opening(cursor)
+            if next_opening is None:
+                #Nothing to book, we just wait for changes of the configuration
+                self.stop.wait(self.reload_interval)
+                self.reload()
+                continue
+
+            opening, goals = next_opening
+            user_names = list(dict.fromkeys(goal.user for goal in goals))
+            logger.info(f"Next slot opening at {opening.strftime('%Y-%m-%d %H:%M:%S')} for {', '.join(user_names)}")
+            if not self._wait(opening - timedelta(seconds=self.prewarm_seconds)):
+                continue
+
+            with self._lock:
+                configs = {user_name: self.users[user_name] for user_name in user_names if user_name in self.users}
+            for user_name, configuration in configs.items():
+                threading.Thread(target=self._book, args=(user_name, configuration, opening), name=f"booking-{user_name}", daemon=True).start()
+            cursor = opening
+            self.write_status()
@@ -29,4 +29,14 @@ class AlreadyBooked(Exception):
     pass
 
 class TooEarly(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class BookingUnconfirmed(Exception):
+    #The booking request timed out, so it is not known whether AimHarder booked the class
+    pass
+
+class InvalidBookingGoal(Exception):
+    pass
+
+class CircuitOpen(Exception):
+    pass
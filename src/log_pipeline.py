@@ -0,0 +1,123 @@
+import atexit
+import logging
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s - %(message)s'
+#Levels of the loggers written to the log file. They can be changed per module with --log-levels
+DEFAULT_LEVELS = {"aimharder-bot": logging.DEBUG, "requests": logging.DEBUG, "urllib3": logging.DEBUG}
+#Loggers whose debug records are held in memory while a booking is in flight (race mode)
+RACE_HELD_LOGGERS = ("requests", "urllib3")
+#Records held during one booking window at most. The oldest ones are dropped if there are more.
+MAX_HELD_RECORDS = 10000
+
+
+def parse_levels(spec: str | None) -> dict[str, int]:
+    #"urllib3=INFO,aimharder-bot=DEBUG" => {"urllib3": 20, "aimharder-bot": 10}
+    levels = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, _, level = item.partition("=")
+        value = logging.getLevelName(level.strip().upper())
+        if not name.strip() or not isinstance(value, int):
+            raise ValueError(f"{item}: expected 'logger=LEVEL'")
+        levels[name.strip()] = value
+    return levels
+
+
+class PipelineHandler(QueueHandler):
+    #Only puts the records in the queue, so the thread that logs never formats them nor waits for the disk. The
+    #message is formatted by the listener thread when it is written.
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self._held = None
+        self._depth = 0
+        self._race_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        #The queue never leaves the process, so the record can be passed as it is (QueueHandler would format it here)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self._held is not None and record.levelno < logging.WARNING and record.name.split(".")[0] in RACE_HELD_LOGGERS:
+            with self._race_lock:
+                if self._held is not None:
+                    self._held.append(record)
+                    return
+        self.queue.put_nowait(record)
+
+    def start_race(self):
+        with self._race_lock:
+            self._depth += 1
+            if self._held is None:
+                self._held = deque(maxlen=MAX_HELD_RECORDS)
+
+    def end_race(self):
+        #The records held are written once the last booking in flight ends
+        with self._race_lock:
+            self._depth -= 1
+            if self._depth > 0 or self._held is None:
+                return
+            held, self._held = self._held, None
+        for record in held:
+            self.queue.put_nowait(record)
+
+
+class LogPipeline:
+    #Logging of the bot through a queue: the booking threads only enqueue the records and one listener thread
+    #writes them to the handlers (the rotating log file). In race mode the HTTP debug records of the bookings in
+    #flight are held in memory and written after the booking.
+
+    def __init__(self, handlers: list[logging.Handler], levels: dict[str, int] | None = None, race_mode: bool = False):
+        self.levels = {**DEFAULT_LEVELS, **(levels or {})}
+        self.race_mode = race_mode
+        self.queue = queue.SimpleQueue()
+        self.handler = PipelineHandler(self.queue)
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self._started = False
+
+    def start(self):
+        for name, level in self.levels.items():
+            logger = logging.getLogger(name)
+            logger.setLevel(level)
+            #The records of a child logger (e.g. urllib3.connectionpool) reach the handler of its parent
+            if not any(name.startswith(f"{parent}.") for parent in self.levels):
+                logger.addHandler(self.handler)
+        self.listener.start()
+        self._started = True
+        #The records still in the queue are written before the interpreter exits
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        if not self._started:
+            return
+        self._started = False
+        for name in self.levels:
+            logging.getLogger(name).removeHandler(self.handler)
+        self.listener.stop()
+
+    @contextmanager
+    def _race(self):
+        self.handler.start_race()
+        try:
+            yield
+        finally:
+            self.handler.end_race()
+
+    def race(self):
+        #Context of a booking in flight
+        return self._race() if self.race_mode else nullcontext()
+
+
+def file_pipeline(log_fname: str, levels: dict[str, int] | None = None, race_mode: bool = False) -> LogPipeline:
+    #5Mb = 5242880 bytes
+    file_handler = RotatingFileHandler(log_fname, maxBytes=5242880, backupCount=1)
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return LogPipeline([file_handler], levels, race_mode)
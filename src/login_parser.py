@@ -0,0 +1,70 @@
+from html.parser import HTMLParser
+
+from constants import ERROR_TAG_ID
+
+#Elements without closing tag, which must not be counted as open while looking for the end of the error element
+VOID_ELEMENTS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr",
+))
+
+
+class ErrorElementParser(HTMLParser):
+    #Collects the text of the element with the given id and stops as soon as that element is closed,
+    #without building any tree of the page
+
+    def __init__(self, element_id: str):
+        super().__init__(convert_charrefs=True)
+        self.element_id = element_id
+        self.found = False
+        self.done = False
+        self.depth = 0
+        self.text = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if self.found:
+            if tag not in VOID_ELEMENTS:
+                self.depth += 1
+        elif any(name == "id" and value == self.element_id for name, value in attrs):
+            self.found = True
+            self.depth = 0 if tag in VOID_ELEMENTS else 1
+            self.done = self.depth == 0
+
+    def handle_startendtag(self, tag, attrs):
+        #<tag/> never has content
+        if not self.found and any(name == "id" and value == self.element_id for name, value in attrs):
+            self.found = self.done = True
+
+    def handle_endtag(self, tag):
+        if self.found and not self.done and tag not in VOID_ELEMENTS:
+            self.depth -= 1
+            self.done = self.depth == 0
+
+    def handle_data(self, data):
+        if self.found and not self.done:
+            self.text.append(data)
+
+
+def find_element_text(content: bytes | str, element_id: str = ERROR_TAG_ID, chunk_size: int = 1024) -> str | None:
+    #Text of the element with the given id, or None when the page does not have it. The id is first looked for
+    #with a plain substring search, so pages without it are not parsed at all, and the parsing starts at the tag
+    #that contains it and stops once the element is closed.
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    position = content.find(element_id)
+    while position != -1:
+        start = content.rfind("<", 0, position)
+        if start == -1:
+            return None
+        parser = ErrorElementParser(element_id)
+        for offset in range(start, len(content), chunk_size):
+            parser.feed(content[offset:offset + chunk_size])
+            if parser.done:
+                break
+        parser.close()
+        if parser.found:
+            return "".join(parser.text)
+        #The id was part of a text or another attribute, so we keep looking
+        position = content.find(element_id, position + len(element_id))
+    return None
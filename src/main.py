@@ -1,132 +1,217 @@
 import argparse
 import os
+import sys
 import traceback
 import logging
-import logging.handlers as handlers
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import replace
 from datetime import datetime, timedelta
-
-import telebot
-import yaml
-
-from client import AimHarderClient
-from exceptions import NoBookingGoal, NoTrainingDay, BoxClosed, AlreadyBooked, TooEarly
-
-def init_logger():
-
-    logger = logging.getLogger('aimharder-bot')
-    logger.setLevel(logging.DEBUG)
-    req_logger = logging.getLogger("requests")
-    req_logger.setLevel(logging.DEBUG)
-    url_logger = logging.getLogger("urllib3")
-    url_logger.setLevel(logging.DEBUG)
-
-    #20Mb = 20971520 bytes
-    #15Mb = 15728640 bytes
-    #5Mb = 5242880 bytes
+from typing import TYPE_CHECKING
+
+from exceptions import NoBookingGoal, NoTrainingDay, BoxClosed, AlreadyBooked, TooEarly, BookingFailed, BookingUnconfirmed, MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY
+from schedule import Schedule, parse_start_time, BOOKED_STATES
+from plan import BookingPlan, compile_goals, open_windows
+from batch import parse_changes, change_for_day, plan_operation, STATUS_CANCELLED
+from burst import book_with_burst, DEFAULT_BURST_WINDOW
+from clock import ClockSync, DEFAULT_CLOCK_SAMPLES
+from notifications import NotificationDispatcher
+from log_pipeline import LogPipeline, file_pipeline, parse_levels
+from timing import timings, user_context
+from scheduler import sleep_until, run_scheduler, DEFAULT_PREWARM_SECONDS
+from daemon import BookingDaemon, WarmClients, DEFAULT_RELOAD_INTERVAL
+from waitlist import WaitlistWatcher, WatchTarget
+from runner import BookingResult, iter_users, run_users, format_summary, STATUS_BOOKED, STATUS_FAILED, STATUS_ERROR, \
+    STATUS_ALREADY_BOOKED, STATUS_BOX_CLOSED, STATUS_NO_TRAINING_DAY, STATUS_TOO_EARLY, STATUS_NO_BOOKING_GOAL, STATUS_WATCHING
+
+#requests, urllib3 and yaml take most of the startup time, so they are only imported once it is known that some
+#user has to log in (most of the cron runs end without any booking window open)
+if TYPE_CHECKING:
+    from session_cache import SessionCache
+    from booking_store import BookingStore
+
+logger = logging.getLogger('aimharder-bot')
+
+#On-disk cache of logged in sessions. It is only used when enabled with --session-cache
+session_cache: "SessionCache | None" = None
+#Seconds during which the booking request is retried while it is too early (0 disables the burst mode)
+burst_window: float = DEFAULT_BURST_WINDOW
+#Whether the burst mode tries the alternative class names of the goal when a class is full
+burst_fallback: bool = False
+#Estimation of the AimHarder clock. It is only used when enabled with --clock-sync
+clock_sync: ClockSync | None = None
+#Journal of the booking outcomes, used to skip the days already decided. It is only used when enabled with --booking-store
+booking_store: "BookingStore | None" = None
+BOOKING_STORE_PATH = os.path.join('cache', 'bookings.db')
+#Pollers of the full classes waiting for a freed place. It is only used when enabled with --watch-waitlist
+waitlist_watcher: WaitlistWatcher | None = None
+#Maximum number of days whose schedules are fetched at the same time by a user (catch-up and exceptions)
+MAX_CONCURRENT_FETCHES = 7
+#Status of the days whose booking is skipped in catch-up mode
+EXCEPTION_STATUSES = {
+    AlreadyBooked: STATUS_ALREADY_BOOKED,
+    BoxClosed: STATUS_BOX_CLOSED,
+    NoBookingGoal: STATUS_NO_BOOKING_GOAL,
+    TooEarly: STATUS_TOO_EARLY,
+}
+#Logged in clients kept between the bookings of the users. It is only used in daemon mode
+warm_clients: WarmClients | None = None
+#Seconds ahead of the local clock in which a booking window is considered open at startup when the clock is synced
+STARTUP_CLOCK_MARGIN = 60
+#Queue and background writer of the log file, set up by init_logger
+log_pipeline: LogPipeline | None = None
+#Telegram messages are queued and sent by a background thread, so they never delay the bookings
+notifier = NotificationDispatcher()
+
+def current_time() -> datetime:
+    #The booking windows are decided by the AimHarder clock, so we use it when its offset has been estimated
+    if clock_sync is not None:
+        return clock_sync.now()
+    return datetime.today()
+
+def init_logger(levels: dict[str, int] | None = None, race_mode: bool = False, log_name: str = 'aimharder-bot.log'):
+    global log_pipeline
 
     #We set the logs folder directory to be on the same folder of the execution file
     log_dir = os.path.join(os.path.normpath(os.getcwd() + os.sep), 'logs')
-    log_fname = os.path.join(log_dir, 'aimharder-bot.log')
+    log_fname = os.path.join(log_dir, log_name)
 
     #Create folder if it does not exist
     create_folder_if_not_exists(log_dir)
 
-    logHandler = handlers.RotatingFileHandler(log_fname, maxBytes=5242880, backupCount=1)
-    logHandler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s - %(message)s')
-    logHandler.setFormatter(formatter)
+    #The records are written to the rotating file by a background thread, so the bookings never wait for the disk
+    log_pipeline = file_pipeline(log_fname, levels, race_mode).start()
+    return logging.getLogger('aimharder-bot')
+
+def configure_shard(index: int, options: dict, transport_factory):
+    #Sets up the process of a shard (see shards.py) like the command line does for a single process run.
+    #Every shard writes its own log file, since the rotation of a file shared by several processes is not safe.
+    global logger, session_cache, booking_store, burst_window, burst_fallback, clock_sync, notifier
+    from constants import set_base_url
+    from transport import configure_pool
+
+    logger = init_logger(parse_levels(options.get("log_levels")), options.get("race_mode", False), f"aimharder-bot.shard{index}.log")
+    set_base_url(options.get("base_url"))
+    configure_pool(pool_maxsize=options.get("pool_size") or max(options.get("workers", 1), 1))
+    if options.get("hedge"):
+        from resilience import configure_resilience
+        configure_resilience(hedge=True)
+    if options.get("session_cache"):
+        from session_cache import SessionCache
+        session_cache = SessionCache(os.path.join(os.path.normpath(os.getcwd() + os.sep), 'cache', 'sessions'))
+    if options.get("booking_store"):
+        from booking_store import BookingStore
+        booking_store = BookingStore(BOOKING_STORE_PATH)
+    burst_window = options.get("burst_window", DEFAULT_BURST_WINDOW)
+    burst_fallback = options.get("burst_fallback", False)
+    #The AimHarder clock is estimated once by the parent process
+    if options.get("clock_offset") is not None:
+        clock_sync = ClockSync()
+        clock_sync.offset = options["clock_offset"]
+    #The messages are forwarded right away to the parent, which batches and rate limits them
+    notifier = NotificationDispatcher(transport_factory, batch_delay=0, chat_interval=0, bot_interval=0)
+
+def shard_key(user_name: str, configuration: dict) -> tuple:
+    #The users of the same box whose booking window opens at the same instant go to the same shard
+    try:
+        slot_open = get_booking_goal(configuration["booking-goals"], current_time(), configuration.get("hours-in-advance"))[4]
+    except Exception:
+        slot_open = None
+    return configuration.get("box-name"), slot_open
 
-    logger.addHandler(logHandler)
-    req_logger.addHandler(logHandler)
-    url_logger.addHandler(logHandler)
-    return logger
+def race_window():
+    #Context of a booking request in flight. In race mode the HTTP debug records are written after it
+    return log_pipeline.race() if log_pipeline is not None else nullcontext()
 
 def load_yaml_config(filename: str):
+    import yaml
+
     with open(os.path.join('./config', filename), 'r') as file:
-        loaded_config = yaml.safe_load(file)
+        #The C loader is much faster when PyYAML was built with libyaml
+        loaded_config = yaml.load(file, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
     return loaded_config
 
 def create_folder_if_not_exists(folder):
     if not os.path.exists(folder):
         os.makedirs(folder)
 
-def get_booking_goal(booking_goals: dict) -> tuple[datetime, str, str, bool]:
+def get_booking_goal(booking_goals: list[str], today: datetime | None = None, default_hours_in_advance: int | None = None) -> tuple[datetime, str, str, bool, datetime]:
 
     #Assuming that my class time is at 10.00am and the hours in advance is 49 hours. Given different examples, the results are the following ones:
-    # today = datetime(2025,1,26,8,59,59,999999) => class datetime is 2025-01-28 10:00:00, diff_hours = 49, diff_minutes = 0,  diff_seconds = 3600,  diff_microseconds = 1.         Success = False
-    # today = datetime(2025,1,26,9,0,0,000000)   => class datetime is 2025-01-28 10:00:00, diff_hours = 49, diff_minutes = 0,  diff_seconds = 3600,  diff_microseconds = 0.         Success = True
-    # today = datetime(2025,1,26,9,0,0,000001)   => class datetime is 2025-01-28 10:00:00, diff_hours = 48, diff_minutes = 59,  diff_seconds = 3599, diff_microseconds = 999999.    Success = True
-    # today = datetime(2025,1,26,9,0,1,000000)   => class datetime is 2025-01-28 10:00:00, diff_hours = 48, diff_minutes = 59, diff_seconds = 3599,  diff_microseconds = 0.         Success = True
-
-    today = datetime.today()
-    # today = datetime(2025,2,8,20,2,0,000000) 
-
-    #We iterate over the booking goals to find the one that matches the target day
-    for goal in booking_goals:
-        user_goal_day_str = goal.split(',')[0]
-        user_goal_time_str = goal.split(',')[1]
-        user_goal_class_name_str = goal.split(',')[2]
-        hours_in_advance = int(goal.split(',')[3])
-
-        target_day = today + timedelta(hours=hours_in_advance)
-
-        logger.info(f"Calculated target date: {target_day.strftime('%Y-%m-%d %H:%M:%S')}")
-        # print(f"Calculated target date: {target_day.strftime('%Y-%m-%d %H:%M:%S')}")
-
-        #We check if today+hours_in_advance is the same day as the user goal day
-        if str(target_day.strftime("%A")).lower() == user_goal_day_str.lower():
-
-            #We calculate the datetime where we want to book the class
-            class_datetime = datetime(target_day.year, target_day.month, target_day.day, int(user_goal_time_str[:2]), int(user_goal_time_str[2:]))
-            logger.info(f"Calculated class to book datetime: {class_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
-            # print(f"Calculated class to book datetime: {class_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
-
-            #We calculate the difference in hours between the datetime of the class and now
-            diff = class_datetime - today
-            diff_hours = diff.days * 24 + diff.seconds // 3600
-            logger.info(f"Diff in hours between class datetime and now: {diff_hours} (hours-in-advance={hours_in_advance})")
-            # print(f"Diff in hours between class datetime and now: {diff_hours} (hours-in-advance={hours_in_advance})")
-
-            #There are 2 conditions, one when it is exactly time o'clock (09:00:00:000000) and another one when the time is
-            # over o'clock (09:00:00:000001). With this condition we skip the case when the time is immediately before o'clock (08:59:59:999999)
-            if (diff_hours == hours_in_advance and diff.microseconds == 0) or (diff_hours < hours_in_advance):
-                return (target_day, user_goal_time_str, user_goal_class_name_str, True)
-            else:
-                return (target_day, user_goal_time_str, user_goal_class_name_str, False)
-
-    raise NoTrainingDay(target_day)
-
-def get_class_to_book(classes: list[dict], target_time: str, class_name: str) -> dict:
-    if len(classes) == 0:
-        logger.error(f"{user_name} - Box is closed.")
-        raise BoxClosed
-
-    if any(target_time in s["timeid"] for s in classes):
-        logger.info(f"{user_name} - Class found for time ({target_time})")
-        if "OPEN" in class_name:
-            found_classes = [s for s in classes if target_time in s["timeid"]]
-        else:
-            found_classes = [s for s in classes if target_time in s["timeid"] and 'OPEN' not in s['className']]
+    # today = datetime(2025,1,26,8,59,59,999999) => class datetime is 2025-01-28 10:00:00, booking window opens at 2025-01-26 09:00:00.  Success = False
+    # today = datetime(2025,1,26,9,0,0,000000)   => class datetime is 2025-01-28 10:00:00, booking window opens at 2025-01-26 09:00:00.  Success = True
+    # today = datetime(2025,1,26,9,0,0,000001)   => class datetime is 2025-01-28 10:00:00, booking window opens at 2025-01-26 09:00:00.  Success = True
+    # today = datetime(2025,1,26,9,0,1,000000)   => class datetime is 2025-01-28 10:00:00, booking window opens at 2025-01-26 09:00:00.  Success = True
+
+    #The reference instant can be given (e.g. the scheduler evaluates the goals at the slot opening instant)
+    if today is None:
+        today = datetime.today()
+
+    #We look for the goals whose class is on the day that is hours-in-advance ahead (each goal can have its own hours)
+    candidates = []
+    for goal in compile_goals(booking_goals, default_hours_in_advance):
+        target_day = today + timedelta(hours=goal.hours_in_advance)
+        if target_day.weekday() != goal.weekday:
+            continue
+
+        #We calculate the datetime where we want to book the class and the instant in which its booking window opens
+        class_datetime = goal.class_datetime(target_day)
+        slot_open = goal.slot_opening(class_datetime)
+        logger.info("Calculated class to book datetime: %s. Booking window opens at %s (hours-in-advance=%s)", class_datetime, slot_open, goal.hours_in_advance)
+        candidates.append((slot_open <= today, slot_open, target_day, goal))
+
+    if not candidates:
+        raise NoTrainingDay(today)
+
+    #With several goals on the same day, we pick the one whose window opened most recently or, if none is open yet,
+    #the one that opens first
+    opened = [candidate for candidate in candidates if candidate[0]]
+    if opened:
+        success, slot_open, target_day, goal = max(opened, key=lambda candidate: candidate[1])
     else:
-        logger.error(f"{user_name} - No class found for time ({target_time})")
-        raise NoBookingGoal(target_time)
+        success, slot_open, target_day, goal = min(candidates, key=lambda candidate: candidate[1])
+    logger.info("Calculated target date: %s", target_day.replace(microsecond=0))
+    return (target_day, goal.time, goal.class_name, success, slot_open)
 
-    if (len(found_classes)) > 1:
-        if any(class_name in s["className"] for s in found_classes):
-            logger.info(f"{user_name} - Class found for class name ({class_name})")
-            found_classes = [s for s in found_classes if class_name in s["className"]]
-        else:
-            logger.error(f"{user_name} - No class found for class name ({class_name})")
-            raise NoBookingGoal(class_name)
+def closed_window_result(current_user: str, configuration: dict, now: datetime, catch_up: bool = False) -> BookingResult | None:
+    #Result of the user when it can be known from the configuration and the clock alone, i.e. when its booking
+    #window is not open. None means that the booking has to be attempted.
+    try:
+        if catch_up:
+            goals = compile_goals(configuration["booking-goals"], configuration.get("hours-in-advance"), current_user)
+            return None if open_windows(goals, now) else BookingResult(current_user)
+        *_, success, slot_open = get_booking_goal(configuration["booking-goals"], now, configuration.get("hours-in-advance"))
+    except NoTrainingDay:
+        return BookingResult(current_user, status=STATUS_NO_TRAINING_DAY)
+    except Exception:
+        #Wrong configurations are reported by the booking itself
+        return None
+    return None if success else BookingResult(current_user, slot_open=slot_open)
+
+def get_class_to_book(classes: list[dict] | Schedule, target_time: str, class_name: str, current_user: str = "") -> dict:
+    #The listing is indexed once, so finding the class does not scan it for every condition.
+    #class_name can contain alternative names separated by "|" which are tried in order.
+    schedule = classes if isinstance(classes, Schedule) else Schedule(classes)
+    try:
+        found_class = schedule.find(target_time, class_name)
+    except BoxClosed:
+        logger.error(f"{current_user} - Box is closed.")
+        raise
+    except NoBookingGoal as e:
+        logger.error(f"{current_user} - No class found for {'time' if e.args[0] == target_time else 'class name'} ({e.args[0]})")
+        raise
 
-    logger.info(f"{user_name} - Class found: {found_classes[0]}")
-    return found_classes[0]
+    logger.info(f"{current_user} - Class found: {found_class.raw}")
+    return found_class.raw
 
-def init_telegram_bot(telegram_bot_token):
-    logger.info(f"{user_name} - Telegram notifications are enabled.")
-    return telebot.TeleBot(telegram_bot_token, parse_mode='Markdown')
+def init_telegram_bot(telegram_bot_token, current_user: str = ""):
+    logger.info(f"{current_user} - Telegram notifications are enabled.")
+    return notifier.bot(telegram_bot_token)
 
-def parse_config_params(config):
+def parse_config_params(config, current_user: str = ""):
+    telegram_bot_token = None
+    telegram_chat_id = None
     try:
         email = config["email"]
         password = config["password"]
@@ -140,79 +225,398 @@ def parse_config_params(config):
             telegram_chat_id = config["telegram"]["telegram-chat-id"]
         return email, password, box_name, box_id, booking_goals, exceptions, notify_on_telegram, telegram_bot_token, telegram_chat_id
     except Exception as e:
-        logger.error(f"{user_name} - Error parsing configuration parameters: {e}")
+        logger.error(f"{current_user} - Error parsing configuration parameters: {e}")
         raise e
 
-def main(current_user, configuration):
+def connect_client(current_user: str, email: str, password: str, box_id: int, box_name: str):
+    #In daemon mode the client of the previous booking is reused
+    if warm_clients is not None:
+        return warm_clients.get(current_user, email, password, box_id, box_name, session_cache)
+    from client import AimHarderClient
+    return AimHarderClient(email=email, password=password, box_id=box_id, box_name=box_name, session_cache=session_cache)
+
+def main(current_user, configuration, fire_at: datetime | None = None) -> BookingResult:
+    #Every phase of the booking is timed and attributed to the user
+    with user_context(current_user), timings.span("total"):
+        return book_user(current_user, configuration, fire_at)
+
+def book_user(current_user, configuration, fire_at: datetime | None = None) -> BookingResult:
+    result = BookingResult(current_user)
+    notify_on_telegram = False
+    class_day = datetime.today()
+    attempted = False
+    class_id = None
+    client = None
     try:
         #We parse the configuration parameters
-        email, password, box_name, box_id, booking_goals, exceptions, notify_on_telegram, telegram_bot_token, telegram_chat_id = parse_config_params(configuration)
+        email, password, box_name, box_id, booking_goals, exceptions, notify_on_telegram, telegram_bot_token, telegram_chat_id = parse_config_params(configuration, current_user)
 
         #If the Telegram notifications are enabled, we instantiate the Telegram Bot
         if notify_on_telegram and telegram_bot_token and telegram_chat_id:
-            bot = init_telegram_bot(telegram_bot_token)
+            bot = init_telegram_bot(telegram_bot_token, current_user)
         else:
             notify_on_telegram = False
 
-        class_day, class_time, class_name, success = get_booking_goal(booking_goals)
+        #When a firing instant is given (scheduler mode), the goals are evaluated at that instant instead of now
+        with timings.span("goal"):
+            now = fire_at or current_time()
+            class_day, class_time, class_name, success, result.slot_open = get_booking_goal(booking_goals, now, configuration.get("hours-in-advance"))
+            #With the clock sync, a run launched by cron can start slightly before the window opens by the AimHarder
+            #clock (e.g. a Pi whose clock drifted ahead). Then it logs in and waits for the opening like the scheduler.
+            if not success and fire_at is None and clock_sync is not None \
+                    and 0 < (result.slot_open - now).total_seconds() <= STARTUP_CLOCK_MARGIN:
+                fire_at = result.slot_open
+                logger.info("%s - The booking window opens at %s by the AimHarder clock, waiting for it.", current_user, fire_at)
+                class_day, class_time, class_name, success, result.slot_open = get_booking_goal(booking_goals, fire_at, configuration.get("hours-in-advance"))
 
         if not success:
-            logger.info(f"{current_user} - The class is not available yet or it is too late. Target date = {class_day.strftime('%Y-%m-%d')}. Class at: {class_time}")
-            return
+            logger.info("%s - The class is not available yet or it is too late. Target date = %s. Class at: %s", current_user, class_day.date(), class_time)
+            return result
+
+        #The exceptions of the configuration skip the day or replace its class
+        class_time, class_name = apply_day_change(exceptions, class_day, class_time, class_name)
+
+        #A day already decided in a previous run (booked, box closed...) is skipped without any request
+        known_status = known_day_status(current_user, class_day)
+        if known_status is not None:
+            result.status = known_status
+            logger.info("%s - %s skipped, %s according to the booking store.", current_user, class_day.date(), known_status)
+            return result
+        attempted = True
 
         #We log in into AimHarder platform
-        client = AimHarderClient(email=email, password=password, box_id=box_id, box_name=box_name)
-        logger.debug(f"{current_user} - Client connected to AimHarder.")
+        client = connect_client(current_user, email, password, box_id, box_name)
+        logger.debug("%s - Client connected to AimHarder.", current_user)
 
         #We fetch the classes that are scheduled for the target day
-        classes = client.get_classes(class_day)
+        schedule = client.get_schedule(class_day)
 
         #We check if there is already a class booked on the target day. If so, we skip the booking process.
         #bookState = 0 => class is already booked, bookState = 1 => class is booked but you are in the waiting list
-        if any((class_item['bookState'] == 1 or class_item['bookState'] == 0) for class_item in classes):
-            logger.error(f"{current_user} - The target class or another class is already booked on the target day!")
+        if schedule.booked:
+            logger.error("%s - The target class or another class is already booked on the target day!", current_user)
             raise AlreadyBooked(class_day)
 
         #From all the classes fetched, we select the one we want to book.
-        target_class = get_class_to_book(classes, class_time, class_name)
-
-        #We book the class and notify to Telegram if required.
-        if client.book_class(class_day, target_class):
+        with timings.span("select"):
+            target_class = get_class_to_book(schedule, class_time, class_name, current_user)
+            class_id = target_class.get("id")
+
+        #In scheduler mode everything above was done in advance, so we wait until the exact slot opening
+        #instant and measure how late the booking request is sent compared to it.
+        with race_window():
+            if fire_at is not None:
+                with timings.span("wait"):
+                    deadline = sleep_until(fire_at, current_time)
+                result.send_skew = time.monotonic() - deadline
+                logger.info("%s - Booking request sent %.3f ms after the slot opening", current_user, result.send_skew * 1000)
+
+            #We book the class and notify to Telegram if required
+            target_class, booked = send_booking(client, class_day, schedule, target_class, class_time, class_name, result, current_user)
+        class_id = target_class.get("id")
+
+        if booked:
+            result.confirmed_at = current_time()
+            result.status = STATUS_BOOKED
             if notify_on_telegram:
-                bot.send_message(telegram_chat_id, f"\U00002705 {class_name}! _{class_day.strftime('%A')}_ {class_day.strftime('%d.%m.%Y')} at {class_time[:2]}:{class_time[2:]} - [{target_class["ocupation"]}/{target_class["limit"]}] ({target_class["id"]})")
-            logger.debug(f"{current_user} - Training booked successfully!! {class_day.strftime('%A')} - {class_day.strftime('%Y-%m-%d')} at {class_time} -  {class_name}")
+                bot.send_message(telegram_chat_id, booked_message(class_name, class_day, class_time, target_class))
+            logger.debug("%s - Training booked successfully!! %s at %s - %s", current_user, class_day.date(), class_time, class_name)
         else:
-            logger.debug(f"{current_user} - Booking of the training unsuccessful. Target day: {class_day.strftime('%Y-%m-%d')}")
+            result.status = STATUS_FAILED
+            logger.debug("%s - Booking of the training unsuccessful. Target day: %s", current_user, class_day.date())
     except BoxClosed as e:
-        logger.error("The box is closed!")
+        result.status = STATUS_BOX_CLOSED
+        logger.error("%s - The box is closed!", current_user)
         # if notify_on_telegram:
             # bot.send_message(telegram_chat_id, f"\U00002714 The box is closed. Target: {class_day.strftime('%A')} - {class_day.strftime('%d %b %Y')}")
     except NoTrainingDay as e:
-        logger.error("No training day today!")
+        result.status = STATUS_NO_TRAINING_DAY
+        logger.error("%s - No training day today!", current_user)
         # if notify_on_telegram:
         #     class_day = e.args[0]
             # bot.send_message(telegram_chat_id, f"\U00002714 No training day. Target: {class_day.strftime('%A')} - {class_day.strftime('%d %b %Y')}")
     except TooEarly as e:
-        logger.error("Too early to book the class!")
+        result.status = STATUS_TOO_EARLY
+        logger.error("%s - Too early to book the class!", current_user)
         # if notify_on_telegram:
         #     class_day = e.args[0]
             # bot.send_message(telegram_chat_id, f"\U0000274C Too early to book the class. Target: {class_day.strftime('%A')} - {class_day.strftime('%d %b %Y')}")
     except AlreadyBooked as e:
-        logger.error("The class was already booked!")
+        result.status = STATUS_ALREADY_BOOKED
+        logger.error("%s - The class was already booked!", current_user)
         # if notify_on_telegram:
         #     class_day = e.args[0]
             # bot.send_message(telegram_chat_id, f"\U00002705 Already Booked! :) {class_day.strftime('%b')}-CW{class_day.strftime('%V')} _{class_day.strftime('%A')} - {class_day.strftime('%Y-%m-%d')}_ at {class_time} - {class_name}")
     except NoBookingGoal as e:
-        logger.error("There is no booking goal!")
+        result.status = STATUS_NO_BOOKING_GOAL
+        logger.error("%s - There is no booking goal!", current_user)
         # if notify_on_telegram:
         #     not_found = e.args[0]
             # bot.send_message(telegram_chat_id, f"\U0000274C {not_found} was not found!: {class_day.strftime('%b')}-CW{class_day.strftime('%V')} _{class_day.strftime('%A')} - {class_day.strftime('%Y-%m-%d')}_ at {class_time} - {class_name}")
     except Exception as e:
-        if notify_on_telegram:
-            bot.send_message(telegram_chat_id, f"\U0000274C Something went wrong. Target: {class_day.strftime('%A')} - {class_day.strftime('%d %b %Y')}")
-            bot.send_message(telegram_chat_id, traceback.format_exc(), parse_mode='None')
+        #A full class can be booked later if someone cancels, so the watcher waits for a freed place
+        if watch_full_class(e, current_user, client, configuration.get("box-name"), class_day, class_time, class_name, class_id,
+                            bot if notify_on_telegram else None, telegram_chat_id):
+            result.status = STATUS_WATCHING
+        else:
+            result.status = STATUS_FAILED if isinstance(e, BookingFailed) else STATUS_ERROR
+            result.error = str(e) or type(e).__name__
+            if notify_on_telegram:
+                bot.send_message(telegram_chat_id, f"\U0000274C Something went wrong. Target: {class_day.strftime('%A')} - {class_day.strftime('%d %b %Y')}")
+                bot.send_message(telegram_chat_id, traceback.format_exc(), parse_mode='None')
+            logger.error("%s - %s", current_user, traceback.format_exc())
+            print(traceback.format_exc())
+    if attempted:
+        remember_result(current_user, class_day, result, class_time, class_name, class_id)
+    return result
+
+def apply_day_change(exceptions: list | None, class_day: datetime, class_time: str, class_name: str) -> tuple[str, str]:
+    #Class to book on the day according to the exceptions section. NoTrainingDay is raised for a day without training.
+    change = change_for_day(parse_changes(exceptions), class_day)
+    if change is None:
+        return class_time, class_name
+    if not change.replaces:
+        logger.info(f"{class_day.strftime('%Y-%m-%d')} is an exception without training.")
+        raise NoTrainingDay(class_day)
+    logger.info(f"{class_day.strftime('%Y-%m-%d')} is an exception: {change.time} {change.class_name} instead of {class_time} {class_name}.")
+    return change.time, change.class_name
+
+def apply_exceptions(current_user, configuration, now: datetime | None = None) -> list[BookingResult]:
+    #Applies the exceptions section to the classes already booked: the days without training are cancelled and,
+    #on the days with another class, the class is booked and then the previous one is cancelled. The days are
+    #fetched and processed concurrently.
+    now = now or current_time()
+    try:
+        email, password, box_name, box_id, booking_goals, exceptions, notify_on_telegram, telegram_bot_token, telegram_chat_id = parse_config_params(configuration, current_user)
+        changes = [change for change in parse_changes(exceptions) if change.day.date() >= now.date()]
+    except Exception as e:
         logger.error(f"{current_user} - {traceback.format_exc()}")
-        print(traceback.format_exc())
+        return [BookingResult(current_user, status=STATUS_ERROR, error=str(e) or type(e).__name__)]
+    if not changes:
+        logger.info(f"{current_user} - No exception to apply.")
+        return [BookingResult(current_user)]
+
+    try:
+        client = connect_client(current_user, email, password, box_id, box_name)
+    except Exception as e:
+        logger.error(f"{current_user} - {traceback.format_exc()}")
+        return [BookingResult(current_user, status=STATUS_ERROR, error=str(e) or type(e).__name__, class_day=change.day) for change in changes]
+
+    fetches = fetch_days(current_user, [change.day for change in changes], client.get_classes)
+
+    results = []
+    operations = []
+    for change, fetched in zip(changes, fetches):
+        try:
+            operation = plan_operation(change, fetched.result())
+        except tuple(EXCEPTION_STATUSES) as e:
+            results.append(BookingResult(current_user, status=EXCEPTION_STATUSES[type(e)], class_day=change.day))
+            continue
+        except Exception as e:
+            results.append(BookingResult(current_user, status=STATUS_ERROR, error=str(e) or type(e).__name__, class_day=change.day))
+            continue
+        if operation is None:
+            logger.info(f"{current_user} - {change.day.strftime('%Y-%m-%d')}: nothing to change.")
+            results.append(BookingResult(current_user, class_day=change.day))
+        else:
+            operations.append(operation)
+
+    with user_context(current_user):
+        outcomes = client.run_batch(operations)
+    for outcome in outcomes:
+        class_day = outcome.operation.class_day
+        for class_item in outcome.cancelled:
+            if booking_store is not None:
+                booking_store.record_cancel(current_user, class_day, class_item.get("id"), parse_start_time(class_item.get("timeid", "")), class_item.get("className"))
+        #The replacement is recorded after the cancellations, so the day stays decided in the booking store
+        if outcome.booked is not None:
+            remember_result(current_user, class_day, BookingResult(current_user, status=STATUS_BOOKED), parse_start_time(outcome.booked.get("timeid", "")),
+                            outcome.booked.get("className"), outcome.booked.get("id"))
+        if outcome.status == STATUS_FAILED:
+            status = STATUS_FAILED
+        else:
+            status = STATUS_BOOKED if outcome.booked is not None else STATUS_CANCELLED
+        result = BookingResult(current_user, status=status, error=outcome.error, class_day=class_day)
+        logger.info(f"{current_user} - {class_day.strftime('%Y-%m-%d')}: {outcome.status}, {len(outcome.cancelled)} classes cancelled")
+        results.append(result)
+    return sorted(results, key=lambda result: result.class_day)
+
+def fetch_days(current_user: str, days: list[datetime], fetch) -> list[Future]:
+    #Fetches several days of one client concurrently. The first fetch checks a session restored from the session
+    #cache (logging in again if it expired) on its own, so the rest of the days are fetched with a valid session.
+    #The futures are returned in the order of the days, already done.
+    def fetch_day(class_day):
+        with user_context(current_user):
+            return fetch(class_day)
+
+    with ThreadPoolExecutor(max_workers=min(len(days), MAX_CONCURRENT_FETCHES), thread_name_prefix=f"fetch-{current_user}") as executor:
+        fetches = [executor.submit(fetch_day, days[0])]
+        fetches[0].exception()
+        fetches += [executor.submit(fetch_day, class_day) for class_day in days[1:]]
+    return fetches
+
+def known_day_status(current_user: str, class_day: datetime) -> str | None:
+    #Status of the day recorded by a previous run that makes trying it again pointless
+    if booking_store is None:
+        return None
+    status = booking_store.day_status(current_user, class_day)
+    return STATUS_ALREADY_BOOKED if status == STATUS_BOOKED else status
+
+def remember_result(current_user: str, class_day: datetime, result: BookingResult, class_time: str, class_name: str, class_id: int | None = None):
+    if booking_store is None:
+        return
+    try:
+        booking_store.record(current_user, class_day, result.status, class_time, class_name, class_id, result.error, result.latency)
+    except Exception as e:
+        #The store is only an optimization, so its errors never affect the bookings
+        logger.error(f"{current_user} - Booking result could not be stored: {e}")
+
+def watch_full_class(error: Exception, current_user: str, client, box_name: str, class_day: datetime, class_time: str,
+                     class_name: str, class_id: int | None, bot=None, telegram_chat_id=None) -> bool:
+    #Hands the class over to the waitlist watcher when it is full. Returns whether it is being watched.
+    if waitlist_watcher is None or client is None or class_id is None:
+        return False
+    if not isinstance(error, BookingFailed) or str(error) != MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY:
+        return False
+    class_datetime = datetime(class_day.year, class_day.month, class_day.day, int(class_time[:2]), int(class_time[2:]))
+
+    def on_booked(target):
+        booking = BookingResult(current_user, status=STATUS_BOOKED, confirmed_at=current_time())
+        remember_result(current_user, class_datetime, booking, class_time, class_name, class_id)
+        if bot is not None:
+            bot.send_message(telegram_chat_id, f"\U00002705 {class_name}! _{class_datetime.strftime('%A')}_ {class_datetime.strftime('%d.%m.%Y')} at {class_time[:2]}:{class_time[2:]} - freed place ({class_id})")
+
+    def on_failed(target, error):
+        booking = BookingResult(current_user, status=STATUS_FAILED, error=str(error) if error is not None else "No place was freed")
+        remember_result(current_user, class_datetime, booking, class_time, class_name, class_id)
+
+    waitlist_watcher.watch(box_name, WatchTarget(current_user, client, class_datetime, class_id, on_booked, on_failed))
+    return True
+
+def send_booking(client, class_day: datetime, schedule: Schedule, target_class: dict, class_time: str, class_name: str,
+                 result: BookingResult, current_user: str = "") -> tuple[dict, bool]:
+    #It returns the class finally booked (it can be an alternative one) and whether it was booked
+    try:
+        return request_booking(client, class_day, schedule, target_class, class_time, class_name, result, current_user)
+    except BookingUnconfirmed:
+        #The day had no class booked before, so a class booked now in the listing was booked by the request
+        logger.error("%s - The booking request timed out, checking the classes of the day.", current_user)
+        booked_slots = [slot for slot in client.get_schedule(class_day).slots if slot.book_state in BOOKED_STATES]
+        if booked_slots:
+            return booked_slots[0].raw, True
+        logger.info("%s - The class was not booked, sending the booking request again.", current_user)
+        result.attempts += 1
+        return target_class, client.book_class(class_day, target_class)
+
+def request_booking(client, class_day: datetime, schedule: Schedule, target_class: dict, class_time: str, class_name: str,
+                    result: BookingResult, current_user: str = "") -> tuple[dict, bool]:
+    #In burst mode the request is retried for a short window while AimHarder answers that it is too early
+    if burst_window > 0:
+        candidates = [slot.raw for slot in schedule.candidates(class_time, class_name)] if burst_fallback else [target_class]
+        outcome = book_with_burst(client, class_day, candidates, burst_window)
+        result.attempts = outcome.attempts
+        result.time_to_success = outcome.time_to_success
+        logger.info("%s - Booked after %d attempts in %.0f ms", current_user, outcome.attempts, outcome.time_to_success * 1000)
+        return outcome.booked_class, True
+    result.attempts = 1
+    return target_class, client.book_class(class_day, target_class)
+
+def booked_message(class_name: str, class_day: datetime, class_time: str, target_class: dict) -> str:
+    return f"\U00002705 {class_name}! _{class_day.strftime('%A')}_ {class_day.strftime('%d.%m.%Y')} at {class_time[:2]}:{class_time[2:]} - [{target_class["ocupation"]}/{target_class["limit"]}] ({target_class["id"]})"
+
+def catch_up(current_user, configuration) -> list[BookingResult]:
+    with user_context(current_user), timings.span("total"):
+        return catch_up_user(current_user, configuration)
+
+def catch_up_user(current_user, configuration, now: datetime | None = None) -> list[BookingResult]:
+    #Books in one run every goal whose booking window is open and whose day has nothing booked yet, including the
+    #ones of previous runs that were missed. The schedules of all those days are fetched concurrently and the
+    #classes are booked from the earliest one.
+    now = now or current_time()
+    try:
+        email, password, box_name, box_id, booking_goals, exceptions, notify_on_telegram, telegram_bot_token, telegram_chat_id = parse_config_params(configuration, current_user)
+        windows = open_windows(compile_goals(booking_goals, configuration.get("hours-in-advance"), current_user), now)
+    except Exception as e:
+        logger.error(f"{current_user} - {traceback.format_exc()}")
+        return [BookingResult(current_user, status=STATUS_ERROR, error=str(e) or type(e).__name__)]
+
+    #The days already decided in previous runs are skipped without any request
+    results = []
+    pending = []
+    for class_day, goal in windows:
+        try:
+            goal_time, goal_class_name = apply_day_change(exceptions, class_day, goal.time, goal.class_name)
+        except NoTrainingDay:
+            results.append(BookingResult(current_user, status=STATUS_NO_TRAINING_DAY, slot_open=goal.slot_opening(class_day), class_day=class_day))
+            continue
+        goal = replace(goal, time=goal_time, class_name=goal_class_name)
+        known_status = known_day_status(current_user, class_day)
+        if known_status is not None:
+            results.append(BookingResult(current_user, status=known_status, slot_open=goal.slot_opening(class_day), class_day=class_day))
+        else:
+            pending.append((class_day, goal))
+    windows = pending
+
+    if not windows:
+        logger.info(f"{current_user} - No booking window to book is open.")
+        return results or [BookingResult(current_user)]
+    logger.info(f"{current_user} - Open booking windows: {', '.join(f'{class_datetime.strftime('%Y-%m-%d %H:%M')} {goal.class_name}' for class_datetime, goal in windows)}")
+
+    bot = init_telegram_bot(telegram_bot_token, current_user) if notify_on_telegram and telegram_bot_token and telegram_chat_id else None
+    try:
+        client = connect_client(current_user, email, password, box_id, box_name)
+    except Exception as e:
+        logger.error(f"{current_user} - {traceback.format_exc()}")
+        return results + [BookingResult(current_user, status=STATUS_ERROR, error=str(e) or type(e).__name__, class_day=class_datetime)
+                          for class_datetime, _ in windows]
+
+    fetches = fetch_days(current_user, [class_datetime for class_datetime, _ in windows], client.get_schedule)
+
+    for (class_day, goal), fetched in zip(windows, fetches):
+        result = BookingResult(current_user, slot_open=goal.slot_opening(class_day), class_day=class_day)
+        class_id = None
+        try:
+            schedule = fetched.result()
+            #The bookState 0/1 check is done for every day
+            if schedule.booked:
+                raise AlreadyBooked(class_day)
+            target_class = get_class_to_book(schedule, goal.time, goal.class_name, current_user)
+            class_id = target_class.get("id")
+            with race_window():
+                target_class, booked = send_booking(client, class_day, schedule, target_class, goal.time, goal.class_name, result, current_user)
+            class_id = target_class.get("id")
+            if booked:
+                result.confirmed_at = current_time()
+                result.status = STATUS_BOOKED
+                logger.info(f"{current_user} - Training booked successfully!! {class_day.strftime('%A')} - {class_day.strftime('%Y-%m-%d')} at {goal.time} - {goal.class_name}")
+                if bot is not None:
+                    bot.send_message(telegram_chat_id, booked_message(goal.class_name, class_day, goal.time, target_class))
+            else:
+                result.status = STATUS_FAILED
+        except tuple(EXCEPTION_STATUSES) as e:
+            result.status = EXCEPTION_STATUSES[type(e)]
+            logger.error(f"{current_user} - {class_day.strftime('%Y-%m-%d')}: {result.status}")
+        except Exception as e:
+            if watch_full_class(e, current_user, client, box_name, class_day, goal.time, goal.class_name, class_id, bot, telegram_chat_id):
+                result.status = STATUS_WATCHING
+            else:
+                result.status = STATUS_FAILED if isinstance(e, BookingFailed) else STATUS_ERROR
+                result.error = str(e) or type(e).__name__
+                logger.error(f"{current_user} - {traceback.format_exc()}")
+        remember_result(current_user, class_day, result, goal.time, goal.class_name, class_id)
+        results.append(result)
+    return sorted(results, key=lambda result: result.class_day)
+
+def run_scheduled(current_user, configuration, fire_at: datetime) -> BookingResult:
+    #The clock offset is estimated again before every booking, since the local clock drifts while running
+    if clock_sync is not None:
+        try:
+            clock_sync.sync()
+        except Exception as e:
+            logger.error(f"{current_user} - Clock offset could not be estimated again: {e}")
+    result = main(current_user, configuration, fire_at=fire_at)
+    logger.info(format_summary([result]))
+    return result
 
 #We set up the loggers
 
@@ -220,15 +624,178 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--config-filename", required=True, type=str)
+    #Number of users processed in parallel. With 1 (default) the users are processed sequentially
+    parser.add_argument("--workers", default=1, type=int)
+    #Connections kept alive per AimHarder host. By default as many as workers
+    parser.add_argument("--pool-size", default=None, type=int)
+    #Keep the logged in sessions on disk so the next runs can skip the login
+    parser.add_argument("--session-cache", action="store_true")
+    #Retry the booking during this amount of seconds while it is too early, and try the alternative classes if it is full
+    parser.add_argument("--burst-window", default=DEFAULT_BURST_WINDOW, type=float)
+    parser.add_argument("--burst-fallback", action="store_true")
+    #Estimate the offset of the AimHarder clock and use it for the booking windows
+    parser.add_argument("--clock-sync", action="store_true")
+    parser.add_argument("--clock-samples", default=DEFAULT_CLOCK_SAMPLES, type=int)
+    #Long-running mode that logs in in advance and fires the booking at the exact slot opening instant
+    parser.add_argument("--scheduler", action="store_true")
+    parser.add_argument("--prewarm-seconds", default=DEFAULT_PREWARM_SECONDS, type=float)
+    #Long-running mode that watches the configuration file, keeps the users logged in and writes its status to a file
+    parser.add_argument("--daemon", action="store_true")
+    parser.add_argument("--status-file", default=os.path.join('logs', 'status.json'), type=str)
+    parser.add_argument("--reload-interval", default=DEFAULT_RELOAD_INTERVAL, type=float)
+    #Book every goal whose window is open and not booked yet (e.g. after missed runs), not only today's one
+    parser.add_argument("--catch-up", action="store_true")
+    #Cancel or replace the classes already booked on the days of the exceptions section
+    parser.add_argument("--apply-exceptions", action="store_true")
+    #Keep the outcome of every booking in cache/bookings.db, so the days already decided are skipped in the next runs
+    parser.add_argument("--booking-store", action="store_true")
+    #Print the success rate and the last records of the booking store and exit
+    parser.add_argument("--history", action="store_true")
+    #When the class is full, keep polling its occupation and book it as soon as a place is freed
+    parser.add_argument("--watch-waitlist", action="store_true")
+    #Print the crontab schedules of the booking window openings of all the users and exit
+    parser.add_argument("--print-cron", action="store_true")
+    #Write the timings of every phase to logs/timings.jsonl and logs/timings.prom
+    parser.add_argument("--timings", action="store_true")
+    #Send the fetch of the classes again when it takes longer than usual and use the first answer
+    parser.add_argument("--hedge", action="store_true")
+    #Number of processes among which the users are sharded by box and booking window opening (1 = no sharding)
+    parser.add_argument("--processes", default=1, type=int)
+    #Levels of the loggers written to the log file, e.g. "urllib3=INFO,requests=WARNING" (all of them DEBUG by default)
+    parser.add_argument("--log-levels", default=None, type=str)
+    #Hold the HTTP debug records while a booking request is in flight and write them after it
+    parser.add_argument("--race-mode", action="store_true")
+    #Run with the import times measured and print the modules that take longer to import
+    parser.add_argument("--profile-startup", action="store_true")
     args = parser.parse_args()
 
-    config_file = os.path.normpath(args.config_filename)
-    logger = init_logger()
+    if args.profile_startup:
+        from startup import profile_startup
+        raise SystemExit(profile_startup([arg for arg in sys.argv[1:] if arg != "--profile-startup"]))
 
-    for config in load_yaml_config(config_file):
-        for user_name, user_config in config.items():
-            try:
-                main(user_name, user_config)
-            except Exception as e:
-                print(e)
+    config_file = os.path.normpath(args.config_filename)
 
+    if args.print_cron:
+        print("\n".join(BookingPlan.from_users(iter_users(load_yaml_config(config_file))).cron_entries()))
+        raise SystemExit(0)
+
+    if args.history:
+        from booking_store import BookingStore, format_history
+        print(format_history(BookingStore(BOOKING_STORE_PATH)))
+        raise SystemExit(0)
+
+    users = iter_users(load_yaml_config(config_file))
+
+    #When no booking window is open, the run ends here without importing the HTTP modules nor logging in. With the
+    #clock sync the AimHarder clock is not known yet, so the windows that open within the margin are attempted too.
+    if not args.scheduler and not args.daemon and not args.apply_exceptions:
+        margin = timedelta(seconds=STARTUP_CLOCK_MARGIN if args.clock_sync else 0)
+        closed = [closed_window_result(user_name, user_config, datetime.today() + margin, args.catch_up) for user_name, user_config in users]
+        if all(result is not None for result in closed):
+            logger = init_logger(parse_levels(args.log_levels))
+            summary = format_summary(closed)
+            logger.info(f"No booking window is open.\n{summary}")
+            print(summary)
+            raise SystemExit(0)
+
+    logger = init_logger(parse_levels(args.log_levels), race_mode=args.race_mode)
+    #The long-running modes fire every booking at its own slot opening from one process
+    if args.processes > 1 and (args.scheduler or args.daemon or args.apply_exceptions):
+        logger.warning("--processes is ignored with --scheduler, --daemon and --apply-exceptions, the users are run in one process.")
+    #A run launched by cron must end right away, so the full classes are only watched by the long-running modes
+    if args.watch_waitlist and not args.scheduler and not args.daemon:
+        logger.warning("--watch-waitlist is ignored without --scheduler or --daemon.")
+        args.watch_waitlist = False
+
+    from transport import configure_pool, pool_stats
+
+    #All the users share the same connection pool, so the TCP+TLS handshakes are not repeated for every user
+    configure_pool(pool_maxsize=args.pool_size or max(args.workers, 1))
+    if args.hedge:
+        from resilience import configure_resilience
+        configure_resilience(hedge=True)
+
+    if args.session_cache:
+        from session_cache import SessionCache
+        session_cache = SessionCache(os.path.join(os.path.normpath(os.getcwd() + os.sep), 'cache', 'sessions'))
+
+    if args.booking_store:
+        from booking_store import BookingStore
+        booking_store = BookingStore(BOOKING_STORE_PATH)
+
+    if args.watch_waitlist:
+        waitlist_watcher = WaitlistWatcher(now=current_time)
+
+    burst_window = args.burst_window
+    burst_fallback = args.burst_fallback
+
+    if args.clock_sync:
+        try:
+            clock_sync = ClockSync(samples=args.clock_samples)
+            clock_sync.sync()
+        except Exception as e:
+            logger.error(f"Clock offset could not be estimated, using the local clock: {e}")
+            clock_sync = None
+
+    if args.daemon:
+        import signal
+
+        warm_clients = WarmClients()
+        daemon = BookingDaemon(os.path.join('./config', config_file), lambda: load_yaml_config(config_file), run_scheduled,
+                               prewarm_seconds=args.prewarm_seconds, now=current_time, status_path=args.status_file,
+                               reload_interval=args.reload_interval, warm_clients=warm_clients)
+        #docker stop sends SIGTERM, which stops the daemon between bookings
+        signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop.set())
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            pass
+        if waitlist_watcher is not None:
+            waitlist_watcher.stop.set()
+        notifier.close()
+        raise SystemExit(0)
+
+    if args.scheduler:
+        run_scheduler(users, run_scheduled, prewarm_seconds=args.prewarm_seconds, now=current_time)
+        #The scheduler ends when no window opens anymore, and the full classes are still watched until they start
+        if waitlist_watcher is not None and waitlist_watcher.pending():
+            logger.info(f"Waiting for freed places in {len(waitlist_watcher.pending())} full classes.")
+            waitlist_watcher.wait()
+        raise SystemExit(0)
+
+    if args.apply_exceptions:
+        task = apply_exceptions
+    else:
+        task = catch_up if args.catch_up else main
+    if args.processes > 1 and not args.apply_exceptions:
+        from shards import run_sharded
+
+        options = {
+            "workers": args.workers,
+            "pool_size": args.pool_size,
+            "session_cache": args.session_cache,
+            "booking_store": args.booking_store,
+            "burst_window": args.burst_window,
+            "burst_fallback": args.burst_fallback,
+            "clock_offset": clock_sync.offset if clock_sync is not None else None,
+            "log_levels": args.log_levels,
+            "race_mode": args.race_mode,
+            "hedge": args.hedge,
+        }
+        results = run_sharded(users, task.__name__, options, args.processes, shard_key, notify=notifier.notify)
+    else:
+        results = run_users(users, task, workers=args.workers)
+    summary = format_summary(results)
+    logger.info(summary)
+    logger.info(f"Connection pool: {pool_stats()}")
+    print(summary)
+
+    if args.timings:
+        log_dir = os.path.join(os.path.normpath(os.getcwd() + os.sep), 'logs')
+        timings.write_jsonl(os.path.join(log_dir, 'timings.jsonl'))
+        timings.write_prometheus(os.path.join(log_dir, 'timings.prom'))
+    for phase, stats in sorted(timings.aggregate().items()):
+        logger.info(f"Timing {phase}: count={stats['count']} p50={stats['p50'] * 1000:.1f}ms p95={stats['p95'] * 1000:.1f}ms max={stats['max'] * 1000:.1f}ms")
+
+    #We wait for the queued notifications before exiting
+    notifier.close()
@@ -0,0 +1,160 @@
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger('aimharder-bot')
+
+#Telegram allows around one message per second in the same chat and 30 messages per second per bot
+DEFAULT_CHAT_INTERVAL = 1.0
+DEFAULT_BOT_INTERVAL = 1.0 / 30
+#Messages of the same chat queued within this time are sent together
+DEFAULT_BATCH_DELAY = 0.2
+MAX_MESSAGE_LENGTH = 4096
+BATCH_SEPARATOR = "\n\n"
+
+
+class TelegramTransport:
+
+    def __init__(self, token: str):
+        #telebot is only imported when a message is actually sent
+        import telebot
+        self.bot = telebot.TeleBot(token, parse_mode='Markdown')
+
+    def send(self, chat_id, text: str, parse_mode: str | None = None):
+        self.bot.send_message(chat_id, text, parse_mode=parse_mode)
+
+
+class MemoryTransport:
+    #Stand-in transport that keeps the messages in memory, for tests and offline runs
+
+    def __init__(self, token: str):
+        self.token = token
+        self.sent = []
+
+    def send(self, chat_id, text: str, parse_mode: str | None = None):
+        self.sent.append((chat_id, text, parse_mode))
+
+
+class QueuedBot:
+    #Same send_message than telebot.TeleBot, but the message is queued in the dispatcher instead of sent right away
+
+    def __init__(self, dispatcher: "NotificationDispatcher", token: str):
+        self.dispatcher = dispatcher
+        self.token = token
+
+    def send_message(self, chat_id, text: str, parse_mode: str | None = None):
+        self.dispatcher.notify(self.token, chat_id, text, parse_mode)
+
+
+class NotificationDispatcher:
+    #Queues the notifications so that the bookings never wait for Telegram. A background thread sends them,
+    #joining the messages of the same chat and respecting the Telegram rate limits. There is one transport
+    #(bot instance) per token, shared by all the users that use it.
+
+    def __init__(self, transport_factory=TelegramTransport, batch_delay: float = DEFAULT_BATCH_DELAY,
+                 chat_interval: float = DEFAULT_CHAT_INTERVAL, bot_interval: float = DEFAULT_BOT_INTERVAL):
+        self.transport_factory = transport_factory
+        self.batch_delay = batch_delay
+        self.chat_interval = chat_interval
+        self.bot_interval = bot_interval
+        self._transports = {}
+        #(token, chat_id, parse_mode) => [first queued instant, messages]
+        self._pending = {}
+        self._next_chat_send = {}
+        self._next_bot_send = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._in_flight = 0
+        self._thread = None
+        self.sent = 0
+        self.failed = 0
+
+    def notify(self, token: str, chat_id, text: str, parse_mode: str | None = None):
+        with self._condition:
+            if self._closed:
+                logger.error(f"Notification dispatcher is closed. Message to {chat_id} dropped.")
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+            self._pending.setdefault((token, chat_id, parse_mode), [time.monotonic(), []])[1].append(text)
+            self._condition.notify()
+
+    def bot(self, token: str) -> QueuedBot:
+        return QueuedBot(self, token)
+
+    def _transport(self, token: str):
+        if token not in self._transports:
+            self._transports[token] = self.transport_factory(token)
+        return self._transports[token]
+
+    def _next_batch(self):
+        #Returns the first batch that can be sent now, or the amount of seconds to wait for one
+        now = time.monotonic()
+        wait = None
+        for key, (queued_at, messages) in self._pending.items():
+            token, chat_id, _ = key
+            ready_at = max(
+                queued_at + (0 if self._closed else self.batch_delay),
+                self._next_chat_send.get((token, chat_id), 0),
+                self._next_bot_send.get(token, 0),
+            )
+            if ready_at <= now:
+                batch = []
+                length = 0
+                while messages and (not batch or length + len(BATCH_SEPARATOR) + len(messages[0]) <= MAX_MESSAGE_LENGTH):
+                    length += len(messages[0]) + (len(BATCH_SEPARATOR) if batch else 0)
+                    batch.append(messages.pop(0))
+                if not messages:
+                    del self._pending[key]
+                self._next_chat_send[(token, chat_id)] = now + self.chat_interval
+                self._next_bot_send[token] = now + self.bot_interval
+                return key, batch
+            wait = ready_at - now if wait is None else min(wait, ready_at - now)
+        return wait
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    next_batch = self._next_batch()
+                    if isinstance(next_batch, tuple):
+                        self._in_flight += 1
+                        break
+                    if next_batch is None and self._closed:
+                        self._condition.notify_all()
+                        return
+                    self._condition.wait(next_batch)
+            (token, chat_id, parse_mode), batch = next_batch
+            try:
+                self._transport(token).send(chat_id, BATCH_SEPARATOR.join(batch), parse_mode=parse_mode)
+                self.sent += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"Notification to {chat_id} could not be sent: {e}")
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        #Waits until every queued message has been sent
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout: float | None = 30):
+        #Sends the pending messages right away (without waiting for more messages to batch) and stops the thread
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
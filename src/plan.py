@@ -0,0 +1,150 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from exceptions import InvalidBookingGoal
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+SECONDS_PER_WEEK = 7 * 24 * 3600
+
+
+@dataclass(slots=True, frozen=True)
+class BookingGoal:
+    weekday: int
+    time: str
+    class_name: str
+    hours_in_advance: int
+    user: str = ""
+
+    @property
+    def day_name(self) -> str:
+        return WEEKDAYS[self.weekday]
+
+    @property
+    def opening_offset(self) -> int:
+        #Seconds from Monday 00:00 to the instant in which the booking window opens (it can fall on the previous week)
+        class_offset = self.weekday * 86400 + int(self.time[:2]) * 3600 + int(self.time[2:]) * 60
+        return (class_offset - self.hours_in_advance * 3600) % SECONDS_PER_WEEK
+
+    def class_datetime(self, day: datetime) -> datetime:
+        return datetime(day.year, day.month, day.day, int(self.time[:2]), int(self.time[2:]))
+
+    def slot_opening(self, class_datetime: datetime) -> datetime:
+        return class_datetime - timedelta(hours=self.hours_in_advance)
+
+
+def parse_goal(goal: str, default_hours_in_advance: int | None = None, user: str = "") -> BookingGoal:
+    #A goal is "day,HHMM,class name[,hours in advance]". When the hours are not part of the goal,
+    #the hours-in-advance of the user are used.
+    fields = [field.strip() for field in str(goal).split(',')]
+    if len(fields) not in (3, 4):
+        raise InvalidBookingGoal(f"{goal}: expected 'day,HHMM,class name[,hours in advance]'")
+
+    day_str, time_str, class_name = fields[:3]
+    if day_str.lower() not in WEEKDAYS:
+        raise InvalidBookingGoal(f"{goal}: unknown day '{day_str}'")
+    if len(time_str) != 4 or not time_str.isdigit() or int(time_str[:2]) > 23 or int(time_str[2:]) > 59:
+        raise InvalidBookingGoal(f"{goal}: time must be formatted like 'HHMM'")
+    if not class_name:
+        raise InvalidBookingGoal(f"{goal}: missing class name")
+
+    hours_str = fields[3] if len(fields) == 4 else default_hours_in_advance
+    try:
+        hours_in_advance = int(hours_str)
+    except (TypeError, ValueError):
+        raise InvalidBookingGoal(f"{goal}: missing or invalid hours in advance")
+    if hours_in_advance < 0:
+        raise InvalidBookingGoal(f"{goal}: hours in advance cannot be negative")
+
+    return BookingGoal(WEEKDAYS.index(day_str.lower()), time_str, class_name, hours_in_advance, user)
+
+
+@lru_cache(maxsize=256)
+def _compile_goals(booking_goals: tuple, default_hours_in_advance: int | None, user: str) -> tuple[BookingGoal, ...]:
+    return tuple(parse_goal(goal, default_hours_in_advance, user) for goal in booking_goals)
+
+
+def compile_goals(booking_goals: list[str] | None, default_hours_in_advance: int | None = None, user: str = "") -> tuple[BookingGoal, ...]:
+    #The goals of a configuration are parsed and validated only once
+    return _compile_goals(tuple(booking_goals or ()), default_hours_in_advance, user)
+
+
+def open_windows(goals: tuple[BookingGoal, ...] | list[BookingGoal], now: datetime) -> list[tuple[datetime, BookingGoal]]:
+    #Every (class datetime, goal) whose booking window is open at the given instant and whose class has not started,
+    #sorted by class datetime. A window opened in a run that was missed is still open until the class starts.
+    #Only one class can be booked per day, so with several goals on the same day we keep the one whose window
+    #opened most recently, as the single day booking does.
+    by_day = {}
+    for goal in goals:
+        day = datetime(now.year, now.month, now.day)
+        last_day = now + timedelta(hours=goal.hours_in_advance)
+        while day <= last_day:
+            if day.weekday() == goal.weekday:
+                class_datetime = goal.class_datetime(day)
+                opening = goal.slot_opening(class_datetime)
+                if opening <= now < class_datetime:
+                    current = by_day.get(day)
+                    if current is None or opening > current[2]:
+                        by_day[day] = (class_datetime, goal, opening)
+            day += timedelta(days=1)
+    return [(class_datetime, goal) for class_datetime, goal, _ in sorted(by_day.values(), key=lambda entry: entry[0])]
+
+
+def week_start(instant: datetime) -> datetime:
+    return datetime(instant.year, instant.month, instant.day) - timedelta(days=instant.weekday())
+
+
+class BookingPlan:
+    #Goals of all the users sorted by the instant of the week in which their booking window opens, so the
+    #next opening after any instant is found with a binary search.
+
+    def __init__(self, goals: list[BookingGoal]):
+        self.goals = sorted(goals, key=lambda goal: goal.opening_offset)
+        self.offsets = [goal.opening_offset for goal in self.goals]
+
+    @classmethod
+    def from_users(cls, users: list[tuple[str, dict]]) -> "BookingPlan":
+        goals = []
+        for user_name, user_config in users:
+            goals.extend(compile_goals(user_config.get("booking-goals"), user_config.get("hours-in-advance"), user_name))
+        return cls(goals)
+
+    def __len__(self):
+        return len(self.goals)
+
+    def next_opening(self, after: datetime) -> tuple[datetime, list[BookingGoal]] | None:
+        #Returns the first opening instant strictly after the given one and all the goals that open at that instant
+        if not self.goals:
+            return None
+        start = week_start(after)
+        offset = (after - start).total_seconds()
+        index = bisect_right(self.offsets, offset)
+        if index == len(self.offsets):
+            index = 0
+            start += timedelta(days=7)
+        opening_offset = self.offsets[index]
+        goals = []
+        while index < len(self.offsets) and self.offsets[index] == opening_offset:
+            goals.append(self.goals[index])
+            index += 1
+        return start + timedelta(seconds=opening_offset), goals
+
+    def openings(self, start: datetime, end: datetime):
+        #Yields every (opening instant, goals) in the interval (start, end]
+        cursor = start
+        while True:
+            next_opening = self.next_opening(cursor)
+            if next_opening is None or next_opening[0] > end:
+                return
+            yield next_opening
+            cursor = next_opening[0]
+
+    def cron_entries(self) -> list[str]:
+        #Crontab schedule expressions (minute hour * * day of week) of the distinct opening minutes
+        entries = []
+        for offset in sorted(set(offset // 60 * 60 for offset in self.offsets)):
+            weekday, rest = divmod(offset, 86400)
+            #cron counts the days of the week from Sunday (0)
+            entries.append(f"{rest % 3600 // 60} {rest // 3600} * * {(weekday + 1) % 7}")
+        return entries
@@ -0,0 +1,201 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError as FutureTimeout, wait
+from typing import Callable
+from urllib.parse import urlsplit
+
+from exceptions import CircuitOpen
+from timing import current_user, percentile, user_context
+
+logger = logging.getLogger('aimharder-bot')
+
+#Timeouts (seconds) used until an endpoint has enough latency samples
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 15.0
+#The adaptive timeouts are the p95 of the last samples times this, bounded by the limits below
+TIMEOUT_MULTIPLIER = 4
+MIN_CONNECT_TIMEOUT = 0.5
+MAX_CONNECT_TIMEOUT = 10.0
+MIN_READ_TIMEOUT = 1.0
+MAX_READ_TIMEOUT = 30.0
+HISTORY_SIZE = 100
+MIN_SAMPLES = 5
+#Consecutive failures of a host that open its circuit, and seconds until a request is tried again
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+#Delay of the hedged request when there is no latency history of the endpoint
+DEFAULT_HEDGE_DELAY = 1.0
+
+
+def endpoint_key(method: str, url: str) -> str:
+    #The box is part of the host (or of the path in the stand-in server), so the key keeps only the last part of
+    #the path, e.g. "GET api/bookings" or "POST login"
+    path = urlsplit(url).path.strip("/").split("/")
+    return f"{method.upper()} {'/'.join(path[-2:])}"
+
+
+def is_idempotent(method: str, url: str) -> bool:
+    #Booking and cancelling change something in AimHarder, and a timeout does not tell whether they were applied.
+    #Logging in again is harmless.
+    return method.upper() in ("GET", "HEAD", "OPTIONS") or urlsplit(url).path.rstrip("/").endswith("/login")
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return min(max(value, low), high)
+
+
+class LatencyHistory:
+    #Last latencies (time to first byte) and connection times of every endpoint, from which its timeouts are derived
+
+    def __init__(self, size: int = HISTORY_SIZE):
+        self._size = size
+        self._latencies = {}
+        self._connects = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, latency: float, connect: float | None = None):
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=self._size)).append(latency)
+            if connect is not None:
+                self._connects.setdefault(endpoint, deque(maxlen=self._size)).append(connect)
+
+    def p95(self, endpoint: str, connect: bool = False) -> float | None:
+        with self._lock:
+            samples = list((self._connects if connect else self._latencies).get(endpoint, ()))
+        return percentile(samples, 0.95) if len(samples) >= MIN_SAMPLES else None
+
+    def timeout(self, endpoint: str, idempotent: bool = True) -> tuple[float, float]:
+        #(connect, read) timeouts of the endpoint for requests. The read timeout of a request that is not idempotent
+        #is never tightened below the default one: the latency of a quiet period says nothing about a busy window
+        #opening, and a booking that times out on our side may have been accepted.
+        connect = self.p95(endpoint, connect=True)
+        read = self.p95(endpoint)
+        read_timeout = _clamp(read * TIMEOUT_MULTIPLIER, MIN_READ_TIMEOUT, MAX_READ_TIMEOUT) if read is not None else DEFAULT_READ_TIMEOUT
+        return (
+            _clamp(connect * TIMEOUT_MULTIPLIER, MIN_CONNECT_TIMEOUT, MAX_CONNECT_TIMEOUT) if connect is not None else DEFAULT_CONNECT_TIMEOUT,
+            read_timeout if idempotent else max(read_timeout, DEFAULT_READ_TIMEOUT),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._latencies.clear()
+            self._connects.clear()
+
+
+class CircuitBreaker:
+    #Per host: after failure_threshold consecutive failures (connection errors, timeouts or 5xx answers) the requests
+    #to the host fail right away with CircuitOpen during reset_timeout seconds. Then one request is let through and
+    #its result closes the circuit again or keeps it open.
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = {}
+        self._opened_at = {}
+        self._trial = set()
+        self._lock = threading.Lock()
+
+    def before(self, host: str):
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return
+            if self._clock() - opened_at < self.reset_timeout or host in self._trial:
+                raise CircuitOpen(host)
+            #Half open: this request is the trial
+            self._trial.add(host)
+
+    def success(self, host: str):
+        with self._lock:
+            if host in self._opened_at:
+                logger.info(f"Circuit of {host} closed.")
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+            self._trial.discard(host)
+
+    def failure(self, host: str):
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if host in self._trial or self._failures[host] >= self.failure_threshold:
+                if host not in self._opened_at:
+                    logger.error(f"Circuit of {host} opened after {self._failures[host]} failures.")
+                self._opened_at[host] = self._clock()
+                self._trial.discard(host)
+
+    def is_open(self, host: str) -> bool:
+        with self._lock:
+            return host in self._opened_at
+
+
+#Shared by all the sessions of the run, like the connection pool
+latency_history = LatencyHistory()
+circuit_breaker = CircuitBreaker()
+hedging = False
+
+
+def configure_resilience(hedge: bool = False, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                         reset_timeout: float = DEFAULT_RESET_TIMEOUT) -> CircuitBreaker:
+    global hedging, circuit_breaker
+    hedging = hedge
+    circuit_breaker = CircuitBreaker(failure_threshold, reset_timeout)
+    latency_history.clear()
+    return circuit_breaker
+
+
+def _start_attempt(attempt: Callable) -> Future:
+    #Every attempt gets its own thread: with a bounded pool the attempts of many users would wait in its queue, and
+    #that wait would be taken for a slow server and trigger more hedged requests
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(attempt())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="hedge", daemon=True).start()
+    return future
+
+
+def hedged(request: Callable, session, endpoint: str):
+    #Idempotent requests only: request(session) sends the request. If the first one has not answered after the usual
+    #latency of the endpoint (p95), it is sent again and the first successful answer is used.
+    #A request in flight cannot be cancelled, so the losing attempt keeps running in the background until it ends.
+    #That is why every attempt runs on its own copy of the session (same cookies and connection pool) and only the
+    #cookies of the answer used are copied back, so the losing attempt never touches the session of the user.
+    if not hedging:
+        return request(session)
+    user = current_user()
+
+    def attempt():
+        attempt_session = session.clone()
+        with user_context(user):
+            return request(attempt_session), attempt_session
+
+    def use(future):
+        response, attempt_session = future.result()
+        session.cookies.update(attempt_session.cookies)
+        return response
+
+    delay = latency_history.p95(endpoint) or DEFAULT_HEDGE_DELAY
+    first = _start_attempt(attempt)
+    try:
+        first.result(timeout=delay)
+        return use(first)
+    except FutureTimeout:
+        pass
+    logger.info(f"{endpoint} did not answer in {delay * 1000:.0f} ms, sending a hedged request.")
+    second = _start_attempt(attempt)
+    done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+    for future in done:
+        if future.exception() is None:
+            return use(future)
+    #The first one to finish failed, so the answer of the other one is used
+    other = second if first in done else first
+    return use(other)
@@ -0,0 +1,105 @@
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+logger = logging.getLogger('aimharder-bot')
+
+#Possible values of BookingResult.status
+STATUS_BOOKED = "booked"
+STATUS_NOT_AVAILABLE = "not-available"
+STATUS_ALREADY_BOOKED = "already-booked"
+STATUS_BOX_CLOSED = "box-closed"
+STATUS_NO_TRAINING_DAY = "no-training-day"
+STATUS_TOO_EARLY = "too-early"
+STATUS_NO_BOOKING_GOAL = "no-booking-goal"
+STATUS_FAILED = "failed"
+#The class was full and the user waits for a freed place (waitlist watcher)
+STATUS_WATCHING = "watching"
+STATUS_ERROR = "error"
+
+
+@dataclass
+class BookingResult:
+    user: str
+    status: str = STATUS_NOT_AVAILABLE
+    error: str | None = None
+    #Instant in which the booking window of the class opened (class datetime - hours in advance)
+    slot_open: datetime | None = None
+    #Instant in which the booking was confirmed by AimHarder
+    confirmed_at: datetime | None = None
+    #Wall time spent by the user task (login + fetch + booking)
+    elapsed: float = 0.0
+    #Seconds between the scheduled firing instant and the moment the booking request was sent (scheduler mode)
+    send_skew: float | None = None
+    #Number of booking requests sent and seconds from the first one to the successful one (burst mode)
+    attempts: int = 0
+    time_to_success: float | None = None
+    #Datetime of the class, when a user books several days in the same run (catch-up mode)
+    class_day: datetime | None = None
+
+    @property
+    def booked(self) -> bool:
+        return self.status == STATUS_BOOKED
+
+    @property
+    def latency(self) -> float | None:
+        #Seconds from the slot opening to the booking confirmation
+        if self.slot_open is None or self.confirmed_at is None:
+            return None
+        return (self.confirmed_at - self.slot_open).total_seconds()
+
+
+def iter_users(config: list[dict]) -> list[tuple[str, dict]]:
+    #The YAML config is a list of single-key dicts ({user_name: user_config})
+    return [(user_name, user_config) for entry in config for user_name, user_config in entry.items()]
+
+
+def _run_user(task: Callable[[str, dict], BookingResult | list[BookingResult]], user_name: str, user_config: dict) -> list[BookingResult]:
+    #A task can return several results (one per day booked in catch-up mode)
+    start = time.perf_counter()
+    try:
+        results = task(user_name, user_config)
+        if results is None:
+            results = BookingResult(user_name)
+    except Exception as e:
+        #One user failing must never affect the rest of them
+        logger.error(f"{user_name} - {traceback.format_exc()}")
+        results = BookingResult(user_name, status=STATUS_ERROR, error=str(e) or type(e).__name__)
+    if not isinstance(results, list):
+        results = [results]
+    elapsed = time.perf_counter() - start
+    for result in results:
+        result.elapsed = elapsed
+    return results
+
+
+def run_users(users: list[tuple[str, dict]], task: Callable[[str, dict], BookingResult], workers: int = 1) -> list[BookingResult]:
+    #With one worker the users are processed one after another, as it has always been done.
+    #Otherwise every user runs its login, fetch and booking in its own thread of a bounded pool.
+    if workers <= 1 or len(users) <= 1:
+        return [result for user_name, user_config in users for result in _run_user(task, user_name, user_config)]
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(users)), thread_name_prefix="booking") as executor:
+        futures = [executor.submit(_run_user, task, user_name, user_config) for user_name, user_config in users]
+        return [result for future in futures for result in future.result()]
+
+
+def format_summary(results: list[BookingResult]) -> str:
+    lines = ["Booking summary:"]
+    for result in results:
+        latency = f"{result.latency * 1000:.0f} ms after slot opening" if result.latency is not None else "-"
+        error = f" ({result.error})" if result.error else ""
+        skew = f" | skew: {result.send_skew * 1000:.3f} ms" if result.send_skew is not None else ""
+        attempts = f" | attempts: {result.attempts}" if result.attempts > 1 else ""
+        day = f" {result.class_day.strftime('%Y-%m-%d %H:%M')}" if result.class_day is not None else ""
+        lines.append(f"  {result.user}{day}: {result.status}{error} | latency: {latency} | elapsed: {result.elapsed * 1000:.0f} ms{skew}{attempts}")
+    booked = sum(1 for result in results if result.booked)
+    if any(result.class_day is not None for result in results):
+        lines.append(f"  {booked}/{len(results)} classes booked")
+    else:
+        lines.append(f"  {booked}/{len(results)} users booked")
+    return "\n".join(lines)
@@ -0,0 +1,137 @@
+import json
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from exceptions import BoxClosed, NoBookingGoal
+
+#Separator of the alternative class names of a goal, e.g. "WOD|OPEN" tries WOD first and OPEN as fallback
+CLASS_NAME_SEPARATOR = "|"
+OPEN_CLASS_TAG = "OPEN"
+#bookState = 0 => class is already booked, bookState = 1 => class is booked but you are in the waiting list
+BOOKED_STATES = (0, 1)
+
+
+def loads(content: bytes):
+    #orjson decodes the bytes of the response directly (pip install orjson, not needed otherwise)
+    return orjson.loads(content) if orjson is not None else json.loads(content)
+
+
+def is_day_booked(classes: list[dict]) -> bool:
+    return any(class_item.get('bookState') in BOOKED_STATES for class_item in classes)
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+def parse_start_time(timeid: str) -> str:
+    #timeid comes as "1700_60" (start and duration) or "17001800" (start and end). The start time is the first HHMM
+    return str(timeid)[:4]
+
+
+@dataclass(slots=True)
+class ClassSlot:
+    id: int
+    start: str
+    name: str
+    key: str
+    is_open: bool
+    book_state: int | None
+    raw: dict
+
+    @classmethod
+    def from_dict(cls, class_item: dict) -> "ClassSlot":
+        name, key, is_open = _name_fields(class_item.get("className", ""))
+        return cls(class_item.get("id"), _start_time(class_item.get("timeid", "")), name, key, is_open,
+                   class_item.get("bookState"), class_item)
+
+
+#The same few class names and start times come in every listing, so they are interned and their fields are
+#computed once, and the slots of every day and user share the same strings
+@lru_cache(maxsize=1024)
+def _name_fields(name: str) -> tuple[str, str, bool]:
+    name = sys.intern(name)
+    return name, normalize_name(name), OPEN_CLASS_TAG in name
+
+
+@lru_cache(maxsize=1024)
+def _start_time(timeid: str) -> str:
+    return sys.intern(parse_start_time(timeid))
+
+
+class Schedule:
+    #Classes of one day indexed by start time and by (start time, normalized class name)
+
+    def __init__(self, classes: list[dict]):
+        self.slots = []
+        self.by_start = {}
+        self.by_start_and_name = {}
+        #Whether the user that fetched the listing has a class of the day booked, found while indexing it
+        self.booked = False
+        for class_item in classes:
+            slot = ClassSlot.from_dict(class_item)
+            self.slots.append(slot)
+            self.by_start.setdefault(slot.start, []).append(slot)
+            self.by_start_and_name.setdefault((slot.start, slot.key), []).append(slot)
+            if slot.book_state in BOOKED_STATES:
+                self.booked = True
+
+    @classmethod
+    def decode(cls, content: bytes) -> "Schedule":
+        #The body of the classes response is decoded and indexed in one pass, without the list of classes
+        #in between (the "bookings" key is null for a closed box)
+        return cls(loads(content).get("bookings") or [])
+
+    def __len__(self):
+        return len(self.slots)
+
+    def at(self, target_time: str, include_open: bool = True) -> list[ClassSlot]:
+        slots = self.by_start.get(target_time, [])
+        if include_open:
+            return slots
+        return [slot for slot in slots if not slot.is_open]
+
+    def _match(self, target_time: str, name: str) -> ClassSlot | None:
+        include_open = OPEN_CLASS_TAG in name
+        #Exact match of the normalized name
+        for slot in self.by_start_and_name.get((target_time, normalize_name(name)), []):
+            if include_open or not slot.is_open:
+                return slot
+        #Partial match of the name among the few classes at that time
+        for slot in self.at(target_time, include_open):
+            if name in slot.name:
+                return slot
+        return None
+
+    def candidates(self, target_time: str, class_name: str) -> list[ClassSlot]:
+        #Returns the classes that take place at the target time matching the class names, in the order of the names.
+        #Classes tagged as OPEN are only considered when the goal asks for an OPEN class.
+        if len(self.slots) == 0:
+            raise BoxClosed
+
+        if target_time not in self.by_start:
+            raise NoBookingGoal(target_time)
+
+        names = [name.strip() for name in class_name.split(CLASS_NAME_SEPARATOR) if name.strip()]
+        found = []
+        for name in names:
+            slot = self._match(target_time, name)
+            if slot is not None and slot not in found:
+                found.append(slot)
+        if found:
+            return found
+
+        #If there is only one class at that time it is the one to book, whatever its name is
+        remaining = self.at(target_time, include_open=any(OPEN_CLASS_TAG in name for name in names))
+        if len(remaining) == 1:
+            return remaining
+        raise NoBookingGoal(class_name)
+
+    def find(self, target_time: str, class_name: str) -> ClassSlot:
+        return self.candidates(target_time, class_name)[0]
@@ -0,0 +1,58 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from plan import BookingPlan
+
+logger = logging.getLogger('aimharder-bot')
+
+#Below this amount of seconds the scheduler stops sleeping and spins until the target instant
+SPIN_THRESHOLD = 0.005
+#Default amount of seconds before the slot opening in which the user logs in and fetches the classes
+DEFAULT_PREWARM_SECONDS = 30
+
+
+def sleep_until(target: datetime, now: Callable[[], datetime] = datetime.today, spin_threshold: float = SPIN_THRESHOLD) -> float:
+    #The wall clock is read only once to translate the target into a monotonic deadline, so any
+    #adjustment of the system clock while sleeping does not move the firing instant.
+    #It returns the monotonic deadline, so the caller can measure the skew when sending the request.
+    deadline = time.monotonic() + (target - now()).total_seconds()
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return deadline
+        if remaining > spin_threshold:
+            time.sleep(remaining - spin_threshold)
+
+
+def run_scheduler(users: list[tuple[str, dict]], task: Callable, prewarm_seconds: float = DEFAULT_PREWARM_SECONDS,
+                  now: Callable[[], datetime] = datetime.today, stop: threading.Event | None = None):
+    #Long-running mode: instead of waiting for cron to launch the bot, we compute when the booking window of every
+    #user opens and launch the task some seconds in advance. The task (main) logs in, fetches the classes and then
+    #waits until the exact opening instant to send the booking request.
+    stop = stop or threading.Event()
+    plan = BookingPlan.from_users(users)
+    configs = dict(users)
+    cursor = now()
+
+    while not stop.is_set():
+        next_opening = plan.next_opening(cursor)
+        if next_opening is None:
+            return
+        opening, goals = next_opening
+        user_names = list(dict.fromkeys(goal.user for goal in goals))
+        logger.info(f"Next slot opening at {opening.strftime('%Y-%m-%d %H:%M:%S')} for {', '.join(user_names)}")
+
+        #We wait in small steps so the scheduler can be stopped while waiting
+        prewarm_at = opening - timedelta(seconds=prewarm_seconds)
+        while not stop.is_set() and (prewarm_at - now()).total_seconds() > 1:
+            stop.wait(min(60, (prewarm_at - now()).total_seconds() - 1))
+        if stop.is_set():
+            return
+        sleep_until(prewarm_at, now)
+
+        for user_name in user_names:
+            threading.Thread(target=task, args=(user_name, configs[user_name], opening), name=f"booking-{user_name}", daemon=True).start()
+        cursor = opening
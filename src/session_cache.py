@@ -0,0 +1,82 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from requests import Session
+from requests.cookies import create_cookie
+
+logger = logging.getLogger('aimharder-bot')
+
+#Sessions older than this are considered stale even if the cookies do not expire before
+DEFAULT_MAX_AGE_SECONDS = 12 * 3600
+
+
+class SessionCache:
+    #Stores the cookies of the logged in sessions on disk so that the next runs can skip the login request.
+    #The folder and the files are only readable by the owner, since the cookies give access to the account.
+
+    def __init__(self, folder: str, max_age: float = DEFAULT_MAX_AGE_SECONDS):
+        self.folder = folder
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        os.chmod(folder, 0o700)
+
+    def _path(self, email: str, box_name: str) -> str:
+        key = hashlib.sha256(f"{email.lower()}|{box_name}".encode()).hexdigest()
+        return os.path.join(self.folder, f"{key}.json")
+
+    def load(self, email: str, box_name: str, session: Session) -> bool:
+        #Restores the cached cookies into the given session. Returns False if there is no usable cached session
+        path = self._path(email, box_name)
+        try:
+            with open(path, 'r') as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            return False
+
+        now = time.time()
+        if now - cached.get("saved_at", 0) > self.max_age:
+            logger.info(f"Cached session of {email} is too old.")
+            self.invalidate(email, box_name)
+            return False
+
+        cookies = cached.get("cookies", [])
+        if not cookies or any(cookie["expires"] is not None and cookie["expires"] <= now for cookie in cookies):
+            logger.info(f"Cached session of {email} has expired.")
+            self.invalidate(email, box_name)
+            return False
+
+        for cookie in cookies:
+            session.cookies.set_cookie(create_cookie(**cookie))
+        return True
+
+    def save(self, email: str, box_name: str, session: Session):
+        cookies = [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "expires": cookie.expires,
+                "secure": cookie.secure,
+            }
+            for cookie in session.cookies
+        ]
+        path = self._path(email, box_name)
+        tmp_path = f"{path}.tmp"
+        with self._lock:
+            #The file is created with owner-only permissions and atomically replaced
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as file:
+                json.dump({"saved_at": time.time(), "cookies": cookies}, file)
+            os.replace(tmp_path, path)
+
+    def invalidate(self, email: str, box_name: str):
+        try:
+            os.remove(self._path(email, box_name))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,104 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from threading import BrokenBarrierError
+from typing import Callable, Hashable
+
+from runner import BookingResult, run_users, STATUS_ERROR
+from timing import timings
+
+logger = logging.getLogger('aimharder-bot')
+
+#Seconds that a shard waits for the rest of them to be ready before booking anyway
+DEFAULT_BARRIER_TIMEOUT = 60
+
+
+def shard_users(users: list[tuple[str, dict]], key: Callable[[str, dict], Hashable], processes: int) -> list[list[tuple[str, dict]]]:
+    #The users with the same key (box and booking window opening) always go to the same shard, so they share its
+    #connections and listings. The groups are spread from the largest one to the shard with less users.
+    groups = {}
+    for user_name, user_config in users:
+        groups.setdefault(key(user_name, user_config), []).append((user_name, user_config))
+    shards = [[] for _ in range(max(1, min(processes, len(groups))))]
+    for group in sorted(groups.values(), key=len, reverse=True):
+        min(shards, key=len).extend(group)
+    return [shard for shard in shards if shard]
+
+
+def pin_to_cpu(index: int):
+    #Every shard runs on its own CPU when there are enough of them (only on Linux)
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    cpus = sorted(os.sched_getaffinity(0))
+    cpu = cpus[index % len(cpus)]
+    os.sched_setaffinity(0, {cpu})
+    logger.debug(f"Shard {index} pinned to CPU {cpu}")
+
+
+class ForwardTransport:
+    #Notification transport of the shards: the messages are sent to the parent process, which sends all of them
+    #through its own dispatcher (one stream with the Telegram rate limits of every bot)
+
+    def __init__(self, notifications, token: str):
+        self.notifications = notifications
+        self.token = token
+
+    def send(self, chat_id, text: str, parse_mode: str | None = None):
+        self.notifications.put((self.token, chat_id, text, parse_mode))
+
+
+def run_shard(index: int, users: list[tuple[str, dict]], task_name: str, options: dict, barrier, notifications,
+              barrier_timeout: float = DEFAULT_BARRIER_TIMEOUT) -> tuple[list[BookingResult], list[dict]]:
+    #Entry point of every process of the pool. Returns the results and the timing spans of the shard
+    pin_to_cpu(index)
+    import main as bot
+    bot.configure_shard(index, options, lambda token: ForwardTransport(notifications, token))
+    try:
+        #The shards start booking together once all of them are ready
+        barrier.wait(barrier_timeout)
+    except BrokenBarrierError:
+        bot.logger.error(f"Shard {index} did not wait for the rest of the shards.")
+    results = run_users(users, getattr(bot, task_name), workers=options.get("workers", 1))
+    #The notifications still queued are forwarded before the process ends
+    bot.notifier.close()
+    return results, list(bot.timings.spans)
+
+
+def run_sharded(users: list[tuple[str, dict]], task_name: str, options: dict, processes: int,
+                key: Callable[[str, dict], Hashable], notify: Callable | None = None,
+                barrier_timeout: float = DEFAULT_BARRIER_TIMEOUT) -> list[BookingResult]:
+    #Runs the task (a function of the main module) for the users in a pool of processes, one shard per process,
+    #and returns the results of all of them. The notifications of the shards are passed to notify and their timing
+    #spans are added to the timings of this process.
+    shards = shard_users(users, key, processes)
+    logger.info(f"Running {len(users)} users in {len(shards)} shards: {[len(shard) for shard in shards]}")
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        barrier = manager.Barrier(len(shards))
+        notifications = manager.Queue()
+
+        def forward():
+            while (item := notifications.get()) is not None:
+                if notify is not None:
+                    notify(*item)
+
+        forwarder = threading.Thread(target=forward, name="shard-notifications", daemon=True)
+        forwarder.start()
+        results = []
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+            futures = [executor.submit(run_shard, index, shard, task_name, options, barrier, notifications, barrier_timeout)
+                       for index, shard in enumerate(shards)]
+            for shard, future in zip(shards, futures):
+                try:
+                    shard_results, spans = future.result()
+                    results.extend(shard_results)
+                    timings.merge(spans)
+                except Exception as e:
+                    #A shard that dies must not hide the results of the rest of them
+                    logger.error(f"Shard of {', '.join(user_name for user_name, _ in shard)} failed: {e}")
+                    results.extend(BookingResult(user_name, status=STATUS_ERROR, error=str(e) or type(e).__name__) for user_name, _ in shard)
+        notifications.put(None)
+        forwarder.join()
+    return results
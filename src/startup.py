@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import time
+
+IMPORT_TIME_PREFIX = "import time:"
+DEFAULT_TOP_IMPORTS = 15
+
+
+def parse_import_times(lines: list[str]) -> list[tuple[str, int, int, int]]:
+    #Lines of python -X importtime as (module, self us, cumulative us, nesting level). The header line is skipped.
+    imports = []
+    for line in lines:
+        if not line.startswith(IMPORT_TIME_PREFIX):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len(IMPORT_TIME_PREFIX):].split("|", 2)
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue
+        module = name.strip()
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((module, self_us, cumulative_us, level))
+    return imports
+
+
+def format_import_report(imports: list[tuple[str, int, int, int]], wall: float, top: int = DEFAULT_TOP_IMPORTS) -> str:
+    total = sum(self_us for _, self_us, _, _ in imports)
+    lines = [f"Startup: {wall * 1000:.1f} ms in total, {total / 1000:.1f} ms importing {len(imports)} modules"]
+    lines.append(f"Top {top} imports by cumulative time (ms):")
+    for module, _, cumulative_us, _ in sorted((i for i in imports if i[3] == 0), key=lambda i: i[2], reverse=True)[:top]:
+        lines.append(f"  {cumulative_us / 1000:8.1f}  {module}")
+    lines.append(f"Top {top} modules by own time (ms):")
+    for module, self_us, _, _ in sorted(imports, key=lambda i: i[1], reverse=True)[:top]:
+        lines.append(f"  {self_us / 1000:8.1f}  {module}")
+    return "\n".join(lines)
+
+
+def profile_startup(argv: list[str], top: int = DEFAULT_TOP_IMPORTS) -> int:
+    #Runs the bot with the same arguments under python -X importtime and prints where the startup time goes.
+    #The output of the run is passed through and its exit code is returned.
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"), *argv],
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    lines = process.stderr.splitlines()
+    other = [line for line in lines if not line.startswith(IMPORT_TIME_PREFIX)]
+    if other:
+        print("\n".join(other), file=sys.stderr)
+    print(format_import_report(parse_import_times(lines), wall, top))
+    return process.returncode
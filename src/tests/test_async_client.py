@@ -0,0 +1,129 @@
+import asyncio
+import datetime
+from contextlib import nullcontext as does_not_raise
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from async_client import AsyncAimHarderClient
+from constants import ERROR_TAG_ID, set_base_url
+from exceptions import BookingFailed, IncorrectCredentials, TooEarly, MESSAGE_BOOKING_FAILED_NO_CREDIT
+
+DAY = datetime.datetime(2022, 3, 2)
+
+
+async def serve(handlers: dict):
+    app = web.Application()
+    for path, handler in handlers.items():
+        app.router.add_route("*", path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+@pytest.fixture
+def endpoints():
+    yield set_base_url
+    set_base_url(None)
+
+
+def login_handler(error=""):
+    async def handler(request):
+        return web.Response(text=f'<span id="{ERROR_TAG_ID}">{error}</span>', content_type="text/html")
+    return handler
+
+
+def json_handler(payload):
+    async def handler(request):
+        return web.json_response(payload)
+    return handler
+
+
+class TestAsyncAimHarderClient:
+    @pytest.mark.parametrize(
+        "error, expectation",
+        (
+            ("", does_not_raise()),
+            (IncorrectCredentials.key_phrase, pytest.raises(IncorrectCredentials)),
+        ),
+    )
+    def test_login(self, endpoints, error, expectation):
+        async def scenario():
+            runner, base_url = await serve({"/login": login_handler(error)})
+            endpoints(base_url)
+            try:
+                with expectation:
+                    async with AsyncAimHarderClient("foo", "bar", 1, "foo"):
+                        pass
+            finally:
+                await runner.cleanup()
+
+        asyncio.run(scenario())
+
+    @pytest.mark.parametrize(
+        "payload, expectation",
+        (
+            ({}, does_not_raise()),
+            ({"bookState": -2}, pytest.raises(BookingFailed, match=MESSAGE_BOOKING_FAILED_NO_CREDIT)),
+            ({"bookState": -12, "errorMssgLang": "ERROR_ANTELACION_CLIENTE_HORAS"}, pytest.raises(TooEarly)),
+        ),
+    )
+    def test_get_classes_and_book(self, endpoints, payload, expectation):
+        classes = [{"id": 123, "timeid": "1700_60", "className": "foo"}]
+
+        async def scenario():
+            runner, base_url = await serve({
+                "/login": login_handler(),
+                "/foo/api/bookings": json_handler({"bookings": classes}),
+                "/foo/api/book": json_handler(payload),
+            })
+            endpoints(base_url)
+            try:
+                async with AsyncAimHarderClient("foo", "bar", 1, "foo") as client:
+                    assert await client.get_classes(DAY) == classes
+                    with expectation:
+                        assert await client.book_class(DAY, classes[0])
+            finally:
+                await runner.cleanup()
+
+        asyncio.run(scenario())
+
+    def test_timeout(self, endpoints):
+        async def slow(request):
+            await asyncio.sleep(1)
+            return web.json_response({"bookings": []})
+
+        async def scenario():
+            runner, base_url = await serve({"/login": login_handler(), "/foo/api/bookings": slow})
+            endpoints(base_url)
+            try:
+                async with AsyncAimHarderClient("foo", "bar", 1, "foo", timeout=0.1) as client:
+                    with pytest.raises(asyncio.TimeoutError):
+                        await client.get_classes(DAY)
+            finally:
+                await runner.cleanup()
+
+        asyncio.run(scenario())
+
+    def test_many_users_in_one_loop(self, endpoints):
+        async def scenario():
+            runner, base_url = await serve({"/login": login_handler(), "/foo/api/book": json_handler({})})
+            endpoints(base_url)
+            connector = aiohttp.TCPConnector(limit=20)
+            try:
+                async def book(user):
+                    async with AsyncAimHarderClient(user, "bar", 1, "foo", connector=connector) as client:
+                        return await client.book_class(DAY, {"id": 123})
+
+                results = await asyncio.gather(*(book(f"user{i}") for i in range(50)))
+                assert all(results)
+            finally:
+                await connector.close()
+                await runner.cleanup()
+
+        asyncio.run(scenario())
@@ -0,0 +1,66 @@
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+
+from batch import BatchOperation, ScheduleChange, apply_operation, change_for_day, parse_change, plan_operation, \
+    STATUS_CANCELLED, STATUS_REPLACED
+from exceptions import BookingFailed, InvalidBookingGoal, NoBookingGoal
+from runner import STATUS_FAILED
+
+DAY = datetime(2025, 2, 3)
+CLASSES = [
+    {"id": 1, "timeid": "1700_60", "className": "WOD", "bookState": 0},
+    {"id": 2, "timeid": "1800_60", "className": "WOD", "bookState": None},
+]
+
+
+@pytest.mark.parametrize("entry, expected", [
+    ("2025-02-03", ScheduleChange(DAY)),
+    (" 2025-02-03 , 1800 , WOD ", ScheduleChange(DAY, "1800", "WOD")),
+])
+def test_parse_change(entry, expected):
+    assert parse_change(entry) == expected
+
+
+@pytest.mark.parametrize("entry", ["03/02/2025", "2025-02-03,1800", "2025-02-03,2500,WOD", "2025-02-03,1800,"])
+def test_parse_change_invalid(entry):
+    with pytest.raises(InvalidBookingGoal):
+        parse_change(entry)
+
+
+def test_change_for_day():
+    changes = [ScheduleChange(DAY), ScheduleChange(datetime(2025, 2, 4)), ScheduleChange(DAY, "1800", "WOD")]
+    assert change_for_day(changes, datetime(2025, 2, 3, 17, 0)) == changes[2]
+    assert change_for_day(changes, datetime(2025, 2, 5)) is None
+
+
+class TestPlanOperation:
+    def test_day_without_training_cancels_the_bookings(self):
+        assert plan_operation(ScheduleChange(DAY), CLASSES) == BatchOperation(DAY, [CLASSES[0]])
+        assert plan_operation(ScheduleChange(DAY), CLASSES[1:]) is None
+
+    def test_replacement(self):
+        assert plan_operation(ScheduleChange(DAY, "1800", "WOD"), CLASSES) == BatchOperation(DAY, [CLASSES[0]], CLASSES[1])
+        assert plan_operation(ScheduleChange(DAY, "1700", "WOD"), CLASSES) is None
+        with pytest.raises(NoBookingGoal):
+            plan_operation(ScheduleChange(DAY, "1900", "WOD"), CLASSES)
+
+
+class TestApplyOperation:
+    def test_cancels_after_the_replacement_is_booked(self):
+        client = Mock()
+        result = apply_operation(client, BatchOperation(DAY, [CLASSES[0]], CLASSES[1]))
+        assert result.status == STATUS_REPLACED
+        assert [call[0] for call in client.method_calls] == ["book_class", "cancel_booked_class"]
+
+    def test_failed_replacement_keeps_the_bookings(self):
+        client = Mock()
+        client.book_class.side_effect = BookingFailed("full")
+        result = apply_operation(client, BatchOperation(DAY, [CLASSES[0]], CLASSES[1]))
+        assert (result.status, result.cancelled, result.error) == (STATUS_FAILED, [], "full")
+        client.cancel_booked_class.assert_not_called()
+
+    def test_cancellation(self):
+        result = apply_operation(Mock(), BatchOperation(DAY, [CLASSES[0]]))
+        assert (result.status, result.cancelled) == (STATUS_CANCELLED, [CLASSES[0]])
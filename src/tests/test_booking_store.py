@@ -0,0 +1,59 @@
+import datetime
+
+import pytest
+
+from booking_store import BookingStore, STATUS_CANCELLED, format_history
+from runner import STATUS_BOOKED, STATUS_ALREADY_BOOKED, STATUS_BOX_CLOSED, STATUS_FAILED, STATUS_TOO_EARLY
+
+DAY = datetime.datetime(2025, 1, 28, 10, 0)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = BookingStore(str(tmp_path / "state" / "bookings.db"))
+    yield store
+    store.close()
+
+
+class TestBookingStore:
+    @pytest.mark.parametrize(
+        "statuses, expected",
+        (
+            ([], None),
+            ([STATUS_TOO_EARLY, STATUS_FAILED], None),
+            ([STATUS_TOO_EARLY, STATUS_BOOKED], STATUS_BOOKED),
+            ([STATUS_BOOKED, STATUS_CANCELLED], None),
+            ([STATUS_BOOKED, STATUS_CANCELLED, STATUS_ALREADY_BOOKED], STATUS_ALREADY_BOOKED),
+            ([STATUS_BOX_CLOSED], STATUS_BOX_CLOSED),
+        ),
+    )
+    def test_day_status(self, store, statuses, expected):
+        for status in statuses:
+            store.record("user1", DAY, status, "1000", "WOD", 123)
+        assert store.day_status("user1", DAY) == expected
+        assert store.day_status("user2", DAY) is None
+        assert store.day_status("user1", DAY + datetime.timedelta(days=1)) is None
+
+    def test_history_and_success_rate(self, store):
+        store.record("user1", DAY, STATUS_TOO_EARLY, "1000", "WOD")
+        store.record("user1", DAY, STATUS_BOOKED, "1000", "WOD", 123, latency=0.2)
+        store.record("user1", DAY + datetime.timedelta(days=1), STATUS_ALREADY_BOOKED, "1000", "WOD")
+        store.record_cancel("user1", DAY, 123)
+        store.record("user2", DAY, STATUS_FAILED, "1000", "WOD", error="No credit available")
+
+        assert [record["status"] for record in store.history("user1")] == [STATUS_CANCELLED, STATUS_ALREADY_BOOKED, STATUS_BOOKED, STATUS_TOO_EARLY]
+        assert len(store.history(since=DAY + datetime.timedelta(days=1))) == 1
+        assert store.success_rate() == {
+            "user1": {"attempts": 2, "booked": 1, "rate": 0.5, "latency_avg": 0.2},
+            "user2": {"attempts": 1, "booked": 0, "rate": 0.0, "latency_avg": None},
+        }
+        report = format_history(store)
+        assert "  user1: 1/2 (50%) | avg latency: 200 ms" in report
+        assert "user2 2025-01-28 1000 WOD: failed (No credit available)" in report
+
+    def test_records_survive_reopening(self, tmp_path):
+        path = str(tmp_path / "bookings.db")
+        store = BookingStore(path)
+        store.record("user1", DAY, STATUS_BOOKED)
+        store.close()
+        assert BookingStore(path).day_status("user1", DAY) == STATUS_BOOKED
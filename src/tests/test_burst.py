@@ -0,0 +1,60 @@
+import datetime
+from contextlib import nullcontext as does_not_raise
+from unittest.mock import Mock
+
+import pytest
+
+from burst import book_with_burst
+from exceptions import BookingFailed, TooEarly, AlreadyBooked, MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY, MESSAGE_BOOKING_FAILED_NO_CREDIT
+
+DAY = datetime.datetime(2022, 3, 2)
+FULL = BookingFailed(MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY)
+NO_CREDIT = BookingFailed(MESSAGE_BOOKING_FAILED_NO_CREDIT)
+TOO_EARLY = TooEarly(DAY)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+class TestBookWithBurst:
+    @pytest.mark.parametrize(
+        "responses, candidates, expected_id, expected_attempts, expectation",
+        (
+            ([True], [{"id": 1}], 1, 1, does_not_raise()),
+            ([TOO_EARLY, TOO_EARLY, True], [{"id": 1}], 1, 3, does_not_raise()),
+            #The class is full, so the alternative one is booked
+            ([FULL, True], [{"id": 1}, {"id": 2}], 2, 2, does_not_raise()),
+            ([FULL], [{"id": 1}], None, None, pytest.raises(BookingFailed, match=MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY)),
+            #No credit stops immediately, even if there are alternative classes
+            ([NO_CREDIT, True], [{"id": 1}, {"id": 2}], None, None, pytest.raises(BookingFailed, match=MESSAGE_BOOKING_FAILED_NO_CREDIT)),
+            ([AlreadyBooked(DAY)], [{"id": 1}], None, None, pytest.raises(AlreadyBooked)),
+        ),
+    )
+    def test_book_with_burst(self, responses, candidates, expected_id, expected_attempts, expectation):
+        clock = FakeClock()
+        client = Mock(book_class=Mock(side_effect=responses))
+        with expectation:
+            outcome = book_with_burst(client, DAY, candidates, window=2, clock=clock, sleep=clock.sleep)
+            assert outcome.booked_class["id"] == expected_id
+            assert outcome.attempts == expected_attempts
+            assert outcome.time_to_success == sum(clock.sleeps)
+
+    def test_window_is_bounded(self):
+        clock = FakeClock()
+        client = Mock(book_class=Mock(side_effect=TOO_EARLY))
+        with pytest.raises(TooEarly):
+            book_with_burst(client, DAY, [{"id": 1}], window=1, clock=clock, sleep=clock.sleep)
+        assert clock.now <= 1
+        #Backoff grows with jitter but never over the maximum delay
+        assert all(delay <= 0.5 for delay in clock.sleeps)
+        assert client.book_class.call_count == len(clock.sleeps) + 1
@@ -0,0 +1,50 @@
+from email.utils import formatdate
+
+import pytest
+
+from clock import ClockSync
+
+
+class FakeServer:
+    #Local clock and AimHarder clock (ahead by `offset` seconds) with a fixed round trip time
+    def __init__(self, offset, rtt, start=1_700_000_000.123):
+        self.local = start
+        self.offset = offset
+        self.rtt = rtt
+
+    def clock(self):
+        return self.local
+
+    def sleep(self, seconds):
+        self.local += seconds
+
+    def fetch_date(self):
+        #The server reads its clock in the middle of the round trip
+        self.local += self.rtt / 2
+        date = formatdate(self.local + self.offset, usegmt=True)
+        self.local += self.rtt / 2
+        return date
+
+
+class TestClockSync:
+    @pytest.mark.parametrize("offset", (0.0, 0.35, -0.8, 12.6))
+    def test_sync(self, offset):
+        server = FakeServer(offset, rtt=0.04)
+        clock_sync = ClockSync(samples=10, fetch_date=server.fetch_date, clock=server.clock, sleep=server.sleep)
+        estimation = clock_sync.sync()
+        assert abs(estimation - offset) <= clock_sync.uncertainty
+        #With the samples spread along a second the uncertainty is close to the round trip time
+        assert clock_sync.uncertainty < 0.15
+        assert clock_sync.rtt == pytest.approx(0.04)
+
+    def test_now_is_corrected(self):
+        server = FakeServer(2.0, rtt=0.01)
+        clock_sync = ClockSync(samples=10, fetch_date=server.fetch_date, clock=server.clock, sleep=server.sleep)
+        clock_sync.sync()
+        assert abs(clock_sync.now().timestamp() - (server.local + 2.0)) < 0.15
+
+    def test_single_sample(self):
+        server = FakeServer(0.5, rtt=0.02)
+        clock_sync = ClockSync(samples=1, fetch_date=server.fetch_date, clock=server.clock, sleep=server.sleep)
+        clock_sync.sync()
+        assert abs(clock_sync.offset - 0.5) <= clock_sync.uncertainty <= 0.52
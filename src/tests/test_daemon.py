@@ -0,0 +1,118 @@
+import datetime
+import json
+import os
+import threading
+import time
+from unittest.mock import Mock
+
+from daemon import BookingDaemon, WarmClients
+from runner import BookingResult, STATUS_BOOKED
+
+#Sunday 09:00 is the opening of the booking window of a Tuesday class at 10:00 booked 49 hours in advance
+OPENING = datetime.datetime(2025, 1, 26, 9, 0)
+
+
+def user(goals, email="user1@mail.com"):
+    return {"email": email, "password": "pass", "box-name": "box", "box-id": 1, "booking-goals": goals, "exceptions": None}
+
+
+def write_config(path, config):
+    with open(path, 'w') as file:
+        json.dump(config, file)
+    #Some filesystems have a coarse mtime, so it is moved forward to be sure that the change is seen
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def make_daemon(tmp_path, task=None, now=lambda: OPENING - datetime.timedelta(hours=1), **kwargs):
+    path = str(tmp_path / "config.json")
+
+    def load_config():
+        with open(path) as file:
+            return json.load(file)
+
+    return path, BookingDaemon(path, load_config, task or Mock(), now=now, status_path=str(tmp_path / "status.json"), **kwargs)
+
+
+class TestWarmClients:
+    def test_clients_are_reused_until_the_credentials_change(self):
+        factory = Mock(side_effect=lambda *args: Mock())
+        clients = WarmClients(factory)
+
+        first = clients.get("user1", "user1@mail.com", "pass", 1, "box")
+        assert clients.get("user1", "user1@mail.com", "pass", 1, "box") is first
+        first.revalidate.assert_called_once()
+
+        assert clients.get("user1", "user1@mail.com", "new-pass", 1, "box") is not first
+        assert factory.call_count == 2
+
+
+class TestBookingDaemon:
+    def test_reload_applies_the_changes(self, tmp_path):
+        warm_clients = WarmClients(lambda *args: Mock())
+        path, daemon = make_daemon(tmp_path, warm_clients=warm_clients)
+        write_config(path, [{"user1": user(["tuesday,1000,WOD,49"])}, {"user2": user(["friday,1800,WOD,48"], "user2@mail.com")}])
+        assert daemon.reload()
+        assert sorted(daemon.users) == ["user1", "user2"]
+        assert not daemon.reload()
+
+        warm_clients.get("user2", "user2@mail.com", "pass", 1, "box")
+        write_config(path, [{"user1": user(["tuesday,1000,WOD,49", "wednesday,1000,WOD,49"])}])
+        assert daemon.reload()
+        assert sorted(daemon.users) == ["user1"]
+        assert len(daemon.plan) == 2
+        assert warm_clients.users() == []
+
+        status = json.loads((tmp_path / "status.json").read_text())
+        assert status["users"] == ["user1"]
+        assert status["upcoming"][0] == {
+            "opens_at": "2025-01-26T09:00:00",
+            "fires_at": "2025-01-26T08:59:30",
+            "user": "user1",
+            "class": "1000 WOD",
+            "class_at": "2025-01-28T10:00:00",
+        }
+
+    def test_wrong_configuration_keeps_the_previous_one(self, tmp_path):
+        path, daemon = make_daemon(tmp_path)
+        write_config(path, [{"user1": user(["tuesday,1000,WOD,49"])}])
+        daemon.reload()
+        write_config(path, [{"user1": user(["someday,1000,WOD,49"])}])
+        assert not daemon.reload()
+        assert len(daemon.plan) == 1
+
+    def test_users_added_while_running_are_booked(self, tmp_path):
+        start = time.monotonic()
+
+        def clock():
+            return OPENING - datetime.timedelta(milliseconds=300) + datetime.timedelta(seconds=time.monotonic() - start)
+
+        fired = threading.Event()
+        calls = []
+
+        def task(user_name, configuration, opening):
+            calls.append((user_name, opening, clock()))
+            fired.set()
+            return BookingResult(user_name, status=STATUS_BOOKED)
+
+        path, daemon = make_daemon(tmp_path, task, now=clock, prewarm_seconds=0.1, reload_interval=0.02)
+        write_config(path, [])
+        thread = threading.Thread(target=daemon.run, daemon=True)
+        thread.start()
+        time.sleep(0.05)
+        write_config(path, [{"user1": user(["tuesday,1000,WOD,49"])}])
+
+        assert fired.wait(2)
+        daemon.stop.set()
+        thread.join(2)
+
+        user_name, opening, fired_at = calls[0]
+        assert (user_name, opening) == ("user1", OPENING)
+        assert OPENING - datetime.timedelta(milliseconds=100) <= fired_at < OPENING
+        #The result is written to the status file by the booking thread
+        deadline = time.monotonic() + 2
+        status = {}
+        while "user1" not in status.get("last_results", {}) and time.monotonic() < deadline:
+            time.sleep(0.01)
+            status = json.loads((tmp_path / "status.json").read_text())
+        assert status["last_results"]["user1"]["status"] == STATUS_BOOKED
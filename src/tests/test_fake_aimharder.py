@@ -0,0 +1,276 @@
+from datetime import datetime, timedelta
+
+import pytest
+from freezegun import freeze_time
+
+import main
+from batch import BatchOperation, STATUS_REPLACED
+from booking_store import BookingStore
+from benchmarks.fake_aimharder import FakeAimHarder, MAX_WRONG_ATTEMPTS
+from client import AimHarderClient
+from constants import set_base_url
+from session_cache import SessionCache
+from clock import ClockSync
+from exceptions import BookingFailed, IncorrectCredentials, TooEarly, TooManyWrongAttempts, MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY
+
+CLASS_DAY = datetime(2022, 3, 4, 17, 0)
+
+
+@pytest.fixture
+def server():
+    fake = FakeAimHarder(hours_in_advance=20, now=lambda: datetime(2022, 3, 3, 21, 0))
+    fake.add_user("user@mail.com", "password")
+    with fake:
+        set_base_url(fake.url)
+        yield fake
+    set_base_url(None)
+
+
+class TestFakeAimHarder:
+    def test_incorrect_credentials(self, server):
+        with pytest.raises(IncorrectCredentials):
+            AimHarderClient("user@mail.com", "wrong", 1, "box")
+
+    def test_too_many_wrong_attempts(self, server):
+        for _ in range(MAX_WRONG_ATTEMPTS):
+            with pytest.raises(IncorrectCredentials):
+                AimHarderClient("user@mail.com", "wrong", 1, "box")
+        with pytest.raises(TooManyWrongAttempts):
+            AimHarderClient("user@mail.com", "password", 1, "box")
+
+    def test_book(self, server):
+        class_id = server.add_class("box", CLASS_DAY, "1700", "WOD", limit=1)
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        classes = client.get_classes(CLASS_DAY)
+        assert [c["id"] for c in classes] == [class_id]
+        assert classes[0]["bookState"] is None
+
+        assert client.book_class(CLASS_DAY, classes[0])
+        assert client.get_classes(CLASS_DAY)[0]["bookState"] == 0
+
+    def test_get_schedule(self, server):
+        class_id = server.add_class("box", CLASS_DAY, "1700", "WOD", limit=1)
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        schedule = client.get_schedule(CLASS_DAY)
+        assert schedule.find("1700", "WOD").id == class_id
+        assert not schedule.booked
+
+        client.book_class(CLASS_DAY, schedule.find("1700", "WOD").raw)
+        assert client.get_schedule(CLASS_DAY).booked
+
+    def test_expired_session_is_revalidated(self, server):
+        server.add_class("box", CLASS_DAY, "1700", "WOD")
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        server.sessions.clear()
+
+        client.revalidate()
+        assert len(client.get_classes(CLASS_DAY)) == 1
+
+    def test_full_class(self, server):
+        server.add_user("other@mail.com", "password")
+        class_id = server.add_class("box", CLASS_DAY, "1700", "WOD", limit=1)
+        AimHarderClient("other@mail.com", "password", 1, "box").book_class(CLASS_DAY, {"id": class_id})
+
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        with pytest.raises(BookingFailed, match=MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY):
+            client.book_class(CLASS_DAY, {"id": class_id})
+
+    def test_cancel(self, server):
+        class_id = server.add_class("box", CLASS_DAY, "1700", "WOD")
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        client.book_class(CLASS_DAY, {"id": class_id})
+        assert client.cancel_booked_class({"id": class_id})
+        assert server.find_class("box", class_id).booked == []
+
+    def test_run_batch(self, server):
+        server.hours_in_advance = 72
+        saturday = CLASS_DAY + timedelta(days=1)
+        booked = [server.add_class("box", day, "1700", "WOD") for day in (CLASS_DAY, saturday)]
+        replacements = [server.add_class("box", day, "1800", "WOD", limit=limit) for day, limit in ((CLASS_DAY, 1), (saturday, 0))]
+        for class_id in booked:
+            server.find_class("box", class_id).booked.append("user@mail.com")
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+
+        results = client.run_batch([BatchOperation(day, [{"id": old}], {"id": new}) for day, old, new in zip((CLASS_DAY, saturday), booked, replacements)])
+
+        #The full replacement of Saturday keeps its booking
+        assert [result.status for result in results] == [STATUS_REPLACED, "failed"]
+        assert server.find_class("box", booked[0]).booked == []
+        assert server.find_class("box", replacements[0]).booked == ["user@mail.com"]
+        assert server.find_class("box", booked[1]).booked == ["user@mail.com"]
+
+    def test_too_early(self, server):
+        class_id = server.add_class("box", CLASS_DAY + timedelta(days=1), "1700", "WOD")
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        with pytest.raises(TooEarly):
+            client.book_class(CLASS_DAY + timedelta(days=1), {"id": class_id})
+
+
+class TestMainAgainstFakeServer:
+    @freeze_time("2022-03-03 21:00:00", tick=True)
+    def test_main_books_the_goal(self, server):
+        class_id = server.add_class("box", CLASS_DAY, "1700", "WOD")
+        server.add_class("box", CLASS_DAY, "1800", "WOD")
+        configuration = {
+            "email": "user@mail.com",
+            "password": "password",
+            "box-name": "box",
+            "box-id": 1,
+            "booking-goals": ["friday,1700,WOD,20"],
+            "exceptions": None,
+        }
+
+        result = main.main("user1", configuration)
+
+        assert result.booked
+        assert server.find_class("box", class_id).booked == ["user@mail.com"]
+
+    @freeze_time("2022-03-03 21:00:00", tick=True)
+    def test_catch_up_books_every_open_day(self, server):
+        #The Friday window has just opened and the Thursday one opened the day before, when the run was missed.
+        #Thursday is already booked by hand, so only Friday is booked.
+        thursday = server.add_class("box", CLASS_DAY - timedelta(days=1), "2130", "WOD")
+        friday = server.add_class("box", CLASS_DAY, "1700", "WOD")
+        server.add_class("box", CLASS_DAY + timedelta(days=1), "1700", "WOD")
+        server.find_class("box", thursday).booked.append("user@mail.com")
+        configuration = {
+            "email": "user@mail.com",
+            "password": "password",
+            "box-name": "box",
+            "box-id": 1,
+            "booking-goals": ["thursday,2130,WOD,24", "friday,1700,WOD,20", "saturday,1700,WOD,20"],
+            "exceptions": None,
+        }
+
+        results = main.catch_up_user("user1", configuration)
+
+        assert [(result.class_day, result.status) for result in results] == [
+            (datetime(2022, 3, 3, 21, 30), "already-booked"),
+            (datetime(2022, 3, 4, 17, 0), "booked"),
+        ]
+        assert server.find_class("box", friday).booked == ["user@mail.com"]
+
+    @freeze_time("2022-03-03 21:00:00", tick=True)
+    def test_catch_up_logs_in_again_once(self, server, tmp_path, monkeypatch):
+        #The cached session expired, and several days are fetched by the same client
+        server.hours_in_advance = 72
+        monkeypatch.setattr(main, "session_cache", SessionCache(str(tmp_path)))
+        for day in range(3):
+            server.add_class("box", CLASS_DAY + timedelta(days=day), "1700", "WOD")
+        AimHarderClient("user@mail.com", "password", 1, "box", session_cache=main.session_cache)
+        server.sessions.clear()
+        configuration = {
+            "email": "user@mail.com",
+            "password": "password",
+            "box-name": "box",
+            "box-id": 1,
+            "booking-goals": ["friday,1700,WOD,72", "saturday,1700,WOD,72", "sunday,1700,WOD,72"],
+            "exceptions": None,
+        }
+
+        results = main.catch_up_user("user1", configuration)
+
+        assert [result.status for result in results] == ["booked"] * 3
+        assert len(server.sessions) == 1
+
+    @freeze_time("2022-03-03 21:00:00", tick=True)
+    def test_apply_exceptions_logs_in_again_once(self, server, tmp_path, monkeypatch):
+        server.hours_in_advance = 72
+        monkeypatch.setattr(main, "session_cache", SessionCache(str(tmp_path)))
+        for day in range(3):
+            class_id = server.add_class("box", CLASS_DAY + timedelta(days=day), "1700", "WOD")
+            server.find_class("box", class_id).booked.append("user@mail.com")
+        AimHarderClient("user@mail.com", "password", 1, "box", session_cache=main.session_cache)
+        server.sessions.clear()
+        configuration = {
+            "email": "user@mail.com",
+            "password": "password",
+            "box-name": "box",
+            "box-id": 1,
+            "booking-goals": ["friday,1700,WOD,20"],
+            "exceptions": [(CLASS_DAY + timedelta(days=day)).strftime("%Y-%m-%d") for day in range(3)],
+        }
+
+        results = main.apply_exceptions("user1", configuration)
+
+        assert [result.status for result in results] == ["cancelled"] * 3
+        assert len(server.sessions) == 1
+
+    def test_clock_sync_waits_for_the_window_opening(self, monkeypatch):
+        #Launched by cron when the window has not opened yet by the AimHarder clock, which is 0.2 s behind the opening
+        local = datetime.today()
+        opening = (local + timedelta(minutes=2)).replace(second=0, microsecond=0)
+        clock_sync = ClockSync()
+        clock_sync.offset = (opening - local).total_seconds() - 0.2
+        monkeypatch.setattr(main, "clock_sync", clock_sync)
+        class_datetime = opening + timedelta(hours=48)
+        with FakeAimHarder(hours_in_advance=48, now=clock_sync.now) as fake:
+            fake.add_user("user@mail.com", "password")
+            class_id = fake.add_class("box", class_datetime, class_datetime.strftime("%H%M"), "WOD")
+            set_base_url(fake.url)
+            try:
+                result = main.main("user1", {
+                    "email": "user@mail.com",
+                    "password": "password",
+                    "box-name": "box",
+                    "box-id": 1,
+                    "booking-goals": [f"{class_datetime.strftime('%A').lower()},{class_datetime.strftime('%H%M')},WOD,48"],
+                    "exceptions": None,
+                })
+            finally:
+                set_base_url(None)
+            assert result.booked
+            assert result.confirmed_at >= opening
+            assert fake.find_class("box", class_id).booked == ["user@mail.com"]
+
+    @freeze_time("2022-03-03 21:00:00", tick=True)
+    def test_booking_store_skips_the_booked_day(self, server, tmp_path, monkeypatch):
+        monkeypatch.setattr(main, "booking_store", BookingStore(str(tmp_path / "bookings.db")))
+        class_id = server.add_class("box", CLASS_DAY, "1700", "WOD")
+        configuration = {
+            "email": "user@mail.com",
+            "password": "password",
+            "box-name": "box",
+            "box-id": 1,
+            "booking-goals": ["friday,1700,WOD,20"],
+            "exceptions": None,
+        }
+
+        assert main.main("user1", configuration).booked
+        requests = server.requests
+
+        #The next run knows that the day is booked without logging in nor fetching the classes
+        assert main.main("user1", configuration).status == "already-booked"
+        assert server.requests == requests
+        assert main.booking_store.history("user1")[0]["class_id"] == class_id
+
+    @freeze_time("2022-03-03 21:00:00", tick=True)
+    def test_apply_exceptions(self, server, tmp_path, monkeypatch):
+        server.hours_in_advance = 72
+        monkeypatch.setattr(main, "booking_store", BookingStore(str(tmp_path / "bookings.db")))
+        friday = server.add_class("box", CLASS_DAY, "1700", "WOD")
+        friday_late = server.add_class("box", CLASS_DAY, "1900", "WOD")
+        saturday = server.add_class("box", CLASS_DAY + timedelta(days=1), "1000", "WOD")
+        for class_id in (friday, saturday):
+            server.find_class("box", class_id).booked.append("user@mail.com")
+        configuration = {
+            "email": "user@mail.com",
+            "password": "password",
+            "box-name": "box",
+            "box-id": 1,
+            "booking-goals": ["friday,1700,WOD,20"],
+            "exceptions": ["2022-03-04,1900,WOD", "2022-03-05"],
+        }
+
+        results = main.apply_exceptions("user1", configuration)
+
+        assert [(result.class_day.date(), result.status) for result in results] == [
+            (CLASS_DAY.date(), "booked"),
+            ((CLASS_DAY + timedelta(days=1)).date(), "cancelled"),
+        ]
+        assert server.find_class("box", friday).booked == []
+        assert server.find_class("box", friday_late).booked == ["user@mail.com"]
+        assert server.find_class("box", saturday).booked == []
+        #The replaced day stays decided and the cancelled one is a day without training for the next runs
+        assert main.booking_store.day_status("user1", CLASS_DAY) == "booked"
+        assert main.main("user1", configuration).status == "already-booked"
@@ -0,0 +1,55 @@
+import logging
+import time
+
+import pytest
+
+from log_pipeline import LogPipeline, parse_levels
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(f"{record.name}: {record.getMessage()}")
+
+
+@pytest.fixture
+def pipeline():
+    handler = ListHandler()
+    log_pipeline = LogPipeline([handler], race_mode=True).start()
+    yield log_pipeline, handler
+    log_pipeline.stop()
+
+
+def test_parse_levels():
+    assert parse_levels("urllib3=INFO, aimharder-bot=debug") == {"urllib3": logging.INFO, "aimharder-bot": logging.DEBUG}
+    assert parse_levels(None) == {}
+    with pytest.raises(ValueError):
+        parse_levels("urllib3=LOUD")
+
+
+def test_records_are_written_by_the_listener(pipeline):
+    log_pipeline, handler = pipeline
+    logging.getLogger("aimharder-bot").info("Retrieved %d classes", 3)
+    log_pipeline.stop()
+    assert handler.messages == ["aimharder-bot: Retrieved 3 classes"]
+
+
+def wait_for_messages(handler, count, timeout=2):
+    deadline = time.monotonic() + timeout
+    while len(handler.messages) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return handler.messages
+
+
+def test_race_holds_the_http_debug_records(pipeline):
+    log_pipeline, handler = pipeline
+    with log_pipeline.race():
+        logging.getLogger("urllib3.connectionpool").debug("POST /api/book")
+        logging.getLogger("urllib3.connectionpool").warning("Retrying")
+        logging.getLogger("aimharder-bot").info("Booking completed successfully.")
+        assert wait_for_messages(handler, 2) == ["urllib3.connectionpool: Retrying", "aimharder-bot: Booking completed successfully."]
+    log_pipeline.stop()
+    assert handler.messages[-1] == "urllib3.connectionpool: POST /api/book"
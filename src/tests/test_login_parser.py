@@ -0,0 +1,43 @@
+from contextlib import nullcontext as does_not_raise
+
+import pytest
+
+from client import check_login_response
+from constants import ERROR_TAG_ID
+from exceptions import IncorrectCredentials, TooManyWrongAttempts
+from login_parser import find_element_text
+
+
+class TestFindElementText:
+    @pytest.mark.parametrize(
+        "content, expected",
+        (
+            (b"<html><body><form></form></body></html>", None),
+            (f'<div><span id="{ERROR_TAG_ID}"></span></div>'.encode(), ""),
+            (f'<div><span class="error" id="{ERROR_TAG_ID}">Usuario <b>incorrecto</b></span>after</div>'.encode(), "Usuario incorrecto"),
+            (f'<div id="{ERROR_TAG_ID}"><p>Contrase&ntilde;a<br>mal</p></div><p>after</p>'.encode(), "Contrase\u00f1amal"),
+            (f'<p>{ERROR_TAG_ID}</p><span id="{ERROR_TAG_ID}">incorrecto</span>'.encode(), "incorrecto"),
+            (f'<input id="{ERROR_TAG_ID}"/><p>incorrecto</p>'.encode(), ""),
+            (f'<p data-target="{ERROR_TAG_ID}">incorrecto</p>', None),
+        ),
+    )
+    def test_find_element_text(self, content, expected):
+        assert find_element_text(content, ERROR_TAG_ID) == expected
+
+    def test_long_page_is_read_in_chunks(self):
+        content = "<html>" + "<p>filler</p>" * 1000 + f'<span id="{ERROR_TAG_ID}">' + "x" * 3000 + "</span></html>"
+        assert find_element_text(content, ERROR_TAG_ID, chunk_size=64) == "x" * 3000
+
+
+class TestCheckLoginResponse:
+    @pytest.mark.parametrize(
+        "error, expectation",
+        (
+            ("", does_not_raise()),
+            (f"Has fallado {TooManyWrongAttempts.key_phrase}", pytest.raises(TooManyWrongAttempts)),
+            (f"Usuario o contraseña {IncorrectCredentials.key_phrase}", pytest.raises(IncorrectCredentials)),
+        ),
+    )
+    def test_check_login_response(self, error, expectation):
+        with expectation:
+            check_login_response(f'<html><span id="{ERROR_TAG_ID}">{error}</span></html>'.encode())
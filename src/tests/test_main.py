@@ -1,4 +1,5 @@
 import datetime
+import json
 from http import HTTPStatus
 from unittest.mock import patch, Mock
 
@@ -6,11 +7,13 @@ import pytest
 
 from contextlib import nullcontext as does_not_raise
 
-from exceptions import NoBookingGoal
+from exceptions import NoBookingGoal, BoxClosed, NoTrainingDay
 
 from main import get_class_to_book
 
-from main import get_booking_goal_time
+from main import get_booking_goal
+
+from main import closed_window_result
 
 from main import main
 
@@ -21,56 +24,172 @@ from constants import LOGIN_ENDPOINT
 from constants import book_endpoint
 
 
-class TestGetBookingGoalTime:
+class TestGetBookingGoal:
     @pytest.mark.parametrize(
-        "day, booking_goals, expected_time, expectation",
+        "today, booking_goals, expected_goal, expectation",
         (
             (
-                datetime.datetime(2022, 2, 28),
-                {"0": {"time": "1700", "name": "foo"}},
-                ("1700", "foo"),
+                datetime.datetime(2025, 1, 26, 8, 59, 59, 999999),
+                ["tuesday,1000,WOD,49"],
+                ("1000", "WOD", False, datetime.datetime(2025, 1, 26, 9, 0)),
+                does_not_raise(),
+            ),
+            (
+                datetime.datetime(2025, 1, 26, 9, 0, 0, 0),
+                ["tuesday,1000,WOD,49"],
+                ("1000", "WOD", True, datetime.datetime(2025, 1, 26, 9, 0)),
                 does_not_raise(),
             ),
-            (datetime.datetime(2022, 2, 28), {}, None, pytest.raises(NoBookingGoal)),
+            (
+                datetime.datetime(2025, 1, 26, 9, 0, 1, 0),
+                ["tuesday,1000,WOD,49"],
+                ("1000", "WOD", True, datetime.datetime(2025, 1, 26, 9, 0)),
+                does_not_raise(),
+            ),
+            (
+                #Several goals on the same day: the one whose window opened most recently
+                datetime.datetime(2025, 1, 26, 18, 0),
+                ["tuesday,1000,WOD,49", "tuesday,1800,OPEN,48", "tuesday,1900,WOD,48"],
+                ("1800", "OPEN", True, datetime.datetime(2025, 1, 26, 18, 0)),
+                does_not_raise(),
+            ),
+            (
+                datetime.datetime(2025, 1, 26, 8, 0),
+                ["tuesday,1900,WOD,48", "tuesday,1800,OPEN,48"],
+                ("1800", "OPEN", False, datetime.datetime(2025, 1, 26, 18, 0)),
+                does_not_raise(),
+            ),
+            (
+                datetime.datetime(2025, 1, 26, 9, 0),
+                ["monday,1000,WOD,49"],
+                None,
+                pytest.raises(NoTrainingDay),
+            ),
         ),
     )
-    def test_get_booking_goal_time(
-        self, day, booking_goals, expected_time, expectation
-    ):
+    def test_get_booking_goal(self, today, booking_goals, expected_goal, expectation):
         with expectation:
-            assert get_booking_goal_time(day, booking_goals) == expected_time
+            _, class_time, class_name, success, slot_open = get_booking_goal(booking_goals, today)
+            assert (class_time, class_name, success, slot_open) == expected_goal
+
+    def test_get_booking_goal_default_hours(self):
+        today = datetime.datetime(2025, 1, 26, 9, 0)
+        class_day, _, _, success, _ = get_booking_goal(["tuesday,1000,WOD"], today, 49)
+        assert success
+        assert class_day.date() == datetime.date(2025, 1, 28)
+
+
+class TestClosedWindowResult:
+    @pytest.mark.parametrize(
+        "today, configuration, expected_status",
+        (
+            (datetime.datetime(2025, 1, 26, 8, 59), {"booking-goals": ["tuesday,1000,WOD,49"]}, "not-available"),
+            (datetime.datetime(2025, 1, 26, 9, 0), {"booking-goals": ["tuesday,1000,WOD,49"]}, None),
+            (datetime.datetime(2025, 1, 26, 9, 0), {"booking-goals": ["monday,1000,WOD,49"]}, "no-training-day"),
+            (datetime.datetime(2025, 1, 26, 9, 0), {"booking-goals": ["tuesday,1000,WOD"], "hours-in-advance": 49}, None),
+            #Wrong configurations are left to the booking, which reports them
+            (datetime.datetime(2025, 1, 26, 9, 0), {"booking-goals": ["someday,1000,WOD,49"]}, None),
+            (datetime.datetime(2025, 1, 26, 9, 0), {}, None),
+        ),
+    )
+    def test_closed_window_result(self, today, configuration, expected_status):
+        result = closed_window_result("user1", configuration, today)
+        assert (result.status if result is not None else None) == expected_status
 
 
 class TestGetClassToBook:
     @pytest.mark.parametrize(
-        "classes, target_time, class_name, expectation",
+        "classes, target_time, class_name, expected_id, expectation",
         (
             (
                 [{"id": 123, "timeid": "1700_60", "className": "foo"}],
                 "1700",
                 "foo",
+                123,
                 does_not_raise(),
             ),
             (
                 [
                     {"id": 123, "timeid": "1700_60", "className": "foo"},
-                    {"id": 123, "timeid": "1700_60", "className": "foo"},
+                    {"id": 124, "timeid": "1700_60", "className": "foo"},
                 ],
                 "1700",
                 "foo",
+                123,
                 does_not_raise(),
             ),
             (
                 [{"id": 123, "timeid": "1100_60", "className": "foo"}],
                 "1700",
                 "foo",
+                None,
+                pytest.raises(NoBookingGoal),
+            ),
+            (
+                [],
+                "1700",
+                "foo",
+                None,
+                pytest.raises(BoxClosed),
+            ),
+            (
+                #The time is matched exactly, not as a substring of the timeid
+                [
+                    {"id": 123, "timeid": "09001000", "className": "foo"},
+                    {"id": 124, "timeid": "10001100", "className": "foo"},
+                ],
+                "1000",
+                "foo",
+                124,
+                does_not_raise(),
+            ),
+            (
+                #OPEN classes are skipped unless the goal asks for them
+                [
+                    {"id": 123, "timeid": "1700_60", "className": "OPEN BOX"},
+                    {"id": 124, "timeid": "1700_60", "className": "WOD"},
+                ],
+                "1700",
+                "wod",
+                124,
+                does_not_raise(),
+            ),
+            (
+                [
+                    {"id": 123, "timeid": "1700_60", "className": "OPEN BOX"},
+                    {"id": 124, "timeid": "1700_60", "className": "WOD"},
+                ],
+                "1700",
+                "OPEN",
+                123,
+                does_not_raise(),
+            ),
+            (
+                #Fallback class names are tried in order
+                [
+                    {"id": 123, "timeid": "1700_60", "className": "Halterofilia"},
+                    {"id": 124, "timeid": "1700_60", "className": "Gimnásticos"},
+                ],
+                "1700",
+                "WOD|Gimnásticos",
+                124,
+                does_not_raise(),
+            ),
+            (
+                [
+                    {"id": 123, "timeid": "1700_60", "className": "Halterofilia"},
+                    {"id": 124, "timeid": "1700_60", "className": "Gimnásticos"},
+                ],
+                "1700",
+                "WOD",
+                None,
                 pytest.raises(NoBookingGoal),
             ),
         ),
     )
-    def test_get_class_to_book(self, classes, target_time, class_name, expectation):
+    def test_get_class_to_book(self, classes, target_time, class_name, expected_id, expectation):
         with expectation:
-            assert get_class_to_book(classes, target_time, class_name) == 123
+            assert get_class_to_book(classes, target_time, class_name)["id"] == expected_id
 
 
 class TestMain:
@@ -86,14 +205,19 @@ class TestMain:
             "requests.Session.get"
         ) as m_get:
             m_post.side_effect = self.mock_request_post
-            m_get.return_value.json.return_value = {
+            m_get.return_value.content = json.dumps({
                 "bookings": [{"id": 123, "timeid": "1700_60", "className": "Provenza"}]
-            }
-            main(
-                email="foo",
-                password="bar",
-                booking_goals={"0": {"time": "1700", "name": "Provenza"}},
-                box_name="foo",
-                box_id=1,
-                hours_in_advance=3,
+            }).encode()
+            result = main(
+                "user1",
+                {
+                    "email": "foo",
+                    "password": "bar",
+                    "booking-goals": ["friday,1700,Provenza,20"],
+                    "box-name": "foo",
+                    "box-id": 1,
+                    "exceptions": None,
+                },
             )
+            assert result.booked
+            assert result.slot_open == datetime.datetime(2022, 3, 3, 21, 0)
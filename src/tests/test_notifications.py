@@ -0,0 +1,92 @@
+import time
+
+from notifications import NotificationDispatcher, MemoryTransport, MAX_MESSAGE_LENGTH
+
+
+def dispatcher(**kwargs):
+    kwargs.setdefault("batch_delay", 0.05)
+    kwargs.setdefault("chat_interval", 0)
+    kwargs.setdefault("bot_interval", 0)
+    return NotificationDispatcher(transport_factory=MemoryTransport, **kwargs)
+
+
+class TestNotificationDispatcher:
+    def test_messages_of_the_same_chat_are_batched(self):
+        notifier = dispatcher()
+        notifier.notify("token", "chat1", "first")
+        notifier.notify("token", "chat1", "second")
+        notifier.notify("token", "chat2", "other")
+        assert notifier.flush(5)
+
+        sent = notifier._transports["token"].sent
+        assert sorted(sent) == [("chat1", "first\n\nsecond", None), ("chat2", "other", None)]
+        assert notifier.sent == 3
+        notifier.close()
+
+    def test_one_transport_per_token(self):
+        notifier = dispatcher()
+        bots = [notifier.bot("token") for _ in range(3)] + [notifier.bot("other")]
+        for index, bot in enumerate(bots):
+            bot.send_message("chat", f"message {index}")
+        notifier.close()
+        assert sorted(notifier._transports) == ["other", "token"]
+
+    def test_notify_does_not_block(self):
+        class SlowTransport(MemoryTransport):
+            def send(self, chat_id, text, parse_mode=None):
+                time.sleep(0.2)
+                super().send(chat_id, text, parse_mode)
+
+        notifier = NotificationDispatcher(transport_factory=SlowTransport, batch_delay=0)
+        start = time.monotonic()
+        for index in range(5):
+            notifier.notify("token", f"chat{index}", "booked")
+        assert time.monotonic() - start < 0.1
+        notifier.close()
+        assert notifier.sent == 5
+
+    def test_chat_rate_limit(self):
+        notifier = dispatcher(batch_delay=0, chat_interval=0.2)
+        times = []
+
+        class TimedTransport(MemoryTransport):
+            def send(self, chat_id, text, parse_mode=None):
+                times.append(time.monotonic())
+
+        notifier.transport_factory = TimedTransport
+        notifier.notify("token", "chat", "first")
+        notifier.flush(5)
+        notifier.notify("token", "chat", "second")
+        notifier.flush(5)
+        assert times[1] - times[0] >= 0.19
+        notifier.close()
+
+    def test_long_batches_are_split(self):
+        notifier = dispatcher()
+        message = "x" * (MAX_MESSAGE_LENGTH // 2 - 10)
+        for _ in range(3):
+            notifier.notify("token", "chat", message)
+        notifier.close()
+        sent = notifier._transports["token"].sent
+        assert len(sent) == 2
+        assert all(len(text) <= MAX_MESSAGE_LENGTH for _, text, _ in sent)
+
+    def test_close_flushes_pending_messages(self):
+        notifier = dispatcher(batch_delay=60)
+        notifier.notify("token", "chat", "pending")
+        notifier.close(5)
+        assert notifier._transports["token"].sent == [("chat", "pending", None)]
+
+    def test_failed_messages_do_not_stop_the_dispatcher(self):
+        class FailingTransport(MemoryTransport):
+            def send(self, chat_id, text, parse_mode=None):
+                if chat_id == "broken":
+                    raise ConnectionError("telegram down")
+                super().send(chat_id, text, parse_mode)
+
+        notifier = NotificationDispatcher(transport_factory=FailingTransport, batch_delay=0, chat_interval=0, bot_interval=0)
+        notifier.notify("token", "broken", "lost")
+        notifier.notify("token", "chat", "delivered")
+        notifier.close(5)
+        assert notifier.failed == 1
+        assert notifier._transports["token"].sent == [("chat", "delivered", None)]
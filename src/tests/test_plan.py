@@ -0,0 +1,106 @@
+import datetime
+from contextlib import nullcontext as does_not_raise
+
+import pytest
+
+from exceptions import InvalidBookingGoal
+from plan import BookingGoal, BookingPlan, parse_goal, compile_goals, open_windows
+
+
+class TestParseGoal:
+    @pytest.mark.parametrize(
+        "goal, default_hours, expected, expectation",
+        (
+            ("monday,1400,WOD,48", None, BookingGoal(0, "1400", "WOD", 48), does_not_raise()),
+            ("Friday, 0930, OPEN", 72, BookingGoal(4, "0930", "OPEN", 72), does_not_raise()),
+            #The hours of the goal have priority over the hours of the user
+            ("sunday,0930,WOD|OPEN,24", 72, BookingGoal(6, "0930", "WOD|OPEN", 24), does_not_raise()),
+            ("monday,1400,WOD", None, None, pytest.raises(InvalidBookingGoal)),
+            ("funday,1400,WOD,48", None, None, pytest.raises(InvalidBookingGoal)),
+            ("monday,2500,WOD,48", None, None, pytest.raises(InvalidBookingGoal)),
+            ("monday,14:00,WOD,48", None, None, pytest.raises(InvalidBookingGoal)),
+            ("monday,1400", None, None, pytest.raises(InvalidBookingGoal)),
+        ),
+    )
+    def test_parse_goal(self, goal, default_hours, expected, expectation):
+        with expectation:
+            assert parse_goal(goal, default_hours) == expected
+
+    def test_compile_goals_is_cached(self):
+        goals = ["monday,1400,WOD,48"]
+        assert compile_goals(goals) is compile_goals(list(goals))
+
+
+class TestBookingPlan:
+    @pytest.fixture
+    def plan(self):
+        return BookingPlan.from_users(
+            [
+                ("user1", {"booking-goals": ["tuesday,1000,WOD,49", "monday,0730,WOD"], "hours-in-advance": 72}),
+                ("user2", {"booking-goals": ["tuesday,1000,OPEN,49"]}),
+            ]
+        )
+
+    def test_next_opening(self, plan):
+        #Sunday 2025-01-26 08:00
+        opening, goals = plan.next_opening(datetime.datetime(2025, 1, 26, 8, 0))
+        assert opening == datetime.datetime(2025, 1, 26, 9, 0)
+        assert [goal.user for goal in goals] == ["user1", "user2"]
+
+    def test_next_opening_wraps_the_week(self, plan):
+        #Monday 07:30 class with 72 hours opens on Friday 07:30 of the previous week
+        opening, goals = plan.next_opening(datetime.datetime(2025, 1, 26, 9, 0))
+        assert opening == datetime.datetime(2025, 1, 31, 7, 30)
+        assert goals == [BookingGoal(0, "0730", "WOD", 72, "user1")]
+
+    def test_openings(self, plan):
+        openings = list(plan.openings(datetime.datetime(2025, 1, 26), datetime.datetime(2025, 2, 9)))
+        assert [opening for opening, _ in openings] == [
+            datetime.datetime(2025, 1, 26, 9, 0),
+            datetime.datetime(2025, 1, 31, 7, 30),
+            datetime.datetime(2025, 2, 2, 9, 0),
+            datetime.datetime(2025, 2, 7, 7, 30),
+        ]
+
+    def test_empty_plan(self):
+        assert BookingPlan([]).next_opening(datetime.datetime(2025, 1, 26)) is None
+
+    def test_cron_entries(self, plan):
+        assert plan.cron_entries() == ["30 7 * * 5", "0 9 * * 0"]
+
+
+class TestOpenWindows:
+    @pytest.mark.parametrize(
+        "now, goals, expected",
+        (
+            (
+                #Sunday 2025-01-26 09:00: the Tuesday window has just opened and the Monday one opened yesterday
+                datetime.datetime(2025, 1, 26, 9, 0),
+                ["monday,1000,WOD,49", "tuesday,1000,WOD,49", "wednesday,1000,WOD,49"],
+                [(datetime.datetime(2025, 1, 27, 10, 0), "WOD"), (datetime.datetime(2025, 1, 28, 10, 0), "WOD")],
+            ),
+            (
+                #The class of today has already started
+                datetime.datetime(2025, 1, 26, 10, 30),
+                ["sunday,1000,WOD,48", "sunday,1900,OPEN,48"],
+                [(datetime.datetime(2025, 1, 26, 19, 0), "OPEN")],
+            ),
+            (
+                #Several goals on the same day: the one whose window opened most recently
+                datetime.datetime(2025, 1, 26, 18, 0),
+                ["tuesday,1000,WOD,49", "tuesday,1800,OPEN,48", "tuesday,1900,WOD,48"],
+                [(datetime.datetime(2025, 1, 28, 18, 0), "OPEN")],
+            ),
+            (
+                #Windows longer than a week open the class of several weeks
+                datetime.datetime(2025, 1, 26, 9, 0),
+                ["monday,1000,WOD,200"],
+                [(datetime.datetime(2025, 1, 27, 10, 0), "WOD"), (datetime.datetime(2025, 2, 3, 10, 0), "WOD")],
+            ),
+            (datetime.datetime(2025, 1, 26, 9, 0), ["friday,1000,WOD,48"], []),
+        ),
+    )
+    def test_open_windows(self, now, goals, expected):
+        windows = open_windows(compile_goals(goals), now)
+        assert [(class_datetime, goal.class_name) for class_datetime, goal in windows] == expected
+
@@ -0,0 +1,194 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+import requests
+
+import main
+import resilience
+from benchmarks.fake_aimharder import FakeAimHarder
+from client import AimHarderClient
+from constants import set_base_url
+from exceptions import CircuitOpen
+from runner import BookingResult
+from schedule import Schedule
+from resilience import CircuitBreaker, LatencyHistory, endpoint_key, is_idempotent, MIN_READ_TIMEOUT, DEFAULT_READ_TIMEOUT
+
+CLASS_DAY = datetime(2022, 3, 4, 17, 0)
+
+
+@pytest.fixture
+def server():
+    resilience.configure_resilience()
+    fake = FakeAimHarder(hours_in_advance=20, now=lambda: datetime(2022, 3, 3, 21, 0))
+    fake.add_user("user@mail.com", "password")
+    fake.add_class("box", CLASS_DAY, "1700", "WOD")
+    with fake:
+        set_base_url(fake.url)
+        yield fake
+    set_base_url(None)
+    resilience.configure_resilience()
+
+
+def test_endpoint_key():
+    assert endpoint_key("get", "https://box.aimharder.com/api/bookings?day=20220304") == "GET api/bookings"
+    assert endpoint_key("POST", "http://127.0.0.1:8000/box/api/book") == "POST api/book"
+    assert endpoint_key("POST", "https://aimharder.com/login") == "POST login"
+
+
+def test_timeouts_adapt_to_the_latency_history():
+    history = LatencyHistory()
+    assert history.timeout("GET api/bookings")[1] == DEFAULT_READ_TIMEOUT
+    for latency in (0.1, 0.2, 0.3, 0.4, 0.5):
+        history.record("GET api/bookings", latency, connect=0.2)
+    assert history.timeout("GET api/bookings") == pytest.approx((0.8, 2.0))
+    for _ in range(5):
+        history.record("POST api/book", 0.01)
+    assert history.timeout("POST api/book")[1] == MIN_READ_TIMEOUT
+    #The bookings keep the default read timeout, whatever their history
+    assert history.timeout("POST api/book", idempotent=False)[1] == DEFAULT_READ_TIMEOUT
+
+
+def test_is_idempotent():
+    assert is_idempotent("GET", "https://box.aimharder.com/api/bookings")
+    assert is_idempotent("POST", "https://aimharder.com/login")
+    assert not is_idempotent("POST", "https://box.aimharder.com/api/book")
+    assert not is_idempotent("POST", "http://127.0.0.1:8000/box/api/cancelBooking")
+
+
+class FakeSession:
+    def __init__(self, cookies: dict):
+        self.cookies = dict(cookies)
+
+    def clone(self):
+        return FakeSession(self.cookies)
+
+
+def test_hedged_attempts_do_not_share_the_session(monkeypatch):
+    monkeypatch.setattr(resilience, "DEFAULT_HEDGE_DELAY", 0.05)
+    resilience.configure_resilience(hedge=True)
+    session = FakeSession({"auth": "token"})
+    used = []
+    slow_done = threading.Event()
+
+    def request(attempt_session):
+        used.append(attempt_session)
+        if len(used) == 1:
+            time.sleep(0.3)
+            attempt_session.cookies["slow"] = "1"
+            slow_done.set()
+            return "slow"
+        attempt_session.cookies["fast"] = "1"
+        return "fast"
+
+    try:
+        assert resilience.hedged(request, session, "GET api/bookings") == "fast"
+    finally:
+        resilience.configure_resilience()
+    assert all(attempt_session is not session for attempt_session in used)
+    #Only the cookies of the answer used reach the session, also once the losing attempt ends
+    assert slow_done.wait(5)
+    assert session.cookies == {"auth": "token", "fast": "1"}
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures_and_tries_again(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+        breaker.failure("box")
+        breaker.success("box")
+        breaker.failure("box")
+        breaker.before("box")
+        breaker.failure("box")
+        with pytest.raises(CircuitOpen):
+            breaker.before("box")
+
+        now[0] = 10
+        #Only one trial request is let through while the circuit is half open
+        breaker.before("box")
+        with pytest.raises(CircuitOpen):
+            breaker.before("box")
+        breaker.failure("box")
+        with pytest.raises(CircuitOpen):
+            breaker.before("box")
+
+        now[0] = 20
+        breaker.before("box")
+        breaker.success("box")
+        assert not breaker.is_open("box")
+
+
+class TestAgainstFakeServer:
+    def test_hanging_request_times_out(self, server):
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        for _ in range(5):
+            client.get_classes(CLASS_DAY)
+        #The usual latency is a few milliseconds, so the read timeout is the minimum one
+        server.stall_next(1, MIN_READ_TIMEOUT + 1)
+        with pytest.raises(requests.Timeout):
+            client.get_classes(CLASS_DAY)
+
+    def test_timed_out_booking_is_checked_in_the_listing(self, server, monkeypatch):
+        #AimHarder books the class but answers after the read timeout of the client
+        monkeypatch.setattr(resilience, "DEFAULT_READ_TIMEOUT", 0.2)
+        monkeypatch.setattr(main, "burst_window", 0)
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        target_class = client.get_classes(CLASS_DAY)[0]
+        server.answer_late_next(1, 1)
+        result = BookingResult("user")
+
+        booked_class, booked = main.send_booking(client, CLASS_DAY, Schedule([target_class]), target_class, "1700", "WOD", result, "user")
+
+        assert booked
+        assert booked_class["id"] == target_class["id"]
+        assert server.find_class("box", target_class["id"]).booked == ["user@mail.com"]
+
+    def test_circuit_fails_fast_when_the_server_is_down(self, server):
+        resilience.configure_resilience(failure_threshold=2)
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        server.unavailable = True
+        for _ in range(2):
+            with pytest.raises(requests.RequestException):
+                client.get_classes(CLASS_DAY)
+        requests_before = server.requests
+        with pytest.raises(CircuitOpen):
+            client.book_class(CLASS_DAY, {"id": 1})
+        assert server.requests == requests_before
+
+    def test_hedged_get_classes(self, server):
+        resilience.configure_resilience(hedge=True)
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        for _ in range(5):
+            client.get_classes(CLASS_DAY)
+        requests_before = server.requests
+        #The first request hangs, the hedged one answers
+        server.stall_next(1, 2)
+        start = datetime.now()
+        assert len(client.get_classes(CLASS_DAY)) == 1
+        assert (datetime.now() - start).total_seconds() < 1
+        assert server.requests == requests_before + 2
+
+    def test_hedging_does_not_queue_many_users(self):
+        #More concurrent fetches than the threads of a small pool: none of them waits, so none is hedged
+        resilience.configure_resilience(hedge=True)
+        fake = FakeAimHarder(latency=0.3, hours_in_advance=20, now=lambda: datetime(2022, 3, 3, 21, 0))
+        fake.add_user("user@mail.com", "password")
+        fake.add_class("box", CLASS_DAY, "1700", "WOD")
+        try:
+            with fake:
+                set_base_url(fake.url)
+                client = AimHarderClient("user@mail.com", "password", 1, "box")
+                requests_before = fake.requests
+                threads = [threading.Thread(target=client.get_classes, args=(CLASS_DAY,)) for _ in range(32)]
+                start = time.monotonic()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.monotonic() - start
+                assert fake.requests == requests_before + 32
+                assert elapsed < resilience.DEFAULT_HEDGE_DELAY
+        finally:
+            set_base_url(None)
+            resilience.configure_resilience()
@@ -0,0 +1,63 @@
+import datetime
+import threading
+
+import pytest
+
+from runner import BookingResult, iter_users, run_users, format_summary, STATUS_BOOKED, STATUS_ERROR
+
+
+class TestIterUsers:
+    def test_iter_users(self):
+        config = [{"user1": {"box-id": 1}}, {"user2": {"box-id": 2}}]
+        assert iter_users(config) == [("user1", {"box-id": 1}), ("user2", {"box-id": 2})]
+
+
+class TestRunUsers:
+    @pytest.mark.parametrize("workers", (1, 4))
+    def test_results_keep_order_and_isolate_errors(self, workers):
+        def task(user_name, user_config):
+            if user_config.get("fail"):
+                raise ValueError("boom")
+            return BookingResult(user_name, status=STATUS_BOOKED)
+
+        users = [("user1", {}), ("user2", {"fail": True}), ("user3", {})]
+        results = run_users(users, task, workers=workers)
+
+        assert [result.user for result in results] == ["user1", "user2", "user3"]
+        assert [result.status for result in results] == [STATUS_BOOKED, STATUS_ERROR, STATUS_BOOKED]
+        assert results[1].error == "boom"
+
+    def test_users_run_in_parallel(self):
+        #Every task waits for the others, so it only finishes if all of them run at the same time
+        barrier = threading.Barrier(3, timeout=5)
+
+        def task(user_name, user_config):
+            barrier.wait()
+            return BookingResult(user_name, status=STATUS_BOOKED)
+
+        results = run_users([("user1", {}), ("user2", {}), ("user3", {})], task, workers=3)
+        assert all(result.booked for result in results)
+
+
+    def test_several_results_per_user(self):
+        def task(user_name, user_config):
+            return [BookingResult(user_name, status=STATUS_BOOKED), BookingResult(user_name)]
+
+        results = run_users([("user1", {}), ("user2", {})], task, workers=2)
+        assert [result.user for result in results] == ["user1", "user1", "user2", "user2"]
+        assert all(result.elapsed > 0 for result in results)
+
+
+class TestBookingResult:
+    def test_latency(self):
+        result = BookingResult(
+            "user1",
+            status=STATUS_BOOKED,
+            slot_open=datetime.datetime(2025, 1, 26, 9, 0, 0),
+            confirmed_at=datetime.datetime(2025, 1, 26, 9, 0, 0, 250000),
+        )
+        assert result.latency == 0.25
+        assert "250 ms after slot opening" in format_summary([result])
+
+    def test_latency_not_booked(self):
+        assert BookingResult("user1").latency is None
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from schedule import Schedule, is_day_booked
+
+CLASSES = [
+    {"id": 1, "timeid": "0700_60", "className": "WOD", "bookState": None},
+    {"id": 2, "timeid": "1700_60", "className": "WOD", "bookState": -1},
+    {"id": 3, "timeid": "1700_60", "className": "OPEN BOX", "bookState": None},
+]
+
+
+class TestDecode:
+    def test_decode(self):
+        schedule = Schedule.decode(json.dumps({"bookings": CLASSES}).encode())
+        assert len(schedule) == 3
+        assert schedule.find("1700", "WOD").raw == CLASSES[1]
+        assert not schedule.booked
+
+    @pytest.mark.parametrize("book_state", (0, 1))
+    def test_booked_flag(self, book_state):
+        classes = [*CLASSES[:2], {**CLASSES[2], "bookState": book_state}]
+        schedule = Schedule.decode(json.dumps({"bookings": classes}).encode())
+        assert schedule.booked == is_day_booked(classes) is True
+        assert schedule.slots[2].book_state == book_state
+
+    def test_closed_box(self):
+        assert len(Schedule.decode(b'{"bookings": null}')) == 0
+
+    def test_names_are_shared(self):
+        first = Schedule.decode(json.dumps({"bookings": CLASSES}).encode())
+        second = Schedule.decode(json.dumps({"bookings": CLASSES}).encode())
+        assert first.slots[0].name is second.slots[1].name
+        assert first.slots[0].start is second.slots[0].start
@@ -0,0 +1,48 @@
+import datetime
+import threading
+import time
+
+from scheduler import sleep_until, run_scheduler
+
+
+class TestSleepUntil:
+    def test_sleep_until(self):
+        target = datetime.datetime.today() + datetime.timedelta(milliseconds=50)
+        deadline = sleep_until(target)
+        skew = time.monotonic() - deadline
+        assert 0 <= skew < 0.005
+        assert datetime.datetime.today() >= target - datetime.timedelta(milliseconds=5)
+
+    def test_sleep_until_past_target(self):
+        start = time.monotonic()
+        sleep_until(datetime.datetime.today() - datetime.timedelta(seconds=10))
+        assert time.monotonic() - start < 0.01
+
+
+class TestRunScheduler:
+    def test_run_scheduler_fires_prewarmed_task(self):
+        #Fake clock that starts 100ms before the opening of the goal (Sunday 09:00 for a Tuesday class at 10:00)
+        opening = datetime.datetime(2025, 1, 26, 9, 0)
+        start = time.monotonic()
+
+        def clock():
+            return opening - datetime.timedelta(milliseconds=100) + datetime.timedelta(seconds=time.monotonic() - start)
+
+        stop = threading.Event()
+        calls = []
+
+        def task(user_name, user_config, fire_at):
+            calls.append((user_name, fire_at, clock()))
+            stop.set()
+
+        users = [("user1", {"booking-goals": ["tuesday,1000,WOD,49"]})]
+        thread = threading.Thread(target=run_scheduler, args=(users, task, 0.05, clock, stop), daemon=True)
+        thread.start()
+        assert stop.wait(5)
+        thread.join(5)
+
+        user_name, fire_at, launched_at = calls[0]
+        assert user_name == "user1"
+        assert fire_at == opening
+        #The task is launched in advance (prewarm) so it can log in before the opening
+        assert launched_at < opening
@@ -0,0 +1,88 @@
+import datetime
+import os
+import stat
+import time
+from unittest.mock import patch, Mock
+
+import pytest
+from requests import HTTPError, Session
+
+from client import AimHarderClient
+from constants import ERROR_TAG_ID, LOGIN_ENDPOINT
+from session_cache import SessionCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SessionCache(str(tmp_path / "sessions"))
+
+
+def logged_in_session(expires=None):
+    session = Session()
+    session.cookies.set("PHPSESSID", "abc", domain=".aimharder.com", path="/", expires=expires)
+    return session
+
+
+class TestSessionCache:
+    def test_save_and_load(self, cache):
+        cache.save("foo@mail.com", "box", logged_in_session())
+
+        session = Session()
+        assert cache.load("foo@mail.com", "box", session)
+        assert session.cookies.get("PHPSESSID") == "abc"
+        #Another box or user does not get the session
+        assert not cache.load("foo@mail.com", "other", Session())
+        assert not cache.load("bar@mail.com", "box", Session())
+
+    def test_files_are_private(self, cache):
+        cache.save("foo@mail.com", "box", logged_in_session())
+        assert stat.S_IMODE(os.stat(cache.folder).st_mode) == 0o700
+        for name in os.listdir(cache.folder):
+            assert stat.S_IMODE(os.stat(os.path.join(cache.folder, name)).st_mode) == 0o600
+
+    def test_expired_cookie(self, cache):
+        cache.save("foo@mail.com", "box", logged_in_session(expires=int(time.time()) - 1))
+        assert not cache.load("foo@mail.com", "box", Session())
+        assert os.listdir(cache.folder) == []
+
+    def test_too_old(self, tmp_path):
+        cache = SessionCache(str(tmp_path), max_age=0)
+        cache.save("foo@mail.com", "box", logged_in_session())
+        assert not cache.load("foo@mail.com", "box", Session())
+
+
+class TestClientWithSessionCache:
+    def test_cached_session_skips_login(self, cache):
+        cache.save("foo", "foo", logged_in_session())
+        with patch("requests.Session.post") as m_post, patch("requests.Session.get") as m_get:
+            m_get.return_value = Mock(status_code=200, url="https://foo.aimharder.com/api/bookings",
+                                      headers={"Content-Type": "application/json"}, json=lambda: {"bookings": []})
+            client = AimHarderClient(email="foo", password="bar", box_id=1, box_name="foo", session_cache=cache)
+            assert client.get_classes(datetime.datetime(2022, 3, 2)) == []
+            m_post.assert_not_called()
+            assert m_get.call_count == 1
+
+    def test_stale_cached_session_logs_in_again(self, cache):
+        cache.save("foo", "foo", logged_in_session())
+        login_page = Mock(status_code=200, url=LOGIN_ENDPOINT, headers={"Content-Type": "text/html"})
+        bookings = Mock(status_code=200, url="https://foo.aimharder.com/api/bookings",
+                        headers={"Content-Type": "application/json"}, json=lambda: {"bookings": []})
+        with patch("requests.Session.post") as m_post, patch("requests.Session.get") as m_get:
+            m_post.return_value.content = f'<span id="{ERROR_TAG_ID}"></span>'
+            m_get.side_effect = [login_page, bookings]
+            client = AimHarderClient(email="foo", password="bar", box_id=1, box_name="foo", session_cache=cache)
+            assert client.get_classes(datetime.datetime(2022, 3, 2)) == []
+            assert m_post.call_count == 1
+            assert m_get.call_count == 2
+
+    def test_unavailable_box_keeps_the_cached_session(self, cache):
+        cache.save("foo", "foo", logged_in_session())
+        error_page = Mock(status_code=503, url="https://foo.aimharder.com/api/bookings", headers={"Content-Type": "text/html"})
+        error_page.raise_for_status.side_effect = HTTPError("503 Server Error")
+        with patch("requests.Session.post") as m_post, patch("requests.Session.get") as m_get:
+            m_get.return_value = error_page
+            client = AimHarderClient(email="foo", password="bar", box_id=1, box_name="foo", session_cache=cache)
+            with pytest.raises(HTTPError):
+                client.get_classes(datetime.datetime(2022, 3, 2))
+            m_post.assert_not_called()
+        assert cache.load("foo", "foo", Session())
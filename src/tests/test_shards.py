@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from benchmarks.fake_aimharder import FakeAimHarder
+from shards import run_sharded, shard_users
+from timing import timings
+
+
+def user(box, opening):
+    return {"box-name": box, "opening": opening}
+
+
+def key(user_name, configuration):
+    return configuration["box-name"], configuration["opening"]
+
+
+def test_users_of_the_same_box_and_opening_share_the_shard():
+    users = [("u1", user("a", 9)), ("u2", user("a", 9)), ("u3", user("a", 9)), ("u4", user("b", 9)), ("u5", user("a", 10)), ("u6", user("c", 9))]
+    shards = shard_users(users, key, 2)
+    assert [[user_name for user_name, _ in shard] for shard in shards] == [["u1", "u2", "u3"], ["u4", "u5", "u6"]]
+    assert len(shard_users(users, key, 10)) == 4
+    assert shard_users([], key, 2) == []
+
+
+def test_run_sharded_against_the_fake_server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    #The booking windows open now for a class 48 hours ahead
+    class_datetime = (datetime.today() + timedelta(hours=48)).replace(second=0, microsecond=0)
+    time_str = class_datetime.strftime("%H%M")
+    goal = f"{class_datetime.strftime('%A').lower()},{time_str},WOD,48"
+    messages = []
+    with FakeAimHarder(hours_in_advance=48) as server:
+        users = []
+        for index in range(4):
+            box = f"box{index % 2}"
+            if index < 2:
+                server.add_class(box, class_datetime, time_str, "WOD")
+            server.add_user(f"user{index}@mail.com", "password")
+            configuration = {"email": f"user{index}@mail.com", "password": "password", "box-name": box, "box-id": index % 2,
+                             "booking-goals": [goal], "exceptions": None}
+            if index == 0:
+                configuration["telegram"] = {"telegram-bot-token": "token", "telegram-chat-id": "chat"}
+            users.append((f"user{index}", configuration))
+
+        results = run_sharded(users, "main", {"base_url": server.url}, 2, lambda name, config: config["box-name"],
+                              notify=lambda *message: messages.append(message))
+
+    assert sorted((result.user, result.status) for result in results) == [(f"user{index}", "booked") for index in range(4)]
+    #The spans of the shards are collected by this process
+    assert {span["user"] for span in timings.spans if span["phase"] == "total"} >= {f"user{index}" for index in range(4)}
+    assert [(token, chat_id) for token, chat_id, _, _ in messages] == [("token", "chat")]
+    assert sorted(path.name for path in (tmp_path / "logs").iterdir()) == ["aimharder-bot.shard0.log", "aimharder-bot.shard1.log"]
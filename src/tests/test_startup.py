@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import startup
+from startup import format_import_report, parse_import_times
+
+IMPORT_TIMES = """import time: self [us] | cumulative | imported package
+import time:       200 |        200 |     _io
+import time:      1000 |       1200 |   requests
+import time:       300 |       1500 | main
+Traceback (most recent call last):""".splitlines()
+
+
+class TestImportTimes:
+    def test_parse_import_times(self):
+        assert parse_import_times(IMPORT_TIMES) == [("_io", 200, 200, 2), ("requests", 1000, 1200, 1), ("main", 300, 1500, 0)]
+
+    def test_format_import_report(self):
+        report = format_import_report(parse_import_times(IMPORT_TIMES), 0.25, top=2)
+        assert report.splitlines()[0] == "Startup: 250.0 ms in total, 1.5 ms importing 3 modules"
+        assert "     1.5  main" in report
+        assert "     1.0  requests" in report
+
+
+class TestLazyImports:
+    def test_main_does_not_import_the_http_modules(self):
+        #The runs without any booking window open must not pay for importing them
+        code = "import sys, main; print(any(m in sys.modules for m in ('requests', 'urllib3', 'yaml', 'telebot')))"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(startup.__file__)).stdout
+        assert output.strip() == "False"
@@ -0,0 +1,103 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import transport
+from timing import Timings, percentile, timings, user_context
+from transport import configure_pool, new_session
+
+
+class TestPercentile:
+    @pytest.mark.parametrize(
+        "values, fraction, expected",
+        (
+            ([1], 0.5, 1),
+            ([3, 1, 2], 0.5, 2),
+            (list(range(1, 101)), 0.95, 95),
+            (list(range(1, 101)), 1, 100),
+        ),
+    )
+    def test_percentile(self, values, fraction, expected):
+        assert percentile(values, fraction) == expected
+
+
+class TestTimings:
+    def test_spans_are_attributed_to_the_user(self):
+        collector = Timings()
+        with user_context("user1"):
+            with collector.span("login"):
+                pass
+        collector.record("login", 0.2, user="user2")
+        assert [(span["user"], span["phase"]) for span in collector.spans] == [("user1", "login"), ("user2", "login")]
+
+    def test_only_the_last_spans_are_kept(self):
+        collector = Timings(max_spans=3)
+        for duration in (0.1, 0.2, 0.3, 0.4):
+            collector.record("book_class", duration, user="user1")
+        assert [span["duration"] for span in collector.spans] == [0.2, 0.3, 0.4]
+        assert collector.aggregate()["book_class"]["count"] == 3
+
+    def test_aggregate(self):
+        collector = Timings()
+        for duration in (0.1, 0.2, 0.3, 0.4):
+            collector.record("book_class", duration, user="user1")
+        collector.record("book_class", 1.0, user="user2")
+
+        assert collector.aggregate()["book_class"] == {"count": 5, "p50": 0.3, "p95": 1.0, "max": 1.0}
+        assert collector.aggregate(by_user=True)[("user1", "book_class")]["max"] == 0.4
+
+    def test_write_files(self, tmp_path):
+        collector = Timings()
+        collector.record("login", 0.25, user="user1")
+        collector.write_jsonl(str(tmp_path / "timings.jsonl"))
+        collector.write_prometheus(str(tmp_path / "timings.prom"))
+
+        lines = [json.loads(line) for line in (tmp_path / "timings.jsonl").read_text().splitlines()]
+        assert lines[0]["phase"] == "login"
+        assert lines[1]["aggregate"]["p95"] == 0.25
+        prometheus = (tmp_path / "timings.prom").read_text()
+        assert 'aimharder_phase_seconds{phase="login",quantile="0.95"} 0.250000' in prometheus
+        assert 'aimharder_user_phase_seconds{user="user1",phase="login",quantile="0.95"} 0.250000' in prometheus
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpTimings:
+    @pytest.fixture
+    def server(self):
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        configure_pool(pool_maxsize=1)
+        yield f"http://127.0.0.1:{httpd.server_address[1]}"
+        transport._adapter.shutdown()
+        transport._adapter = None
+        httpd.shutdown()
+        httpd.server_close()
+
+    def test_requests_are_timed(self, server):
+        timings.clear()
+        session = new_session()
+        with user_context("user1"):
+            session.get(f"{server}/first")
+            session.get(f"{server}/second")
+
+        spans = [span for span in timings.spans if span["phase"] == "http.get"]
+        assert len(spans) == 2
+        assert all(span["user"] == "user1" and span["status"] == 200 for span in spans)
+        #Only the first request had to open the connection
+        assert "connect" in spans[0]
+        assert "connect" not in spans[1]
+        timings.clear()
@@ -0,0 +1,67 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import transport
+from transport import configure_pool, new_session, pool_stats
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", f"user={self.path.strip('/')}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def pool():
+    yield configure_pool(pool_maxsize=2)
+    transport._adapter.shutdown()
+    transport._adapter = None
+
+
+class TestTransport:
+    def test_sessions_share_connections(self, server):
+        sessions = [new_session() for _ in range(3)]
+        for _ in range(2):
+            for session in sessions:
+                session.get(f"{server}/foo").raise_for_status()
+
+        stats = pool_stats()
+        assert stats["requests"] == 6
+        assert stats["connections_opened"] == 1
+        assert stats["connections_reused"] == 5
+
+    def test_sessions_keep_their_own_cookies(self, server):
+        first, second = new_session(), new_session()
+        first.get(f"{server}/first")
+        second.get(f"{server}/second")
+        assert first.cookies.get("user") == "first"
+        assert second.cookies.get("user") == "second"
+
+    def test_closing_a_session_keeps_the_pool(self, server):
+        first, second = new_session(), new_session()
+        first.get(f"{server}/foo")
+        first.close()
+        second.get(f"{server}/foo")
+        assert pool_stats()["connections_opened"] == 1
@@ -0,0 +1,113 @@
+import threading
+from datetime import datetime
+
+import pytest
+import requests
+
+from benchmarks.fake_aimharder import FakeAimHarder
+from client import AimHarderClient
+from constants import set_base_url
+from waitlist import BoxPoller, WaitlistWatcher, WatchTarget, poll_interval, DEFAULT_MIN_INTERVAL, DEFAULT_MAX_INTERVAL
+
+NOW = datetime(2022, 3, 3, 21, 0)
+CLASS_DAY = datetime(2022, 3, 4, 17, 0)
+
+
+@pytest.fixture
+def server():
+    fake = FakeAimHarder(hours_in_advance=20, now=lambda: NOW, etags=True)
+    fake.add_user("user@mail.com", "password")
+    fake.add_user("other@mail.com", "password")
+    with fake:
+        set_base_url(fake.url)
+        yield fake
+    set_base_url(None)
+
+
+@pytest.mark.parametrize("seconds_to_class, volatility, expected", [
+    (24 * 3600, 0.0, DEFAULT_MAX_INTERVAL),
+    (3600, 0.0, 30),
+    (3600, 1.0, 6),
+    (60, 0.0, DEFAULT_MIN_INTERVAL),
+])
+def test_poll_interval(seconds_to_class, volatility, expected):
+    assert poll_interval(seconds_to_class, volatility) == pytest.approx(expected)
+
+
+class TestGetClassesIfChanged:
+    def test_unchanged_listing_is_not_returned(self, server):
+        server.add_class("box", CLASS_DAY, "1700", "WOD")
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        validators = {}
+        assert len(client.get_classes_if_changed(CLASS_DAY, validators)) == 1
+        assert client.get_classes_if_changed(CLASS_DAY, validators) is None
+        assert server.not_modified == 1
+
+
+class TestBoxPoller:
+    def test_unchanged_polls(self, server):
+        class_id = server.add_class("box", CLASS_DAY, "1700", "WOD", limit=1)
+        server.book("other@mail.com", "box", class_id)
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        poller = BoxPoller("box", now=lambda: NOW)
+        with poller._lock:
+            poller._targets.append(WatchTarget("user", client, CLASS_DAY, class_id))
+
+        poller.poll()
+        poller.poll()
+        assert (poller.polls, poller.unchanged) == (2, 1)
+        assert server.not_modified == 1
+        assert len(poller.targets()) == 1
+
+    def test_freed_place_is_booked_in_order(self, server):
+        server.add_user("third@mail.com", "password")
+        class_id = server.add_class("box", CLASS_DAY, "1700", "WOD", limit=1)
+        server.book("other@mail.com", "box", class_id)
+        booked = []
+        done = threading.Event()
+
+        def on_booked(target):
+            booked.append(target.user)
+            done.set()
+
+        watcher = WaitlistWatcher(now=lambda: NOW, min_interval=0.01, max_interval=0.01)
+        for user in ("user", "third"):
+            client = AimHarderClient(f"{user}@mail.com", "password", 1, "box")
+            watcher.watch("box", WatchTarget(user, client, CLASS_DAY, class_id, on_booked=on_booked))
+        server.cancel("other@mail.com", "box", class_id)
+
+        assert done.wait(5)
+        assert booked == ["user"]
+        assert [target.user for target in watcher.pending()] == ["third"]
+        assert "user@mail.com" in server.find_class("box", class_id).booked
+        watcher.stop.set()
+        watcher.wait(5)
+
+    def test_started_class_stops_the_watch(self, server):
+        class_id = server.add_class("box", CLASS_DAY, "1700", "WOD", limit=1)
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        failed = []
+        watcher = WaitlistWatcher(now=lambda: CLASS_DAY, min_interval=0.01)
+        watcher.watch("box", WatchTarget("user", client, CLASS_DAY, class_id, on_failed=lambda target, error: failed.append(error)))
+        watcher.wait(5)
+        assert failed == [None]
+        assert watcher.pending() == []
+
+    def test_same_class_is_watched_once(self, server):
+        class_id = server.add_class("box", CLASS_DAY, "1700", "WOD", limit=0)
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        watcher = WaitlistWatcher(now=lambda: NOW)
+        for _ in range(2):
+            watcher.watch("box", WatchTarget("user", client, CLASS_DAY, class_id))
+        assert len(watcher.pending()) == 1
+        watcher.stop.set()
+        watcher.wait(5)
+
+    def test_unavailable_box_does_not_log_in_again(self, server):
+        server.add_class("box", CLASS_DAY, "1700", "WOD", limit=0)
+        client = AimHarderClient("user@mail.com", "password", 1, "box")
+        sessions = dict(server.sessions)
+        server.unavailable = True
+        with pytest.raises(requests.HTTPError):
+            client.get_classes_if_changed(CLASS_DAY, {})
+        assert server.sessions == sessions
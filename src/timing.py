@@ -0,0 +1,131 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+_context = threading.local()
+#Spans kept in memory. The long-running modes record spans for days, so only the last ones are kept
+MAX_SPANS = 10000
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    #Nearest-rank percentile
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Timings:
+    #Collects the duration of every phase of the booking (spans) of every user in the run (the last max_spans ones)
+
+    def __init__(self, max_spans: int = MAX_SPANS):
+        self._lock = threading.Lock()
+        self.spans = deque(maxlen=max_spans)
+
+    def record(self, phase: str, duration: float, user: str | None = None, **extra):
+        span = {"ts": time.time(), "user": user if user is not None else current_user(), "phase": phase, "duration": duration}
+        span.update(extra)
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, phase: str, **extra):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start, **extra)
+
+    def merge(self, spans: list[dict]):
+        #Spans recorded by another process (the shards of the run)
+        with self._lock:
+            self.spans.extend(spans)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+    def aggregate(self, by_user: bool = False) -> dict:
+        #{(user, phase) or phase: {"count", "p50", "p95", "max"}}
+        with self._lock:
+            spans = list(self.spans)
+        grouped = {}
+        for span in spans:
+            key = (span["user"], span["phase"]) if by_user else span["phase"]
+            grouped.setdefault(key, []).append(span["duration"])
+        return {
+            key: {"count": len(values), "p50": percentile(values, 0.5), "p95": percentile(values, 0.95), "max": max(values)}
+            for key, values in grouped.items()
+        }
+
+    def write_jsonl(self, path: str):
+        #One line per span and one line per (user, phase) aggregate
+        with self._lock:
+            spans = list(self.spans)
+        with open(path, 'a') as file:
+            for span in spans:
+                file.write(json.dumps(span) + "\n")
+            for (user, phase), stats in self.aggregate(by_user=True).items():
+                file.write(json.dumps({"ts": time.time(), "user": user, "phase": phase, "aggregate": stats}) + "\n")
+
+    def write_prometheus(self, path: str):
+        #Text exposition format, to be scraped with the textfile collector of node_exporter
+        lines = [
+            "# HELP aimharder_phase_seconds Duration of the phases of the booking in the last run",
+            "# TYPE aimharder_phase_seconds summary",
+        ]
+        for phase, stats in sorted(self.aggregate().items()):
+            for quantile, name in (("0.5", "p50"), ("0.95", "p95"), ("1", "max")):
+                lines.append(f'aimharder_phase_seconds{{phase="{phase}",quantile="{quantile}"}} {stats[name]:.6f}')
+            lines.append(f'aimharder_phase_seconds_count{{phase="{phase}"}} {stats["count"]}')
+        for (user, phase), stats in sorted(self.aggregate(by_user=True).items(), key=lambda item: (str(item[0][0]), item[0][1])):
+            lines.append(f'aimharder_user_phase_seconds{{user="{user}",phase="{phase}",quantile="0.95"}} {stats["p95"]:.6f}')
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write("\n".join(lines) + "\n")
+        #The file is replaced atomically so the collector never reads it half written
+        os.replace(tmp_path, path)
+
+
+#Collector of the whole run
+timings = Timings()
+
+
+def current_user() -> str | None:
+    return getattr(_context, "user", None)
+
+
+@contextmanager
+def user_context(user: str):
+    #Every span recorded by this thread is attributed to the user
+    previous = current_user()
+    _context.user = user
+    try:
+        yield
+    finally:
+        _context.user = previous
+
+
+def set_connect_time(duration: float):
+    _context.connect = duration
+
+
+def pop_connect_time() -> float | None:
+    #Time spent opening the connection (TCP + TLS) used by the last request of this thread, if a new one was opened
+    duration = getattr(_context, "connect", None)
+    _context.connect = None
+    return duration
+
+
+def http_timing_hook(response, *args, **kwargs):
+    #requests response hook: time to first byte (until the headers are parsed) and connection setup if any
+    connect = pop_connect_time()
+    extra = {"status": response.status_code, "host": response.url.split('/')[2] if '://' in response.url else response.url}
+    if connect is not None:
+        extra["connect"] = connect
+    #Kept in the response for the latency history of the endpoint (see resilience.py)
+    response.connect_time = connect
+    timings.record(f"http.{response.request.method.lower()}", response.elapsed.total_seconds(), **extra)
+    return response
@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import resilience
+from timing import http_timing_hook, set_connect_time
+
+logger = logging.getLogger('aimharder-bot')
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+
+class _TimedConnectionMixin:
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            set_connect_time(time.perf_counter() - start)
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class SharedHTTPAdapter(HTTPAdapter):
+    #Adapter mounted on the sessions of every user. The connection pools (and therefore the TCP+TLS connections
+    #kept alive) are shared, while each session keeps its own cookie jar.
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        #The connections measure how long it takes to open them (TCP + TLS)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+    def close(self):
+        #Closing a user session must not close the connections used by the rest of the users
+        pass
+
+    def shutdown(self):
+        super().close()
+
+    def stats(self) -> dict:
+        pools = self.poolmanager.pools
+        connections = 0
+        requests = 0
+        hosts = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts += 1
+            connections += pool.num_connections
+            requests += pool.num_requests
+        return {
+            "hosts": hosts,
+            "pool_maxsize": self._pool_maxsize,
+            "connections_opened": connections,
+            "requests": requests,
+            "connections_reused": max(requests - connections, 0),
+        }
+
+
+_adapter = None
+_adapter_lock = threading.Lock()
+
+
+def configure_pool(pool_connections: int = DEFAULT_POOL_CONNECTIONS, pool_maxsize: int = DEFAULT_POOL_MAXSIZE) -> SharedHTTPAdapter:
+    #pool_connections is the number of hosts whose pools are kept and pool_maxsize the number of connections
+    #kept alive per host, which should be at least the number of users booking in parallel
+    global _adapter
+    with _adapter_lock:
+        if _adapter is not None:
+            _adapter.shutdown()
+        _adapter = SharedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        return _adapter
+
+
+def get_shared_adapter() -> SharedHTTPAdapter:
+    global _adapter
+    with _adapter_lock:
+        if _adapter is None:
+            _adapter = SharedHTTPAdapter(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE)
+        return _adapter
+
+
+class GuardedSession(Session):
+    #Every request gets the connect and read timeouts of its endpoint, adapted from its latency history, and fails
+    #fast while the circuit of its host is open
+
+    def request(self, method, url, *args, **kwargs):
+        endpoint = resilience.endpoint_key(method, url)
+        host = urlsplit(url).netloc
+        #The breaker can be replaced by configure_resilience, so it is looked up on every request
+        breaker = resilience.circuit_breaker
+        breaker.before(host)
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = resilience.latency_history.timeout(endpoint, resilience.is_idempotent(method, url))
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception:
+            breaker.failure(host)
+            raise
+        if response.status_code >= 500:
+            breaker.failure(host)
+        else:
+            breaker.success(host)
+            resilience.latency_history.record(endpoint, response.elapsed.total_seconds(), getattr(response, "connect_time", None))
+        return response
+
+    def clone(self) -> "GuardedSession":
+        #Session with the same headers and cookies on the shared pool, for a request run concurrently with this one
+        session = new_session()
+        session.headers.update(self.headers)
+        session.cookies.update(self.cookies)
+        return session
+
+
+def new_session() -> Session:
+    session = GuardedSession()
+    adapter = get_shared_adapter()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(http_timing_hook)
+    return session
+
+
+def pool_stats() -> dict:
+    return get_shared_adapter().stats()
@@ -0,0 +1,207 @@
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from exceptions import BookingFailed, MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY
+from timing import user_context
+
+logger = logging.getLogger('aimharder-bot')
+
+DEFAULT_MIN_INTERVAL = 2.0
+DEFAULT_MAX_INTERVAL = 300.0
+#The interval is the time left until the class divided by this, e.g. every 30 seconds one hour before the class
+INTERVAL_DIVISOR = 120
+#Weight of the last poll in the volatility (exponential moving average of the polls in which the listing changed)
+VOLATILITY_WEIGHT = 0.3
+
+
+def poll_interval(seconds_to_class: float, volatility: float, min_interval: float = DEFAULT_MIN_INTERVAL,
+                  max_interval: float = DEFAULT_MAX_INTERVAL) -> float:
+    #The closer the class and the more its occupation changes, the more often it is polled
+    interval = seconds_to_class / INTERVAL_DIVISOR / (1 + 4 * volatility)
+    return min(max(interval, min_interval), max_interval)
+
+
+@dataclass(eq=False)
+class WatchTarget:
+    user: str
+    client: object
+    class_day: datetime
+    class_id: int
+    #Called from the poller thread with the target once a freed place is booked
+    on_booked: Callable | None = None
+    #Called with the target and the exception (None when the class started) when it stops being watched
+    on_failed: Callable | None = None
+
+
+class BoxPoller:
+    #Polls the listings of one box for the classes that the users are waiting for. Every listing is fetched once per
+    #poll for all the users of the box, with conditional requests, and the users are booked in the order in which
+    #they started waiting as soon as a class has free places.
+
+    def __init__(self, box_name: str, now: Callable[[], datetime] = datetime.today, min_interval: float = DEFAULT_MIN_INTERVAL,
+                 max_interval: float = DEFAULT_MAX_INTERVAL, stop: threading.Event | None = None):
+        self.box_name = box_name
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._now = now
+        self._stop = stop or threading.Event()
+        self._targets = []
+        self._lock = threading.Lock()
+        #Per day: validators of the conditional requests, last (ocupation, limit) of every class and volatility
+        self._validators = {}
+        self._last_seen = {}
+        self._volatility = {}
+        self.polls = 0
+        self.unchanged = 0
+        self._thread = None
+        self._finished = False
+
+    def add(self, target: WatchTarget) -> bool:
+        #Returns False if the poller has already finished, so a new one must be created
+        with self._lock:
+            if self._finished:
+                return False
+            #The same user is never watching the same class twice
+            if any(watched.user == target.user and watched.class_id == target.class_id for watched in self._targets):
+                return True
+            self._targets.append(target)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name=f"waitlist-{self.box_name}", daemon=True)
+                self._thread.start()
+        return True
+
+    def targets(self) -> list[WatchTarget]:
+        with self._lock:
+            return list(self._targets)
+
+    def _remove(self, target: WatchTarget):
+        with self._lock:
+            if target in self._targets:
+                self._targets.remove(target)
+
+    def join(self, timeout: float | None = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def poll(self) -> float:
+        #One poll of every day with targets. It returns the seconds until the next one.
+        now = self._now()
+        for target in self.targets():
+            if target.class_day <= now:
+                logger.info(f"{target.user} - Class {target.class_id} has started, no place was freed.")
+                self._remove(target)
+                if target.on_failed is not None:
+                    target.on_failed(target, None)
+
+        by_day = {}
+        for target in self.targets():
+            by_day.setdefault(target.class_day.date(), []).append(target)
+
+        intervals = []
+        for day, targets in by_day.items():
+            self.polls += 1
+            validators = self._validators.setdefault(day, {})
+            try:
+                #Any client of the box can fetch the listing, the places are the same for everyone
+                classes = targets[0].client.get_classes_if_changed(targets[0].class_day, validators)
+            except Exception as e:
+                logger.error(f"Waitlist poll of {self.box_name} failed: {e}")
+                classes = None
+            changed = classes is not None and self._update(day, classes)
+            if classes is None:
+                self.unchanged += 1
+            volatility = (1 - VOLATILITY_WEIGHT) * self._volatility.get(day, 0.0) + VOLATILITY_WEIGHT * changed
+            self._volatility[day] = volatility
+            if changed:
+                self._book_freed(day, targets)
+            seconds_to_class = min((target.class_day - now).total_seconds() for target in targets)
+            intervals.append(poll_interval(seconds_to_class, volatility, self.min_interval, self.max_interval))
+        return min(intervals) if intervals else 0
+
+    def _update(self, day, classes: list[dict]) -> bool:
+        #Stores the occupation of the classes and returns whether it changed since the last poll
+        seen = {class_item.get("id"): (class_item.get("ocupation"), class_item.get("limit")) for class_item in classes}
+        changed = seen != self._last_seen.get(day)
+        self._last_seen[day] = seen
+        return changed
+
+    def _book_freed(self, day, targets: list[WatchTarget]):
+        seen = self._last_seen[day]
+        for target in targets:
+            ocupation, limit = seen.get(target.class_id, (None, None))
+            if ocupation is None or limit is None or ocupation >= limit:
+                continue
+            with user_context(target.user):
+                try:
+                    target.client.book_class(target.class_day, {"id": target.class_id})
+                except BookingFailed as e:
+                    if e.args and e.args[0] == MESSAGE_BOOKING_FAILED_MAX_WAIT_CAPACITY:
+                        #Someone else was faster, we keep waiting
+                        continue
+                    self._fail(target, e)
+                    continue
+                except Exception as e:
+                    self._fail(target, e)
+                    continue
+            logger.info(f"{target.user} - Freed place of class {target.class_id} booked.")
+            self._remove(target)
+            #The place is taken, so the rest of the users wait for the next one
+            seen[target.class_id] = (ocupation + 1, limit)
+            if target.on_booked is not None:
+                target.on_booked(target)
+
+    def _fail(self, target: WatchTarget, error: Exception):
+        logger.error(f"{target.user} - Stopped waiting for class {target.class_id}: {error}")
+        self._remove(target)
+        if target.on_failed is not None:
+            target.on_failed(target, error)
+
+    def run(self):
+        try:
+            while not self._stop.is_set():
+                interval = self.poll()
+                with self._lock:
+                    if not self._targets:
+                        self._finished = True
+                        return
+                self._stop.wait(interval)
+        finally:
+            with self._lock:
+                self._finished = True
+
+
+class WaitlistWatcher:
+    #One shared poller per box for all the users waiting for a place in its classes
+
+    def __init__(self, now: Callable[[], datetime] = datetime.today, min_interval: float = DEFAULT_MIN_INTERVAL,
+                 max_interval: float = DEFAULT_MAX_INTERVAL):
+        self._now = now
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stop = threading.Event()
+        self._pollers = {}
+        self._lock = threading.Lock()
+
+    def watch(self, box_name: str, target: WatchTarget):
+        logger.info(f"{target.user} - Waiting for a free place in class {target.class_id} of {target.class_day.strftime('%Y-%m-%d %H:%M')}")
+        with self._lock:
+            poller = self._pollers.get(box_name)
+            if poller is None or not poller.add(target):
+                poller = BoxPoller(box_name, self._now, self.min_interval, self.max_interval, self.stop)
+                self._pollers[box_name] = poller
+                poller.add(target)
+
+    def pending(self) -> list[WatchTarget]:
+        with self._lock:
+            pollers = list(self._pollers.values())
+        return [target for poller in pollers for target in poller.targets()]
+
+    def wait(self, timeout: float | None = None):
+        #Blocks until every target has been booked or dropped (or the watcher is stopped)
+        with self._lock:
+            pollers = list(self._pollers.values())
+        for poller in pollers:
+            poller.join(timeout)